@@ -0,0 +1,163 @@
+"""
+Semantic cache of /query answers.
+
+Questions are compared by the cosine similarity of their embeddings, so a
+rephrasing of a question that was already answered is served without
+retrieval or a completion. Entries belong to the index version they were
+answered from and are dropped as soon as the index changes; within a version
+they expire after a TTL and the least recently used ones are evicted first.
+With a partitioned index each partition has its own versions, and questions
+only match cached questions of the same partition.
+"""
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedAnswer:
+    query: str
+    answer: str
+    source_documents: List[Any]
+    created_at: float = field(default_factory=time.monotonic)
+
+
+class SemanticAnswerCache:
+    """LRU/TTL cache of answers looked up by query embedding similarity"""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600, threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+
+        # Index version and entry count of each partition holding entries;
+        # both are dropped with a partition's last entry
+        self._versions: Dict[Any, Any] = {}
+        self._counts: Dict[Any, int] = {}
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._vectors: Dict[int, np.ndarray] = {}
+        self._partitions: Dict[int, Any] = {}
+        self._next_id = 0
+        # Keys and stacked vectors of each partition's entries, rebuilt after changes
+        self._matrices: Dict[Any, Tuple[List[int], np.ndarray]] = {}
+
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _sync_version(self, partition: Any, version: Any) -> None:
+        """Drop a partition's entries when its index has changed since they were answered"""
+        if partition not in self._versions or version == self._versions[partition]:
+            return
+        stale = [key for key, entry_partition in self._partitions.items() if entry_partition == partition]
+        for key in stale:
+            self._remove(key)
+        self._stats["invalidations"] += len(stale)
+        logger.info(f"Index version changed to {version}, dropping {len(stale)} cached answers")
+
+    def _remove(self, key: int) -> None:
+        del self._entries[key]
+        del self._vectors[key]
+        partition = self._partitions.pop(key)
+        self._matrices.pop(partition, None)
+        self._counts[partition] -= 1
+        if not self._counts[partition]:
+            del self._counts[partition]
+            del self._versions[partition]
+
+    def _expire(self) -> None:
+        # Hits move entries to the end, so they are not in creation order
+        now = time.monotonic()
+        expired = [key for key, entry in self._entries.items() if now - entry.created_at >= self.ttl_seconds]
+        for key in expired:
+            self._remove(key)
+        self._stats["expirations"] += len(expired)
+
+    def _matrix(self, partition: Any) -> Optional[Tuple[List[int], np.ndarray]]:
+        if partition not in self._matrices:
+            keys = [key for key, entry_partition in self._partitions.items() if entry_partition == partition]
+            if not keys:
+                return None
+            self._matrices[partition] = (keys, np.stack([self._vectors[key] for key in keys]))
+        return self._matrices[partition]
+
+    def lookup(self, embedding: List[float], version: Any, partition: Any = None) -> Optional[CachedAnswer]:
+        """Return the closest cached answer of the partition within the threshold, if any"""
+        if not self.enabled:
+            return None
+        self._sync_version(partition, version)
+        self._expire()
+
+        stacked = self._matrix(partition)
+        if stacked is not None:
+            keys, matrix = stacked
+            similarities = matrix @ _normalize(embedding)
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.threshold:
+                key = keys[best]
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return self._entries[key]
+
+        self._stats["misses"] += 1
+        return None
+
+    def store(self, embedding: List[float], answer: CachedAnswer, version: Any, partition: Any = None) -> None:
+        """Cache an answer computed against the given version of the partition's index"""
+        if not self.enabled:
+            return
+        if partition in self._versions and version != self._versions[partition]:
+            # The index changed while the answer was being computed
+            return
+
+        key = self._next_id
+        self._next_id += 1
+        self._entries[key] = answer
+        self._vectors[key] = _normalize(embedding)
+        self._partitions[key] = partition
+        self._matrices.pop(partition, None)
+        self._versions[partition] = version
+        self._counts[partition] = self._counts.get(partition, 0) + 1
+
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self._stats["evictions"] += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._vectors.clear()
+        self._partitions.clear()
+        self._matrices.clear()
+        self._versions.clear()
+        self._counts.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "size": len(self._entries),
+            "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+        }
+
+
+def _normalize(embedding: List[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
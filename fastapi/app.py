@@ -1,14 +1,21 @@
+import asyncio
 import os
+from typing import Optional
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from langchain.chains import RetrievalQA
+from langchain.embeddings import CacheBackedEmbeddings
+from langchain.storage import LocalFileStore
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_community.vectorstores import FAISS, MongoDBAtlasVectorSearch
 from langchain.text_splitter import CharacterTextSplitter
 from langchain_core.documents import Document
 from pymongo import MongoClient
 
+from answer_cache import CachedAnswer, SemanticAnswerCache
+from vector_index import PartitionedIndex, SegmentedIndex
+
 # Load environment variables from .env
 load_dotenv()
 
@@ -18,6 +25,23 @@ MONGO_URI = os.getenv("MONGO_URI")
 MONGO_DB_NAME = os.getenv("MONGO_DB_NAME")
 MONGO_COLLECTION_NAME = os.getenv("MONGO_COLLECTION_NAME")
 
+# FAISS index location; every worker maps the same files
+FAISS_INDEX_DIR = os.getenv("FAISS_INDEX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "faiss_index"))
+FAISS_MAX_SEGMENTS = int(os.getenv("FAISS_MAX_SEGMENTS", "16"))
+FAISS_REFRESH_SECONDS = float(os.getenv("FAISS_REFRESH_SECONDS", "2"))
+# Per-patient indexes kept loaded in each worker
+FAISS_MAX_OPEN_PATIENTS = int(os.getenv("FAISS_MAX_OPEN_PATIENTS", "256"))
+
+# Embedding cache location and texts per embeddings request (OpenAI accepts up to 2048)
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "embedding_cache"))
+EMBEDDING_BATCH_SIZE = min(int(os.getenv("EMBEDDING_BATCH_SIZE", "2048")), 2048)
+
+# Answer cache: cosine similarity at which a cached question counts as the same
+# one, entries kept, and their lifetime; ANSWER_CACHE_MAX_ENTRIES=0 disables it
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1024"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+
 if not OPENAI_API_KEY or not MONGO_URI or not MONGO_DB_NAME or not MONGO_COLLECTION_NAME:
     raise ValueError("Missing required environment variables! Please check your .env file.")
 
@@ -25,88 +49,201 @@ if not OPENAI_API_KEY or not MONGO_URI or not MONGO_DB_NAME or not MONGO_COLLECT
 app = FastAPI()
 
 # Initialize embeddings with API key
-embeddings = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
+openai_embeddings = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY, chunk_size=EMBEDDING_BATCH_SIZE)
+
+# Chunk embeddings are cached on disk by content hash, so text that was
+# already ingested is never sent to the provider again
+embeddings = CacheBackedEmbeddings.from_bytes_store(
+    openai_embeddings,
+    LocalFileStore(EMBEDDING_CACHE_DIR),
+    namespace=openai_embeddings.model
+)
 
 # Initialize MongoDB client
 mongo_client = MongoClient(MONGO_URI)
 mongo_collection = mongo_client[MONGO_DB_NAME][MONGO_COLLECTION_NAME]
 
-# Initialize FAISS vector store
-vectorstore_faiss = None  # Will be initialized when data is added
+# Field names MongoDBAtlasVectorSearch reads chunks from; searches go through
+# the "vector_index" Atlas index, ensure it exists on the collection
+MONGO_TEXT_KEY = "text"
+MONGO_EMBEDDING_KEY = "embedding"
+
+# FAISS vector store, loaded from disk at startup and hot-swapped when any
+# worker adds data
+vectorstore_faiss = SegmentedIndex(
+    FAISS_INDEX_DIR,
+    embeddings,
+    max_segments=FAISS_MAX_SEGMENTS,
+    refresh_seconds=FAISS_REFRESH_SECONDS
+)
+
+# One FAISS index per patient under faiss_index/patients/<patient_id>, so a
+# patient's query only searches, and only pays for, that patient's data
+patient_indexes = PartitionedIndex(
+    FAISS_INDEX_DIR,
+    embeddings,
+    max_open=FAISS_MAX_OPEN_PATIENTS,
+    max_segments=FAISS_MAX_SEGMENTS,
+    refresh_seconds=FAISS_REFRESH_SECONDS
+)
+
+# The LLM client and RetrievalQA chain are built once and shared by every
+# query; the client keeps its HTTP connections open between requests and the
+# retriever follows the index as it is hot-swapped. Patient queries reuse its
+# LLM and prompt with that patient's retriever
+llm = ChatOpenAI(model_name="gpt-3.5-turbo", temperature=0, openai_api_key=OPENAI_API_KEY)
+qa_chain = RetrievalQA.from_chain_type(
+    llm=llm,
+    chain_type="stuff",
+    retriever=vectorstore_faiss.as_retriever(),
+    return_source_documents=True
+)
+
+# Answers to recent questions, reused for near-identical ones until the
+# FAISS index changes
+answer_cache = SemanticAnswerCache(
+    max_entries=ANSWER_CACHE_MAX_ENTRIES,
+    ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+    threshold=ANSWER_CACHE_THRESHOLD
+)
+
+@app.on_event("startup")
+async def load_faiss_index():
+    await run_in_threadpool(vectorstore_faiss.refresh)
 
 # Define request models
 class AddDataRequest(BaseModel):
     text: str  # Text data to add to the vector store
+    patient_id: Optional[str] = None  # Patient or tenant the text belongs to; shared index if omitted
 
 class QueryRequest(BaseModel):
     query: str  # Query to process
+    patient_id: Optional[str] = None  # Patient or tenant whose data is searched; shared index if omitted
 
-# Function to split text into chunks
-def split_text_into_chunks(text: str):
+# Return the FAISS index of a patient, or the shared one
+def get_index(patient_id: Optional[str]) -> SegmentedIndex:
+    if patient_id is None:
+        return vectorstore_faiss
+    try:
+        return patient_indexes.get(patient_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Return the QA chain searching the given index
+def get_qa_chain(index: SegmentedIndex) -> RetrievalQA:
+    if index is vectorstore_faiss:
+        return qa_chain
+    return RetrievalQA(
+        combine_documents_chain=qa_chain.combine_documents_chain,
+        retriever=index.as_retriever(),
+        return_source_documents=True
+    )
+
+# Function to split text into chunks, tagged with the patient they belong to
+def split_text_into_chunks(text: str, patient_id: Optional[str] = None):
     text_splitter = CharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
     chunks = text_splitter.split_text(text)
-    return [Document(page_content=chunk) for chunk in chunks]
+    metadata = {"patient_id": patient_id} if patient_id is not None else {}
+    return [Document(page_content=chunk, metadata=dict(metadata)) for chunk in chunks]
+
+# Embed each distinct chunk once, in provider-sized batches, reusing cached vectors
+def embed_chunks(chunks):
+    texts = [chunk.page_content for chunk in chunks]
+    unique_texts = list(dict.fromkeys(texts))
+    vectors = dict(zip(unique_texts, embeddings.embed_documents(unique_texts)))
+    return [vectors[text] for text in texts]
+
+# Insert chunks and their embeddings the way MongoDBAtlasVectorSearch stores them
+def add_to_mongo(chunks, vectors):
+    mongo_collection.insert_many([
+        {MONGO_TEXT_KEY: chunk.page_content, MONGO_EMBEDDING_KEY: vector, **chunk.metadata}
+        for chunk, vector in zip(chunks, vectors)
+    ])
 
 # Route to add data to the vector stores
 @app.post("/add-data")
 async def add_data(request: AddDataRequest):
-    global vectorstore_faiss
+    index = get_index(request.patient_id)
 
     try:
         # Split the input text into chunks
-        chunks = split_text_into_chunks(request.text)
-
-        # Add data to FAISS
-        if vectorstore_faiss is None:
-            vectorstore_faiss = FAISS.from_documents(chunks, embeddings)
-        else:
-            vectorstore_faiss.add_documents(chunks)
-
-        # Add data to MongoDB Atlas Vector Search
-        MongoDBAtlasVectorSearch.from_documents(
-            documents=chunks,
-            embedding=embeddings,
-            collection=mongo_collection,
-            index_name="vector_index"  # Ensure this index exists in your MongoDB Atlas collection
+        chunks = split_text_into_chunks(request.text, request.patient_id)
+
+        if not chunks:
+            raise HTTPException(status_code=400, detail="No text to add.")
+
+        # Embed once and write the same vectors to both stores concurrently:
+        # FAISS as a new segment of the patient's index, and MongoDB Atlas
+        # Vector Search with the patient_id field to filter on
+        vectors = await run_in_threadpool(embed_chunks, chunks)
+        await asyncio.gather(
+            run_in_threadpool(index.add_documents, chunks, vectors),
+            run_in_threadpool(add_to_mongo, chunks, vectors)
         )
 
         return {"message": "Data added successfully to both FAISS and MongoDB!"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # Route to query the RAG pipeline
 @app.post("/query")
 async def query(request: QueryRequest):
-    global vectorstore_faiss
+    index = get_index(request.patient_id)
 
-    if vectorstore_faiss is None:
+    # Pick up segments added by other workers; this reads the manifest and maps
+    # new segments, so keep it off the event loop
+    await run_in_threadpool(index.refresh_if_stale)
+    if index.segment_count == 0:
         raise HTTPException(status_code=400, detail="No data has been added yet. Please add data first.")
 
     try:
-        # Initialize the retriever (using FAISS for local search)
-        retriever_faiss = vectorstore_faiss.as_retriever()
-
-        # Initialize the LLM
-        llm = ChatOpenAI(model_name="gpt-3.5-turbo", temperature=0, openai_api_key=OPENAI_API_KEY)
-
-        # Create the RetrievalQA chain
-        qa_chain = RetrievalQA.from_chain_type(
-            llm=llm,
-            chain_type="stuff",
-            retriever=retriever_faiss,
-            return_source_documents=True
-        )
-
-        # Run the query
-        result = qa_chain.invoke({"query": request.query})
+        # Serve near-identical questions answered against the current index
+        # from the cache
+        version = index.version
+        query_embedding = None
+        if answer_cache.enabled:
+            query_embedding = await embeddings.aembed_query(request.query)
+            cached = answer_cache.lookup(query_embedding, version, request.patient_id)
+            if cached is not None:
+                return {
+                    "answer": cached.answer,
+                    "source_documents": cached.source_documents
+                }
+
+        # Run the query on the event loop; retrieval and the completion are
+        # awaited, so other queries proceed while this one waits on OpenAI
+        if query_embedding is None:
+            result = await get_qa_chain(index).ainvoke({"query": request.query})
+            answer = result.get("result", "No answer found")
+            source_documents = result.get("source_documents", [])
+        else:
+            # Retrieve with the embedding of the cache lookup rather than
+            # embedding the query a second time
+            results = await index.asimilarity_search_with_score_by_vector(query_embedding)
+            source_documents = [document for document, _ in results]
+            result = await qa_chain.combine_documents_chain.ainvoke({
+                "input_documents": source_documents,
+                "question": request.query
+            })
+            answer = result.get("output_text", "No answer found")
+
+        if query_embedding is not None:
+            answer_cache.store(query_embedding, CachedAnswer(request.query, answer, source_documents), version, request.patient_id)
 
         return {
-            "answer": result.get("result", "No answer found"),
-            "source_documents": result.get("source_documents", [])
+            "answer": answer,
+            "source_documents": source_documents
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Route to report answer cache hit rate and size
+@app.get("/query-cache/stats")
+async def query_cache_stats():
+    return answer_cache.get_stats()
+
 # Run the application
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,86 @@
+from answer_cache import CachedAnswer, SemanticAnswerCache
+
+
+def answer(text):
+    return CachedAnswer(query=text, answer=text, source_documents=[])
+
+
+def test_similar_question_is_served_from_the_cache():
+    cache = SemanticAnswerCache(threshold=0.95)
+
+    assert cache.lookup([1.0, 0.0], version=1) is None
+    cache.store([1.0, 0.0], answer("hba1c"), version=1)
+
+    assert cache.lookup([1.0, 0.05], version=1).answer == "hba1c"
+    assert cache.lookup([0.0, 1.0], version=1) is None
+    assert cache.get_stats()["hit_rate"] == 1 / 3
+
+
+def test_index_change_invalidates_the_partition():
+    cache = SemanticAnswerCache()
+    cache.lookup([1.0, 0.0], version=1, partition="a")
+    cache.store([1.0, 0.0], answer("a"), version=1, partition="a")
+    cache.store([1.0, 0.0], answer("b"), version=1, partition="b")
+
+    assert cache.lookup([1.0, 0.0], version=2, partition="a") is None
+    assert cache.lookup([1.0, 0.0], version=1, partition="b").answer == "b"
+    assert cache.get_stats()["invalidations"] == 1
+
+
+def test_answer_from_an_older_version_is_not_stored():
+    cache = SemanticAnswerCache()
+    cache.store([1.0, 0.0], answer("new"), version=2)
+
+    cache.store([0.0, 1.0], answer("old"), version=1)
+
+    assert len(cache) == 1
+
+
+def test_partitions_do_not_share_answers():
+    cache = SemanticAnswerCache()
+    cache.store([1.0, 0.0], answer("a"), version=1, partition="a")
+
+    assert cache.lookup([1.0, 0.0], version=1, partition="b") is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SemanticAnswerCache(max_entries=2)
+    cache.store([1.0, 0.0], answer("x"), version=1)
+    cache.store([0.0, 1.0], answer("y"), version=1)
+    cache.lookup([1.0, 0.0], version=1)
+
+    cache.store([-1.0, 0.0], answer("z"), version=1)
+
+    assert cache.lookup([1.0, 0.0], version=1).answer == "x"
+    assert cache.lookup([0.0, 1.0], version=1) is None
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("answer_cache.time.monotonic", lambda: now[0])
+    cache = SemanticAnswerCache(ttl_seconds=10)
+    cache.store([1.0, 0.0], CachedAnswer("x", "x", [], created_at=now[0]), version=1)
+
+    now[0] += 11
+
+    assert cache.lookup([1.0, 0.0], version=1) is None
+    assert cache.get_stats()["expirations"] == 1
+
+
+def test_partition_bookkeeping_is_bounded_by_entries():
+    cache = SemanticAnswerCache(max_entries=4)
+
+    for patient in range(100):
+        cache.lookup([1.0, 0.0], version=1, partition=f"patient-{patient}")
+        cache.store([1.0, 0.0], answer("x"), version=1, partition=f"patient-{patient}")
+
+    assert len(cache._versions) == len(cache._counts) == 4
+
+
+def test_disabled_cache_stores_nothing():
+    cache = SemanticAnswerCache(max_entries=0)
+    cache.store([1.0, 0.0], answer("x"), version=1)
+
+    assert cache.lookup([1.0, 0.0], version=1) is None
+    assert len(cache) == 0
@@ -0,0 +1,116 @@
+import asyncio
+import json
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from vector_index import PartitionedIndex, SegmentedIndex, read_segment
+
+
+class LengthEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        return [float(len(text)), 1.0]
+
+
+@pytest.mark.parametrize("key", ["../other", "a/b", ".hidden", "", "x" * 200, "a b"])
+def test_invalid_partition_keys_are_rejected(tmp_path, key):
+    indexes = PartitionedIndex(str(tmp_path), LengthEmbeddings())
+
+    with pytest.raises(ValueError):
+        indexes.get(key)
+
+
+def test_partitions_are_searched_separately(tmp_path):
+    indexes = PartitionedIndex(str(tmp_path), LengthEmbeddings(), refresh_seconds=0)
+    indexes.get("patient-1").add_documents([Document(page_content="first patient")])
+    indexes.get("patient-2").add_documents([Document(page_content="second")])
+
+    results = indexes.get("patient-1").similarity_search_with_score("second", k=4)
+
+    assert [document.page_content for document, _ in results] == ["first patient"]
+    assert indexes.get("patient-3").is_empty
+    assert sorted(path.name for path in (tmp_path / "patients").iterdir()) == ["patient-1", "patient-2"]
+
+
+def test_closed_partitions_are_reopened_from_disk(tmp_path):
+    indexes = PartitionedIndex(str(tmp_path), LengthEmbeddings(), max_open=1, refresh_seconds=0)
+    first = indexes.get("patient-1")
+    first.add_documents([Document(page_content="kept on disk")])
+    indexes.get("patient-2")
+
+    reopened = indexes.get("patient-1")
+
+    assert reopened is not first
+    assert [document.page_content for document, _ in reopened.similarity_search_with_score("x")] == ["kept on disk"]
+
+
+def test_search_by_vector_does_not_embed_the_query(tmp_path):
+    embeddings = LengthEmbeddings()
+    index = SegmentedIndex(str(tmp_path), embeddings, refresh_seconds=0)
+    index.add_documents([Document(page_content="abc"), Document(page_content="abcdefgh")])
+    embeddings.embed_query = None
+
+    results = asyncio.run(index.asimilarity_search_with_score_by_vector([3.0, 1.0], k=1))
+
+    assert [document.page_content for document, _ in results] == ["abc"]
+
+
+def contents(index):
+    return sorted(document.page_content for document, _ in index.similarity_search_with_score("x", k=100))
+
+
+def test_unreadable_shipped_index_is_not_adopted(tmp_path):
+    (tmp_path / "index.faiss").write_bytes(b"not an index")
+    (tmp_path / "index.pkl").write_bytes(b"not a pickle")
+    index = SegmentedIndex(str(tmp_path), LengthEmbeddings(), refresh_seconds=0)
+
+    assert index.is_empty
+    index.add_documents([Document(page_content="added")])
+
+    assert contents(index) == ["added"]
+    assert "." not in json.loads((tmp_path / "manifest.json").read_text())["segments"]
+
+
+def test_unreadable_segment_is_skipped(tmp_path):
+    writer = SegmentedIndex(str(tmp_path), LengthEmbeddings(), refresh_seconds=0)
+    writer.add_documents([Document(page_content="corrupted")])
+    writer.add_documents([Document(page_content="intact")])
+    corrupted = json.loads((tmp_path / "manifest.json").read_text())["segments"][0]
+    (tmp_path / corrupted / "index.pkl").write_bytes(b"not a pickle")
+
+    reader = SegmentedIndex(str(tmp_path), LengthEmbeddings(), refresh_seconds=0)
+
+    assert contents(reader) == ["intact"]
+    reader.add_documents([Document(page_content="added")])
+    assert corrupted not in json.loads((tmp_path / "manifest.json").read_text())["segments"]
+    assert (tmp_path / "segments" / f".quarantined-{(tmp_path / corrupted).name}" / "index.pkl").exists()
+    assert contents(reader) == ["added", "intact"]
+
+
+def segment_sizes(tmp_path):
+    segments = json.loads((tmp_path / "manifest.json").read_text())["segments"]
+    return sorted(read_segment(str(tmp_path / segment), LengthEmbeddings()).index.ntotal for segment in segments)
+
+
+def test_compaction_merges_only_the_small_segments(tmp_path):
+    index = SegmentedIndex(str(tmp_path), LengthEmbeddings(), max_segments=3, refresh_seconds=0)
+    index.add_documents([Document(page_content=f"large {i}") for i in range(20)])
+    index.add_documents([Document(page_content="small 1")])
+    index.add_documents([Document(page_content="small 2")])
+
+    index.add_documents([Document(page_content="small 3")])
+
+    assert segment_sizes(tmp_path) == [3, 20]
+    assert len(contents(index)) == 23
+
+
+def test_compaction_merges_similar_sizes_together(tmp_path):
+    index = SegmentedIndex(str(tmp_path), LengthEmbeddings(), max_segments=3, refresh_seconds=0)
+    for i in range(4):
+        index.add_documents([Document(page_content=f"text {i} {j}") for j in range(5)])
+
+    assert segment_sizes(tmp_path) == [20]
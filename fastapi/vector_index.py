@@ -0,0 +1,354 @@
+"""
+FAISS index kept on disk as immutable segments, shared by worker processes.
+
+Every /add-data call writes its vectors as a new segment directory and then
+publishes it by atomically replacing manifest.json, so nothing already on disk
+is rewritten. Workers map the segments read-only, notice a new manifest on
+their next query and load only the segments they have not seen yet, swapping
+the new view in without a rebuild. A segment that cannot be read is skipped,
+and the next writer moves it aside to .quarantined-<name> and leaves it out of
+the manifest. When there are too many segments the smallest ones are compacted into one.
+PartitionedIndex keeps one such index per patient or tenant key, each in its
+own directory, so a query only searches the data of its own key.
+
+Layout of the index directory:
+    manifest.json               {"version": 3, "segments": [".", "segments/..."]}
+    index.faiss, index.pkl      index shipped with the repo, the first segment
+    segments/<name>/index.faiss, index.pkl
+    patients/<key>/             the same layout, one per partition
+"""
+import fcntl
+import json
+import logging
+import os
+import pickle
+import re
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+import faiss
+from langchain_community.vectorstores import FAISS
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables.config import run_in_executor
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+LOCK_NAME = ".lock"
+SEGMENTS_DIR = "segments"
+# The index.faiss/index.pkl pair at the top of the directory, if any
+ROOT_SEGMENT = "."
+PARTITIONS_DIR = "patients"
+# A compaction takes the two smallest segments and then every next one that is
+# at most this many times the size of those taken so far
+MERGE_SIZE_RATIO = 2
+# Partition keys become directory names
+PARTITION_KEY_PATTERN = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]{0,127}")
+
+# Map segments instead of reading them into memory; the flat-codes flag only
+# exists in newer faiss releases
+MMAP_FLAGS = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+
+
+def read_segment(path: str, embeddings, mmap: bool = True) -> FAISS:
+    """Load a segment saved with FAISS.save_local, memory-mapped where the index type allows it"""
+    index_path = os.path.join(path, "index.faiss")
+    index = None
+    if mmap:
+        try:
+            index = faiss.read_index(index_path, MMAP_FLAGS)
+        except RuntimeError:
+            logger.info(f"Index type of {path} cannot be memory-mapped, reading it into memory")
+    if index is None:
+        index = faiss.read_index(index_path)
+
+    with open(os.path.join(path, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+
+class SegmentedIndex:
+    """A FAISS index made of read-only segments published through a manifest"""
+
+    def __init__(self, directory: str, embeddings, max_segments: int = 16, refresh_seconds: float = 2.0):
+        self.directory = directory
+        self.embeddings = embeddings
+        self.max_segments = max_segments
+        self.refresh_seconds = refresh_seconds
+
+        self.version = -1
+        self._segments: Dict[str, FAISS] = {}
+        self._manifest_mtime = None
+        self._checked_at = 0.0
+        self._refresh_lock = threading.Lock()
+
+    @property
+    def is_empty(self) -> bool:
+        self.refresh_if_stale()
+        return not self._segments
+
+    @property
+    def segment_count(self) -> int:
+        return len(self._segments)
+
+    def _path(self, *parts: str) -> str:
+        return os.path.normpath(os.path.join(self.directory, *parts))
+
+    @contextmanager
+    def _write_lock(self):
+        """Serialize manifest updates across threads and worker processes"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(LOCK_NAME), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        try:
+            with open(self._path(MANIFEST_NAME)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            # No segment was ever added; use the shipped index if there is one
+            if os.path.exists(self._path("index.faiss")):
+                return {"version": 0, "segments": [ROOT_SEGMENT]}
+            return {"version": 0, "segments": []}
+
+    def _write_manifest(self, manifest: Dict[str, Any]) -> None:
+        tmp_path = self._path(f"{MANIFEST_NAME}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._path(MANIFEST_NAME))
+
+    def refresh(self) -> bool:
+        """Swap in the current manifest's segments, loading only new ones; returns whether the view changed"""
+        with self._refresh_lock:
+            self._checked_at = time.monotonic()
+            try:
+                mtime = os.stat(self._path(MANIFEST_NAME)).st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+            if mtime == self._manifest_mtime and self.version >= 0:
+                return False
+
+            manifest = self._read_manifest()
+            if manifest["version"] == self.version:
+                self._manifest_mtime = mtime
+                return False
+
+            segments = self._load_segments(manifest["segments"])
+            self._segments = segments
+            self.version = manifest["version"]
+            self._manifest_mtime = mtime
+            logger.info(f"Loaded FAISS index version {self.version} with {len(segments)} segments")
+            return True
+
+    def _load_segments(self, names: List[str]) -> Dict[str, FAISS]:
+        """Load the named segments, reusing loaded ones and skipping any that cannot be read"""
+        segments = {}
+        for name in names:
+            store = self._segments.get(name)
+            if store is None:
+                try:
+                    store = read_segment(self._path(name), self.embeddings)
+                except Exception as e:
+                    # e.g. a shipped index pickled by another library version;
+                    # the rest of the index stays searchable
+                    logger.warning(f"Skipping unreadable FAISS segment {name}: {e}")
+                    continue
+            segments[name] = store
+        return segments
+
+    def refresh_if_stale(self) -> None:
+        if time.monotonic() - self._checked_at >= self.refresh_seconds:
+            self.refresh()
+
+    def add_documents(self, documents: List[Document], vectors: Optional[List[List[float]]] = None) -> None:
+        """Write the documents as a new segment and publish it, embedding them unless vectors are given"""
+        if not documents:
+            return
+
+        if vectors is None:
+            vectors = self.embeddings.embed_documents([document.page_content for document in documents])
+        store = FAISS.from_embeddings(
+            [(document.page_content, vector) for document, vector in zip(documents, vectors)],
+            self.embeddings,
+            metadatas=[document.metadata for document in documents]
+        )
+
+        # Saving under the lock keeps a compaction from deleting an unpublished segment
+        with self._write_lock():
+            name = self._save_segment(store)
+            manifest = self._read_manifest()
+            # Only publish segments this process can read, so an unreadable
+            # one (such as an incompatible shipped index) is dropped rather
+            # than carried into every later version
+            readable = self._load_segments(manifest["segments"])
+            for unreadable in manifest["segments"]:
+                if unreadable not in readable:
+                    self._quarantine(unreadable)
+            # Vector count of each segment, which decides what is compacted
+            sizes = {segment: segment_store.index.ntotal for segment, segment_store in readable.items()}
+            sizes[name] = store.index.ntotal
+            manifest = {"version": manifest["version"] + 1, "segments": list(sizes)}
+            if len(manifest["segments"]) > self.max_segments:
+                manifest = self._compact(manifest, sizes)
+            self._write_manifest(manifest)
+
+        self.refresh()
+
+    def _save_segment(self, store: FAISS) -> str:
+        """Save a store under a fresh segment name, appearing on disk all at once"""
+        segments_dir = self._path(SEGMENTS_DIR)
+        os.makedirs(segments_dir, exist_ok=True)
+        name = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+        tmp_dir = os.path.join(segments_dir, f".{name}.tmp")
+        store.save_local(tmp_dir)
+        os.rename(tmp_dir, os.path.join(segments_dir, name))
+        return os.path.join(SEGMENTS_DIR, name)
+
+    def _quarantine(self, name: str) -> None:
+        """Move an unreadable segment aside, out of reach of the compaction cleanup"""
+        if name == ROOT_SEGMENT:
+            # Not under segments/, so never cleaned up
+            return
+        path = self._path(name)
+        quarantined = os.path.join(os.path.dirname(path), f".quarantined-{os.path.basename(path)}")
+        try:
+            os.rename(path, quarantined)
+            logger.warning(f"Moved unreadable FAISS segment {name} to {quarantined}")
+        except OSError as e:
+            logger.warning(f"Could not quarantine FAISS segment {name}: {e}")
+
+    def _compact(self, manifest: Dict[str, Any], sizes: Dict[str, int]) -> Dict[str, Any]:
+        """Merge the smallest segments into one; called with the write lock held
+
+        Large segments are only rewritten once the small ones merged so far
+        have grown close to their size, so a compaction under the lock copies
+        a few recent segments rather than the whole corpus.
+        """
+        by_size = sorted(manifest["segments"], key=sizes.get)
+        merging = by_size[:2]
+        merged_size = sum(sizes[name] for name in merging)
+        for name in by_size[2:]:
+            if sizes[name] > MERGE_SIZE_RATIO * merged_size:
+                break
+            merging.append(name)
+            merged_size += sizes[name]
+
+        stores = [read_segment(self._path(name), self.embeddings, mmap=False) for name in merging]
+        merged = stores[0]
+        for store in stores[1:]:
+            merged.merge_from(store)
+        name = self._save_segment(merged)
+
+        # Segments dropped by the previous compaction are deleted now rather
+        # than immediately, so a worker still loading them is not cut short
+        live = set(manifest["segments"])
+        segments_dir = self._path(SEGMENTS_DIR)
+        for entry in os.listdir(segments_dir):
+            path = os.path.join(SEGMENTS_DIR, entry)
+            if path not in live and path != name and not entry.startswith("."):
+                shutil.rmtree(os.path.join(segments_dir, entry), ignore_errors=True)
+
+        logger.info(f"Compacted {len(stores)} FAISS segments with {merged_size} vectors into {name}")
+        kept = [segment for segment in manifest["segments"] if segment not in merging]
+        return {"version": manifest["version"], "segments": kept + [name]}
+
+    def similarity_search_with_score(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
+        """Search every segment with one query embedding and keep the k closest"""
+        self.refresh_if_stale()
+        if not self._segments:
+            return []
+        return self.similarity_search_with_score_by_vector(self.embeddings.embed_query(query), k)
+
+    async def asimilarity_search_with_score(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
+        """Async search, embedding the query without blocking the event loop"""
+        await run_in_executor(None, self.refresh_if_stale)
+        if not self._segments:
+            return []
+        embedding = await self.embeddings.aembed_query(query)
+        return await self.asimilarity_search_with_score_by_vector(embedding, k)
+
+    async def asimilarity_search_with_score_by_vector(
+        self, embedding: List[float], k: int = 4
+    ) -> List[Tuple[Document, float]]:
+        """Async search with a query embedding the caller already has"""
+        await run_in_executor(None, self.refresh_if_stale)
+        return await run_in_executor(None, self.similarity_search_with_score_by_vector, embedding, k)
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4) -> List[Tuple[Document, float]]:
+        segments = list(self._segments.values())
+        results = [
+            result
+            for store in segments
+            for result in store.similarity_search_with_score_by_vector(embedding, k=k)
+        ]
+        # Scores are L2 distances, smaller is closer
+        results.sort(key=lambda result: result[1])
+        return results[:k]
+
+    def as_retriever(self, k: int = 4) -> "SegmentedRetriever":
+        return SegmentedRetriever(index=self, k=k)
+
+
+class PartitionedIndex:
+    """A SegmentedIndex per partition key, stored under patients/<key>"""
+
+    def __init__(self, directory: str, embeddings, max_open: int = 256, **index_options: Any):
+        self.directory = directory
+        self.embeddings = embeddings
+        self.max_open = max_open
+        self.index_options = index_options
+
+        # Recently used partitions stay loaded, the rest are reopened on demand
+        self._open: "OrderedDict[str, SegmentedIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> SegmentedIndex:
+        """Return the index of a partition, creating it on its first write"""
+        if not PARTITION_KEY_PATTERN.fullmatch(key):
+            raise ValueError(f"Invalid partition key: {key!r}")
+
+        with self._lock:
+            index = self._open.get(key)
+            if index is not None:
+                self._open.move_to_end(key)
+                return index
+
+            index = SegmentedIndex(
+                os.path.join(self.directory, PARTITIONS_DIR, key),
+                self.embeddings,
+                **self.index_options
+            )
+            self._open[key] = index
+            # Dropping the last reference unmaps the segments; queries still
+            # holding the index finish on it
+            while len(self._open) > self.max_open:
+                self._open.popitem(last=False)
+            return index
+
+
+class SegmentedRetriever(BaseRetriever):
+    """Retriever over a SegmentedIndex, following its hot swaps"""
+
+    index: Any
+    k: int = 4
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return [document for document, _ in self.index.similarity_search_with_score(query, self.k)]
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return [document for document, _ in await self.index.asimilarity_search_with_score(query, self.k)]
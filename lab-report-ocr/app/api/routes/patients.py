@@ -0,0 +1,74 @@
+import logging
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from app.api.serialization import ORJSONResponse
+from app.core.config import settings
+from app.db.database import get_database
+from app.db.repositories.observations import ObservationRepository
+from app.db.search import normalize_text
+from app.models.schemas.observation import AnalyteListResponse, AnalyteSeriesResponse
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+@router.get("/{phone_number}/analytes", response_model=AnalyteListResponse)
+async def get_analytes(
+    phone_number: str,
+    db = Depends(get_database)
+):
+    """
+    List the analytes observed in a patient's reports
+    """
+    try:
+        analytes = await ObservationRepository(db).list_analytes(phone_number)
+        return ORJSONResponse({"phone_number": phone_number, "analytes": analytes})
+    
+    except Exception as e:
+        logger.error(f"Error retrieving analytes: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error retrieving analytes: {str(e)}"
+        )
+
+
+@router.get("/{phone_number}/analytes/{name}", response_model=AnalyteSeriesResponse)
+async def get_analyte_series(
+    phone_number: str,
+    name: str,
+    from_date: Optional[datetime] = Query(None),
+    to_date: Optional[datetime] = Query(None),
+    limit: int = Query(settings.OBSERVATIONS_SERIES_MAX_POINTS, ge=1, le=settings.OBSERVATIONS_SERIES_MAX_POINTS),
+    db = Depends(get_database)
+):
+    """
+    Get the values of one analyte across a patient's reports, oldest first
+    
+    The name is matched case- and punctuation-insensitively, so "Haemoglobin (Hb)"
+    and "haemoglobin hb" return the same series.
+    """
+    try:
+        analyte = normalize_text(name)
+        observations = await ObservationRepository(db).find_series(
+            phone_number, analyte, from_date=from_date, to_date=to_date, limit=limit
+        )
+        
+        if not observations:
+            raise HTTPException(
+                status_code=404,
+                detail=f"No observations of {name} for phone number {phone_number}"
+            )
+        
+        return ORJSONResponse({"phone_number": phone_number, "analyte": analyte, "observations": observations})
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error retrieving analyte series: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error retrieving analyte series: {str(e)}"
+        )
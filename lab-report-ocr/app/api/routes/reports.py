@@ -1,59 +1,67 @@
+import asyncio
+import json
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator, Optional
 from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from bson import ObjectId
 from pymongo import DESCENDING
 
+from app.api.serialization import ORJSONResponse, dumps, serialize_report, serialize_reports
+from app.core.config import settings
 from app.db.database import get_database
+from app.db.pagination import (
+    COUNT_EXACT,
+    COUNT_NONE,
+    InvalidCursorError,
+    count_matching,
+    fetch_page,
+)
+from app.db.repositories.jobs import JobRepository
+from app.db.repositories.observations import ObservationRepository
+from app.db.search import search_filter
+from app.models.schemas.job import ReportJobCreatedResponse, ReportJobStatusResponse
 from app.models.schemas.report import (
     ReportUploadRequest,
     ReportQueryRequest,
     LabReportResponse,
     LabReportListResponse,
+    LabReportSummaryListResponse,
     LabReportUploadResponse,
 )
-from app.services.ocr.image_processor import ImageProcessor
-from app.services.ocr.pdf_processor import PDFProcessor
+from app.services.ocr.cache import ocr_cache
+from app.services.ocr.backend import ocr_backend_class
+from app.services.ocr.image_preparation import image_preparer
+from app.services.ingestion.report_ingestion import (
+    ArchiveError,
+    ReportIngestionService,
+    report_ingestion,
+)
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# Initialize processors
-image_processor = ImageProcessor()
-pdf_processor = PDFProcessor()
-
-
-def fix_datetime_fields(data: Dict[str, Any]) -> Dict[str, Any]:
-    """Fix empty or invalid datetime fields in the data"""
-    # Handle collection_info datetime fields
-    if "collection_info" in data and data["collection_info"]:
-        for field in ["registered_on", "collected_on", "received_on", "reported_on"]:
-            if field in data["collection_info"]:
-                value = data["collection_info"][field]
-                if value == "" or value is None:
-                    data["collection_info"][field] = None
-                elif isinstance(value, str):
-                    try:
-                        # Try to parse if it's a string
-                        data["collection_info"][field] = datetime.fromisoformat(value)
-                    except ValueError:
-                        # If parsing fails, set to None
-                        data["collection_info"][field] = None
-    
-    # Handle timestamp fields
-    for field in ["created_at", "updated_at"]:
-        if field in data and isinstance(data[field], str):
-            try:
-                data[field] = datetime.fromisoformat(data[field])
-            except ValueError:
-                data[field] = datetime.utcnow()
-        elif field not in data or data[field] is None:
-            data[field] = datetime.utcnow()
-    
-    return data
+# Fields read for summary listings, the full report is fetched by ID
+SUMMARY_PROJECTION = {
+    "test_name": 1,
+    "test_category": 1,
+    "report_info.lab_name": 1,
+    "collection_info.reported_on": 1,
+    "abnormal_count": 1,
+    "created_at": 1,
+}
+
+
+def _phone_query(phone_number: str, test_type: Optional[str]) -> Dict[str, Any]:
+    """
+    Build the query for a patient's reports, optionally filtered by test name
+    """
+    query = {"patient_info.phone_number": phone_number}
+    if test_type:
+        query.update(search_filter("test_name", test_type))
+    return query
 
 
 @router.post("/upload", response_model=LabReportUploadResponse)
@@ -67,58 +75,27 @@ async def upload_report(
     Upload and process a lab report (PDF or image)
     """
     try:
-        # Determine file type and process accordingly
-        content_type = file.content_type
-        
-        if "image" in content_type:
-            # Process as image
-            report_data = await image_processor.process_image_file(file, phone_number)
-        elif content_type == "application/pdf":
-            # Process as PDF
-            report_data = await pdf_processor.process_pdf_file(file, phone_number)
-        else:
+        if not ReportIngestionService.is_supported(file.content_type):
             raise HTTPException(
                 status_code=400,
-                detail=f"Unsupported file type: {content_type}. Only images and PDFs are supported."
+                detail=f"Unsupported file type: {file.content_type}. Only images and PDFs are supported."
             )
         
-        # Add patient name if provided
-        if patient_name and "patient_info" in report_data:
-            report_data["patient_info"]["name"] = patient_name
-        
-        # Fix datetime fields
-        report_data = fix_datetime_fields(report_data)
-        
-        # Ensure required fields have default values
-        if "test_name" not in report_data or not report_data["test_name"]:
-            report_data["test_name"] = "Laboratory Test"
-            
-        if "test_category" not in report_data or not report_data["test_category"]:
-            report_data["test_category"] = "General"
-            
-        # Ensure report_info has a lab_name
-        if "report_info" not in report_data:
-            report_data["report_info"] = {"lab_name": "Unknown Laboratory"}
-        elif "lab_name" not in report_data["report_info"] or not report_data["report_info"]["lab_name"]:
-            report_data["report_info"]["lab_name"] = "Unknown Laboratory"
-            
-        # Ensure metadata has report_type
-        if "metadata" not in report_data:
-            report_data["metadata"] = {"report_type": "Laboratory Test"}
-        elif "report_type" not in report_data["metadata"] or not report_data["metadata"]["report_type"]:
-            # Use test_name as the report_type if available, otherwise default to "Laboratory Test"
-            report_data["metadata"]["report_type"] = report_data.get("test_name", "Laboratory Test")
+        # Extract, map and normalize the report
+        report_data = await report_ingestion.extract_upload(file, phone_number, patient_name)
         
         # Insert into database
-        result = await db.reports.insert_one(report_data)
+        report_id = await ReportIngestionService.store(db, report_data)
         
         # Return success response
         return {
-            "report_id": str(result.inserted_id),
+            "report_id": report_id,
             "message": "Report uploaded and processed successfully",
             "success": True
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing report upload: {str(e)}")
         raise HTTPException(
@@ -127,76 +104,333 @@ async def upload_report(
         )
 
 
+async def _stream_batch_outcomes(db, items, phone_number: str, patient_name: str) -> AsyncIterator[bytes]:
+    """Run a batch through the ingestion pipeline and encode each outcome as an NDJSON line"""
+    outcomes = report_ingestion.ingest_batch(
+        db, items, phone_number, patient_name, concurrency=settings.BATCH_UPLOAD_CONCURRENCY
+    )
+    async for outcome in outcomes:
+        yield (json.dumps(outcome) + "\n").encode("utf-8")
+
+
+@router.post("/upload/batch")
+async def upload_reports_batch(
+    files: List[UploadFile] = File(...),
+    phone_number: str = Form(...),
+    patient_name: str = Form(None),
+    db = Depends(get_database)
+):
+    """
+    Upload and process many lab reports in one request
+    
+    Per-file outcomes are streamed back as NDJSON while the files complete;
+    the reports are stored with a single insert_many at the end.
+    """
+    if len(files) > settings.BATCH_UPLOAD_MAX_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many files: {len(files)}. At most {settings.BATCH_UPLOAD_MAX_FILES} are allowed per batch."
+        )
+    
+    # Read the uploads up front, they are closed once the handler returns
+    items = [(file.filename, file.content_type, await file.read()) for file in files]
+    
+    return StreamingResponse(
+        _stream_batch_outcomes(db, items, phone_number, patient_name),
+        media_type="application/x-ndjson"
+    )
+
+
+@router.post("/upload/archive")
+async def upload_reports_archive(
+    file: UploadFile = File(...),
+    phone_number: str = Form(...),
+    patient_name: str = Form(None),
+    db = Depends(get_database)
+):
+    """
+    Upload a zip archive of lab reports and process every report in it
+    
+    Per-file outcomes are streamed back as NDJSON, as for /upload/batch.
+    """
+    content = await file.read()
+    try:
+        # Decompression is CPU bound, keep it off the event loop
+        items = await asyncio.to_thread(
+            ReportIngestionService.unpack_archive,
+            content,
+            max_files=settings.BATCH_UPLOAD_MAX_FILES,
+            max_uncompressed_bytes=settings.BATCH_ARCHIVE_MAX_UNCOMPRESSED_BYTES
+        )
+    except ArchiveError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return StreamingResponse(
+        _stream_batch_outcomes(db, items, phone_number, patient_name),
+        media_type="application/x-ndjson"
+    )
+
+
+@router.post("/upload/async", response_model=ReportJobCreatedResponse, status_code=202)
+async def upload_report_async(
+    file: UploadFile = File(...),
+    phone_number: str = Form(...),
+    patient_name: str = Form(None),
+    db = Depends(get_database)
+):
+    """
+    Queue a lab report (PDF or image) for background processing
+    
+    Returns a job ID immediately; poll GET /reports/jobs/{job_id} for progress.
+    """
+    try:
+        if not ReportIngestionService.is_supported(file.content_type):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unsupported file type: {file.content_type}. Only images and PDFs are supported."
+            )
+        
+        if file.size is not None and file.size > settings.REPORT_JOB_MAX_FILE_BYTES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File is too large for background processing (max {settings.REPORT_JOB_MAX_FILE_BYTES} bytes)"
+            )
+        
+        content = await file.read()
+        if len(content) > settings.REPORT_JOB_MAX_FILE_BYTES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File is too large for background processing (max {settings.REPORT_JOB_MAX_FILE_BYTES} bytes)"
+            )
+        
+        job_id = await JobRepository(db).enqueue(
+            content,
+            file.content_type,
+            file.filename,
+            phone_number,
+            patient_name,
+            max_attempts=settings.REPORT_JOB_MAX_ATTEMPTS
+        )
+        
+        return {"job_id": job_id, "status": "queued", "message": "Report queued for processing"}
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error queueing report upload: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error queueing report: {str(e)}"
+        )
+
+
+@router.get("/jobs/{job_id}", response_model=ReportJobStatusResponse)
+async def get_report_job(
+    job_id: str,
+    db = Depends(get_database)
+):
+    """
+    Get the progress of a queued report upload
+    """
+    try:
+        if not ObjectId.is_valid(job_id):
+            raise HTTPException(status_code=404, detail=f"Job with ID {job_id} not found")
+        
+        job = await JobRepository(db).find_status(job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail=f"Job with ID {job_id} not found")
+        
+        job["job_id"] = str(job.pop("_id"))
+        job["filename"] = job.get("file", {}).get("filename")
+        return job
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error retrieving report job: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error retrieving report job: {str(e)}"
+        )
+
+
 @router.get("/by-phone/{phone_number}", response_model=LabReportListResponse)
 async def get_reports_by_phone(
     phone_number: str,
     limit: int = Query(10, ge=1, le=100),
     skip: int = Query(0, ge=0),
     test_type: str = Query(None),
+    cursor: Optional[str] = Query(None),
+    count: Optional[str] = Query(None, pattern="^(exact|estimated|none)$"),
     db = Depends(get_database)
 ):
     """
     Get all reports for a specific phone number
+    
+    Pages are fetched by keyset: pass next_cursor back as cursor to get the
+    next page. The total is counted exactly on the first page and skipped on
+    the following ones unless count is given.
     """
     try:
-        # Build query
-        query = {"patient_info.phone_number": phone_number}
+        if cursor and skip:
+            raise HTTPException(status_code=400, detail="Use either skip or cursor, not both")
         
-        # Add test type filter if provided
-        if test_type:
-            query["test_name"] = {"$regex": test_type, "$options": "i"}
+        # Build query
+        query = _phone_query(phone_number, test_type)
         
         # Get total count
-        total = await db.reports.count_documents(query)
+        count_mode = count or (COUNT_NONE if cursor else COUNT_EXACT)
+        total, total_is_estimate = await count_matching(db.reports, query, count_mode)
         
         # Get reports
-        cursor = db.reports.find(query).sort("created_at", DESCENDING).skip(skip).limit(limit)
+        documents, next_cursor = await fetch_page(
+            db.reports,
+            query,
+            limit=limit,
+            cursor=cursor,
+            sort_field="created_at",
+            sort_direction=DESCENDING,
+            skip=skip
+        )
+        
+        # Return response, documents are normalized when they are written
+        return ORJSONResponse({
+            "reports": serialize_reports(documents),
+            "total": total,
+            "total_is_estimate": total_is_estimate,
+            "next_cursor": next_cursor
+        })
+    
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error retrieving reports: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error retrieving reports: {str(e)}"
+        )
+
+
+@router.get("/by-phone/{phone_number}/summary", response_model=LabReportSummaryListResponse)
+async def get_report_summaries_by_phone(
+    phone_number: str,
+    limit: int = Query(10, ge=1, le=100),
+    test_type: str = Query(None),
+    cursor: Optional[str] = Query(None),
+    count: Optional[str] = Query(None, pattern="^(exact|estimated|none)$"),
+    db = Depends(get_database)
+):
+    """
+    Get a lightweight listing of the reports for a phone number
+    
+    Only the fields a list screen shows are read from the database; fetch a
+    full report with GET /{report_id}. Paging and counting work as in
+    GET /by-phone/{phone_number}.
+    """
+    try:
+        query = _phone_query(phone_number, test_type)
+        
+        count_mode = count or (COUNT_NONE if cursor else COUNT_EXACT)
+        total, total_is_estimate = await count_matching(db.reports, query, count_mode)
+        
+        documents, next_cursor = await fetch_page(
+            db.reports,
+            query,
+            limit=limit,
+            cursor=cursor,
+            sort_field="created_at",
+            sort_direction=DESCENDING,
+            projection=SUMMARY_PROJECTION
+        )
         
-        # Convert to list and format for response
         reports = []
-        async for doc in cursor:
-            # Set the ID field
-            doc["id"] = str(doc.pop("_id"))
-            
-            # Fix datetime fields
-            doc = fix_datetime_fields(doc)
-            
-            # Ensure required fields have default values
-            if "test_name" not in doc or not doc["test_name"]:
-                doc["test_name"] = "Laboratory Test"
-                
-            if "test_category" not in doc or not doc["test_category"]:
-                doc["test_category"] = "General"
-                
-            # Ensure report_info has a lab_name
-            if "report_info" not in doc:
-                doc["report_info"] = {"lab_name": "Unknown Laboratory"}
-            elif "lab_name" not in doc["report_info"] or not doc["report_info"]["lab_name"]:
-                doc["report_info"]["lab_name"] = "Unknown Laboratory"
-                
-            # Ensure metadata has report_type
-            if "metadata" not in doc:
-                doc["metadata"] = {"report_type": "Laboratory Test"}
-            elif "report_type" not in doc["metadata"] or not doc["metadata"]["report_type"]:
-                # Use test_name as the report_type if available, otherwise default to "Laboratory Test"
-                doc["metadata"]["report_type"] = doc.get("test_name", "Laboratory Test")
-            
-            reports.append(doc)
+        for doc in documents:
+            reports.append({
+                "id": str(doc["_id"]),
+                "test_name": doc.get("test_name") or "Laboratory Test",
+                "test_category": doc.get("test_category") or "General",
+                "lab_name": (doc.get("report_info") or {}).get("lab_name") or "Unknown Laboratory",
+                "reported_on": (doc.get("collection_info") or {}).get("reported_on"),
+                "abnormal_count": doc.get("abnormal_count"),
+                # Reports stored before created_at was set do not have it
+                "created_at": doc.get("created_at"),
+            })
         
-        # Return response
-        return {
+        return ORJSONResponse({
             "reports": reports,
-            "total": total
-        }
+            "total": total,
+            "total_is_estimate": total_is_estimate,
+            "next_cursor": next_cursor
+        })
     
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"Error retrieving reports: {str(e)}")
+        logger.error(f"Error retrieving report summaries: {str(e)}")
         raise HTTPException(
             status_code=500,
-            detail=f"Error retrieving reports: {str(e)}"
+            detail=f"Error retrieving report summaries: {str(e)}"
         )
 
 
+async def _stream_reports(cursor, batch_size: int) -> AsyncIterator[bytes]:
+    """Encode the reports of a cursor as NDJSON, one chunk per fetched batch"""
+    lines = []
+    try:
+        async for doc in cursor:
+            lines.append(dumps(serialize_report(doc)))
+            if len(lines) >= batch_size:
+                yield b"\n".join(lines) + b"\n"
+                lines = []
+        if lines:
+            yield b"\n".join(lines) + b"\n"
+    except Exception as e:
+        # Headers are already sent, the truncated body is all the client gets
+        logger.error(f"Error exporting reports: {str(e)}")
+        raise
+    finally:
+        await cursor.close()
+
+
+@router.get("/by-phone/{phone_number}/export")
+async def export_reports_by_phone(
+    phone_number: str,
+    test_type: str = Query(None),
+    batch_size: int = Query(settings.REPORT_EXPORT_BATCH_SIZE, ge=1, le=settings.REPORT_EXPORT_MAX_BATCH_SIZE),
+    db = Depends(get_database)
+):
+    """
+    Export every report for a phone number as NDJSON, newest upload first
+    
+    Reports are streamed from the database cursor batch_size at a time, so
+    memory use does not grow with the number of reports.
+    """
+    cursor = db.reports.find(_phone_query(phone_number, test_type)) \
+        .sort([("created_at", DESCENDING), ("_id", DESCENDING)]) \
+        .batch_size(batch_size)
+    
+    return StreamingResponse(
+        _stream_reports(cursor, batch_size),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="reports-{phone_number}.ndjson"'}
+    )
+
+
+@router.get("/ocr/stats")
+async def get_ocr_stats():
+    """
+    Get OCR cache counters, image preparation savings and extraction
+    parse outcomes and latencies
+    """
+    return {
+        "cache": ocr_cache.get_stats(),
+        "image_preparation": image_preparer.get_stats(),
+        "extraction": ocr_backend_class().get_stats(),
+    }
+
+
 @router.get("/{report_id}", response_model=LabReportResponse)
 async def get_report_by_id(
     report_id: str,
@@ -218,34 +452,10 @@ async def get_report_by_id(
                 detail=f"Report with ID {report_id} not found"
             )
         
-        # Format for response
-        report["id"] = str(report.pop("_id"))
-        
-        # Fix datetime fields
-        report = fix_datetime_fields(report)
-        
-        # Ensure required fields have default values
-        if "test_name" not in report or not report["test_name"]:
-            report["test_name"] = "Laboratory Test"
-            
-        if "test_category" not in report or not report["test_category"]:
-            report["test_category"] = "General"
-            
-        # Ensure report_info has a lab_name
-        if "report_info" not in report:
-            report["report_info"] = {"lab_name": "Unknown Laboratory"}
-        elif "lab_name" not in report["report_info"] or not report["report_info"]["lab_name"]:
-            report["report_info"]["lab_name"] = "Unknown Laboratory"
-            
-        # Ensure metadata has report_type
-        if "metadata" not in report:
-            report["metadata"] = {"report_type": "Laboratory Test"}
-        elif "report_type" not in report["metadata"] or not report["metadata"]["report_type"]:
-            # Use test_name as the report_type if available, otherwise default to "Laboratory Test"
-            report["metadata"]["report_type"] = report.get("test_name", "Laboratory Test")
-        
-        return report
+        return ORJSONResponse(serialize_report(report))
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error retrieving report: {str(e)}")
         raise HTTPException(
@@ -275,11 +485,16 @@ async def delete_report(
                 detail=f"Report with ID {report_id} not found"
             )
         
+        # Delete the observations derived from it
+        await ObservationRepository(db).delete_for_report(oid)
+        
         return JSONResponse(
             status_code=200,
             content={"message": f"Report with ID {report_id} deleted successfully"}
         )
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error deleting report: {str(e)}")
         raise HTTPException(
@@ -1,11 +1,22 @@
 import logging
+from datetime import datetime
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.responses import JSONResponse
 from bson import ObjectId
 from pymongo import DESCENDING
+from pymongo.errors import DuplicateKeyError
 
+from app.api.serialization import ORJSONResponse, serialize_user, serialize_users
 from app.db.database import get_database
+from app.db.pagination import (
+    COUNT_EXACT,
+    COUNT_NONE,
+    InvalidCursorError,
+    count_matching,
+    fetch_page,
+)
+from app.db.search import SEARCH_KEYS_FIELD, search_filter, search_tokens
 from app.models.schemas.user import (
     UserCreate, 
     UserResponse, 
@@ -35,16 +46,23 @@ async def create_user(
                 detail=f"User with phone number {user.phone_number} already exists"
             )
         
-        # Insert user
+        # Insert user with the normalized keys its name is searched by
         user_dict = user.model_dump()
+        user_dict[SEARCH_KEYS_FIELD] = {"name": search_tokens(user_dict["name"])}
+        user_dict["created_at"] = user_dict["updated_at"] = datetime.utcnow()
         result = await db.users.insert_one(user_dict)
         
         # Get created user
         created_user = await db.users.find_one({"_id": result.inserted_id})
-        created_user["id"] = str(created_user.pop("_id"))
         
-        return created_user
+        return ORJSONResponse(serialize_user(created_user))
     
+    except DuplicateKeyError:
+        # A concurrent request created the same phone number or email
+        raise HTTPException(
+            status_code=400,
+            detail="A user with this phone number or email already exists"
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -60,35 +78,53 @@ async def get_users(
     limit: int = Query(10, ge=1, le=100),
     skip: int = Query(0, ge=0),
     name: Optional[str] = None,
+    cursor: Optional[str] = Query(None),
+    count: Optional[str] = Query(None, pattern="^(exact|estimated|none)$"),
     db = Depends(get_database)
 ):
     """
     Get all users with optional filtering
+    
+    Pass next_cursor back as cursor to get the next page. The total is
+    counted exactly on the first page and skipped on the following ones
+    unless count is given.
     """
     try:
+        if cursor and skip:
+            raise HTTPException(status_code=400, detail="Use either skip or cursor, not both")
+        
         # Build query
         query = {}
         if name:
-            query["name"] = {"$regex": name, "$options": "i"}
+            query.update(search_filter("name", name))
         
         # Get total count
-        total = await db.users.count_documents(query)
+        count_mode = count or (COUNT_NONE if cursor else COUNT_EXACT)
+        total, total_is_estimate = await count_matching(db.users, query, count_mode)
         
         # Get users
-        cursor = db.users.find(query).sort("_id", DESCENDING).skip(skip).limit(limit)
-        
-        # Convert to list and format for response
-        users = []
-        async for doc in cursor:
-            doc["id"] = str(doc.pop("_id"))
-            users.append(doc)
+        documents, next_cursor = await fetch_page(
+            db.users,
+            query,
+            limit=limit,
+            cursor=cursor,
+            sort_field="_id",
+            sort_direction=DESCENDING,
+            skip=skip
+        )
         
         # Return response
-        return {
-            "users": users,
-            "total": total
-        }
+        return ORJSONResponse({
+            "users": serialize_users(documents),
+            "total": total,
+            "total_is_estimate": total_is_estimate,
+            "next_cursor": next_cursor
+        })
     
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error retrieving users: {str(e)}")
         raise HTTPException(
@@ -115,10 +151,7 @@ async def get_user_by_phone(
                 detail=f"User with phone number {phone_number} not found"
             )
         
-        # Format for response
-        user["id"] = str(user.pop("_id"))
-        
-        return user
+        return ORJSONResponse(serialize_user(user))
     
     except HTTPException:
         raise
@@ -151,10 +184,7 @@ async def get_user_by_id(
                 detail=f"User with ID {user_id} not found"
             )
         
-        # Format for response
-        user["id"] = str(user.pop("_id"))
-        
-        return user
+        return ORJSONResponse(serialize_user(user))
     
     except Exception as e:
         logger.error(f"Error retrieving user: {str(e)}")
@@ -193,14 +223,24 @@ async def update_user(
                 detail="No fields to update"
             )
         
+        update_data["updated_at"] = datetime.utcnow()
+        
+        # Keep the name search keys in step with the name
+        if update_data.get("name"):
+            update_data[f"{SEARCH_KEYS_FIELD}.name"] = search_tokens(update_data["name"])
+        
         await db.users.update_one({"_id": oid}, {"$set": update_data})
         
         # Get updated user
         updated_user = await db.users.find_one({"_id": oid})
-        updated_user["id"] = str(updated_user.pop("_id"))
         
-        return updated_user
+        return ORJSONResponse(serialize_user(updated_user))
     
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=400,
+            detail="A user with this phone number or email already exists"
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -0,0 +1,103 @@
+"""
+Response serialization for the report and user routes
+
+Routes return an ORJSONResponse built from the stored documents instead of
+letting FastAPI validate the returned dicts against the response model and
+encode them with jsonable_encoder. Reports written by ReportMapper.normalize
+are trusted and only reshaped; other documents go through TypeAdapters built
+once at import. The response models stay on the routes for the OpenAPI schema.
+"""
+from typing import Any, Dict, List
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from app.models.domain.report import REPORT_SCHEMA_VERSION
+from app.models.schemas.report import LabReportResponse
+from app.models.schemas.user import UserResponse
+
+report_adapter = TypeAdapter(LabReportResponse)
+user_adapter = TypeAdapter(UserResponse)
+user_list_adapter = TypeAdapter(List[UserResponse])
+
+# Top-level fields of a trusted report that appear in the response
+REPORT_RESPONSE_FIELDS = frozenset(LabReportResponse.model_fields)
+
+
+def _default(value: Any) -> Any:
+    """Encode the BSON types orjson does not know"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Encode content as JSON
+
+    Args:
+        content: Dicts, lists and scalars, datetimes and ObjectIds included
+
+    Returns:
+        UTF-8 encoded JSON
+    """
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response encoded with orjson"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def serialize_report(document: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Shape a stored report for a response
+
+    Args:
+        document: Report document as read from MongoDB
+
+    Returns:
+        The report as returned by the API
+    """
+    if "_id" in document:
+        document["id"] = str(document.pop("_id"))
+
+    if document.get("schema_version") == REPORT_SCHEMA_VERSION:
+        # Already normalized at write time, only drop the internal fields
+        return {key: value for key, value in document.items() if key in REPORT_RESPONSE_FIELDS}
+
+    return report_adapter.dump_python(report_adapter.validate_python(document))
+
+
+def serialize_reports(documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Shape a list of stored reports for a response"""
+    return [serialize_report(document) for document in documents]
+
+
+def serialize_user(document: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Validate a stored user against UserResponse
+
+    Args:
+        document: User document as read from MongoDB
+
+    Returns:
+        The user as returned by the API
+    """
+    if "_id" in document:
+        document["id"] = str(document.pop("_id"))
+    return user_adapter.dump_python(user_adapter.validate_python(document))
+
+
+def serialize_users(documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Validate a list of stored users against UserResponse"""
+    for document in documents:
+        if "_id" in document:
+            document["id"] = str(document.pop("_id"))
+    return user_list_adapter.dump_python(user_list_adapter.validate_python(documents))
@@ -18,6 +18,9 @@ class Settings(BaseSettings):
     # MongoDB Settings
     MONGODB_URL: str
     MONGODB_DB_NAME: str = "lab_reports"
+    MONGODB_ENSURE_INDEXES: bool = True
+    MONGODB_VERIFY_QUERY_PLANS: bool = False  # Fail startup if a registered query scans a collection
+    PAGINATION_ESTIMATED_COUNT_LIMIT: int = 1000  # Estimated totals stop counting here
     
     # Auth Settings
     SECRET_KEY: str
@@ -27,9 +30,67 @@ class Settings(BaseSettings):
     ANTHROPIC_API_KEY: str
     # Using a model that definitely exists in the Anthropic API
     CLAUDE_MODEL: str = "claude-3-sonnet-20240229"
+    OCR_MAX_CONCURRENCY: int = 16  # In-flight Claude calls per process
+    OCR_MAX_CONNECTIONS: int = 32
+    OCR_MAX_KEEPALIVE_CONNECTIONS: int = 16
+    OCR_REQUEST_TIMEOUT_SECONDS: float = 120.0
+    OCR_MAX_RETRIES: int = 2
+    OCR_EXTRACTION_MODE: str = "stream"  # stream (JSON text) or tool (structured tool arguments)
+    OCR_TOOL_MAX_ATTEMPTS: int = 2  # Requests per page before falling back to stream
+    OCR_BACKEND: str = "claude"  # claude, or local for offline load tests
+    
+    # Local OCR Backend Settings (OCR_BACKEND=local)
+    OCR_LOCAL_FIXTURES_DIR: Optional[str] = None  # JSON extractions, a built-in report if unset
+    OCR_LOCAL_LATENCY_MS: float = 0.0  # Median simulated model latency
+    OCR_LOCAL_LATENCY_DISTRIBUTION: str = "fixed"  # fixed, uniform or lognormal
+    OCR_LOCAL_LATENCY_SPREAD: float = 0.5  # Relative half-width (uniform) or sigma (lognormal)
+    OCR_LOCAL_FAILURE_RATE: float = 0.0  # Share of calls that raise
+    OCR_LOCAL_SEED: int = 0
     
     # Storage Settings
     TEMP_FILE_PATH: str = "/tmp/lab_reports"
+    UPLOAD_SPOOL_THRESHOLD_BYTES: int = 20 * 1024 * 1024  # Larger PDFs are spooled to TEMP_FILE_PATH
+    
+    # PDF Processing Settings
+    PDF_PROCESS_ALL_PAGES: bool = True
+    PDF_PAGE_CONCURRENCY: int = 4
+    
+    # Batch Upload Settings
+    BATCH_UPLOAD_CONCURRENCY: int = 8
+    BATCH_UPLOAD_MAX_FILES: int = 100
+    BATCH_ARCHIVE_MAX_UNCOMPRESSED_BYTES: int = 500 * 1024 * 1024
+    
+    # Export Settings
+    REPORT_EXPORT_BATCH_SIZE: int = 100  # Reports fetched per round trip and written per chunk
+    REPORT_EXPORT_MAX_BATCH_SIZE: int = 1000
+    
+    # Observation Settings
+    OBSERVATIONS_TIMESERIES: bool = False  # Create observations as a time-series collection (MongoDB 7+)
+    OBSERVATIONS_SERIES_MAX_POINTS: int = 1000
+    
+    # Background Job Settings
+    REPORT_JOB_WORKERS: int = 2  # Set to 0 to disable background processing in this process
+    REPORT_JOB_MAX_ATTEMPTS: int = 3
+    REPORT_JOB_RETRY_BACKOFF_SECONDS: float = 5.0
+    REPORT_JOB_LEASE_SECONDS: int = 300
+    REPORT_JOB_POLL_INTERVAL_SECONDS: float = 1.0
+    REPORT_JOB_MAX_FILE_BYTES: int = 15 * 1024 * 1024  # Payload is stored in the job document
+    
+    # Image Preparation Settings
+    OCR_IMAGE_MAX_LONG_EDGE: int = 1568  # Claude downsizes anything larger anyway
+    OCR_PDF_MIN_DPI: int = 72
+    OCR_PDF_MAX_DPI: int = 300
+    OCR_IMAGE_GRAYSCALE: bool = True
+    OCR_IMAGE_FORMAT: str = "jpeg"  # jpeg, webp or png
+    OCR_IMAGE_QUALITY: int = 80
+    OCR_MEASURE_PDF_BASELINE: bool = False  # Also render pages as 300 DPI PNG to report bytes saved
+    
+    # OCR Cache Settings
+    OCR_CACHE_ENABLED: bool = True
+    OCR_CACHE_PERSISTENT: bool = True
+    OCR_CACHE_MAX_ENTRIES: int = 256
+    OCR_CACHE_TTL_SECONDS: int = 60 * 60 * 24 * 30  # 30 days
+    OCR_CACHE_COLLECTION: str = "ocr_cache"
     
     # Validation
     @field_validator("BACKEND_CORS_ORIGINS")
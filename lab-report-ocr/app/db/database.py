@@ -2,6 +2,7 @@ import logging
 from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo.errors import ServerSelectionTimeoutError
 from app.core.config import settings
+from app.db.indexes import ensure_collections, ensure_indexes, assert_query_plans
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +24,14 @@ class Database:
             # Verify connection is successful
             await self.client.admin.command('ping')
             logger.info("Connected to MongoDB")
+            
+            # Create the indexes every query shape relies on
+            if settings.MONGODB_ENSURE_INDEXES:
+                database = self.client[settings.MONGODB_DB_NAME]
+                await ensure_collections(database)
+                await ensure_indexes(database)
+                if settings.MONGODB_VERIFY_QUERY_PLANS:
+                    await assert_query_plans(database)
         except ServerSelectionTimeoutError as e:
             logger.error(f"Could not connect to MongoDB: {e}")
             # Continue without MongoDB - allow the app to start even if DB connection fails
@@ -0,0 +1,354 @@
+"""
+Index management for the MongoDB collections
+
+Every query shape used by the routes and repositories is registered in
+QUERY_SHAPES next to the index that serves it. ensure_indexes runs on startup;
+verify_query_plans explains each registered query and reports the ones that
+fall back to a collection scan.
+
+Run the check against a live database with:
+    python -m app.db.indexes
+"""
+import asyncio
+import logging
+import sys
+from datetime import datetime
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from app.core.config import settings
+from app.db.search import search_filter
+from app.models.domain.report import ABNORMAL_FLAGS
+
+logger = logging.getLogger(__name__)
+
+# Indexes per collection
+INDEXES: Dict[str, List[IndexModel]] = {
+    "reports": [
+        # Reports by phone, newest upload first; _id is the keyset tie breaker
+        IndexModel(
+            [("patient_info.phone_number", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="phone_created_at_id"
+        ),
+        # Reports by phone, newest report date first (repositories)
+        IndexModel(
+            [
+                ("patient_info.phone_number", ASCENDING),
+                ("collection_info.reported_on", DESCENDING),
+                ("_id", DESCENDING),
+            ],
+            name="phone_reported_on_id"
+        ),
+        # Abnormal results, each $or branch needs its own index
+        IndexModel(
+            [("patient_info.phone_number", ASCENDING), ("test_results.is_normal", ASCENDING)],
+            name="phone_is_normal"
+        ),
+        IndexModel(
+            [("patient_info.phone_number", ASCENDING), ("test_results.flag", ASCENDING)],
+            name="phone_flag"
+        ),
+        IndexModel([("test_results.is_normal", ASCENDING)], name="is_normal"),
+        IndexModel([("test_results.flag", ASCENDING)], name="flag"),
+        # Test name search, prefix regexes over the normalized words (app.db.search)
+        IndexModel(
+            [("patient_info.phone_number", ASCENDING), ("search_keys.test_name", ASCENDING)],
+            name="phone_test_name_search"
+        ),
+        IndexModel([("search_keys.test_name", ASCENDING)], name="test_name_search"),
+    ],
+    "users": [
+        IndexModel([("phone_number", ASCENDING)], name="phone_number_unique", unique=True),
+        # Email is optional, only enforce uniqueness where it is set
+        IndexModel(
+            [("email", ASCENDING)],
+            name="email_unique",
+            unique=True,
+            partialFilterExpression={"email": {"$gt": ""}}
+        ),
+        IndexModel([("search_keys.name", ASCENDING)], name="name_search"),
+    ],
+    "report_jobs": [
+        IndexModel([("status", ASCENDING), ("available_at", ASCENDING)], name="status_available_at"),
+        IndexModel([("status", ASCENDING), ("locked_until", ASCENDING)], name="status_locked_until"),
+    ],
+    "observations": [
+        # Analyte series of a patient (ObservationRepository.find_series)
+        IndexModel(
+            [("meta.phone_number", ASCENDING), ("meta.analyte", ASCENDING), ("observed_at", ASCENDING)],
+            name="phone_analyte_observed_at"
+        ),
+        IndexModel([("report_id", ASCENDING)], name="report_id"),
+    ],
+    settings.OCR_CACHE_COLLECTION: [
+        IndexModel(
+            [("created_at", ASCENDING)],
+            name="created_at_ttl",
+            expireAfterSeconds=settings.OCR_CACHE_TTL_SECONDS
+        ),
+    ],
+}
+
+
+# Indexes superseded by the ones above, dropped by ensure_indexes
+OBSOLETE_INDEXES: Dict[str, List[str]] = {
+    "reports": ["phone_created_at", "phone_reported_on"],
+}
+
+
+@dataclass
+class QueryShape:
+    """A query issued by the application, with sample values for explain"""
+    name: str
+    collection: str
+    filter: Dict[str, Any]
+    sort: List[Tuple[str, int]] = field(default_factory=list)
+
+
+SAMPLE_PHONE = "+10000000000"
+SAMPLE_TIME = datetime(2024, 1, 1)
+SAMPLE_ID = ObjectId("000000000000000000000000")
+
+# Query shapes that must be served by an index
+QUERY_SHAPES: List[QueryShape] = [
+    QueryShape(
+        "reports by phone (routes)",
+        "reports",
+        {"patient_info.phone_number": SAMPLE_PHONE},
+        [("created_at", DESCENDING), ("_id", DESCENDING)]
+    ),
+    QueryShape(
+        "reports by phone after a cursor (routes)",
+        "reports",
+        {"$and": [
+            {"patient_info.phone_number": SAMPLE_PHONE},
+            {"$or": [
+                {"created_at": {"$lt": SAMPLE_TIME}},
+                {"created_at": SAMPLE_TIME, "_id": {"$lt": SAMPLE_ID}},
+            ]},
+        ]},
+        [("created_at", DESCENDING), ("_id", DESCENDING)]
+    ),
+    QueryShape(
+        "reports by phone (ReportRepository.find_by_phone, find_recent_by_phone)",
+        "reports",
+        {"patient_info.phone_number": SAMPLE_PHONE},
+        [("collection_info.reported_on", DESCENDING), ("_id", DESCENDING)]
+    ),
+    QueryShape(
+        "reports by phone and date range",
+        "reports",
+        {
+            "patient_info.phone_number": SAMPLE_PHONE,
+            "collection_info.reported_on": {"$gte": SAMPLE_TIME},
+        },
+        [("collection_info.reported_on", DESCENDING)]
+    ),
+    QueryShape(
+        "reports by phone and test name (routes)",
+        "reports",
+        {"patient_info.phone_number": SAMPLE_PHONE, **search_filter("test_name", "complete blood")},
+        [("created_at", DESCENDING), ("_id", DESCENDING)]
+    ),
+    QueryShape(
+        "reports by test name (ReportRepository.find_by_test_type)",
+        "reports",
+        search_filter("test_name", "lipid"),
+        [("_id", DESCENDING)]
+    ),
+    QueryShape(
+        "abnormal results by phone",
+        "reports",
+        {
+            "$or": [
+                {"test_results.is_normal": False},
+                {"test_results.flag": {"$in": ABNORMAL_FLAGS}},
+            ],
+            "patient_info.phone_number": SAMPLE_PHONE,
+        },
+        [("_id", DESCENDING)]
+    ),
+    QueryShape(
+        "abnormal results",
+        "reports",
+        {
+            "$or": [
+                {"test_results.is_normal": False},
+                {"test_results.flag": {"$in": ABNORMAL_FLAGS}},
+            ]
+        },
+        [("_id", DESCENDING)]
+    ),
+    QueryShape("user by phone", "users", {"phone_number": SAMPLE_PHONE}),
+    QueryShape("user by email", "users", {"email": "patient@example.com"}),
+    QueryShape("users, newest first", "users", {}, [("_id", DESCENDING)]),
+    QueryShape("users by name", "users", search_filter("name", "john"), [("_id", DESCENDING)]),
+    QueryShape("users after a cursor", "users", {"_id": {"$lt": SAMPLE_ID}}, [("_id", DESCENDING)]),
+    QueryShape(
+        "analyte series",
+        "observations",
+        {"meta.phone_number": SAMPLE_PHONE, "meta.analyte": "haemoglobin", "observed_at": {"$gte": SAMPLE_TIME}},
+        [("observed_at", ASCENDING)]
+    ),
+    QueryShape("analytes of a patient", "observations", {"meta.phone_number": SAMPLE_PHONE}),
+    QueryShape("observations of a report", "observations", {"report_id": SAMPLE_ID}),
+    QueryShape(
+        "next report job",
+        "report_jobs",
+        {"status": "queued", "available_at": {"$lte": SAMPLE_TIME}},
+        [("available_at", ASCENDING)]
+    ),
+    QueryShape("stale report jobs", "report_jobs", {"status": "processing", "locked_until": {"$lt": SAMPLE_TIME}}),
+]
+
+
+class QueryPlanError(RuntimeError):
+    """Raised when registered queries are not served by an index"""
+
+
+async def ensure_collections(database) -> None:
+    """
+    Create the collections that need options at creation time
+
+    The observations collection is created as a time-series collection when
+    OBSERVATIONS_TIMESERIES is set. An existing collection is left as it is.
+
+    Args:
+        database: Motor database
+    """
+    if not settings.OBSERVATIONS_TIMESERIES:
+        return
+
+    if "observations" in await database.list_collection_names(filter={"name": "observations"}):
+        return
+
+    try:
+        await database.create_collection(
+            "observations",
+            timeseries={"timeField": "observed_at", "metaField": "meta", "granularity": "hours"}
+        )
+        logger.info("Created observations as a time-series collection")
+    except OperationFailure as e:
+        logger.error(f"Could not create the observations time-series collection: {str(e)}")
+
+
+async def ensure_indexes(database) -> None:
+    """
+    Create every registered index
+
+    Existing indexes are left alone and the ones listed in OBSOLETE_INDEXES
+    are dropped. A failure on one collection, for example a unique index
+    blocked by duplicate documents, is logged and does not stop the others
+    from being created.
+
+    Args:
+        database: Motor database
+    """
+    for collection_name, indexes in INDEXES.items():
+        try:
+            created = await database[collection_name].create_indexes(indexes)
+            logger.info(f"Ensured indexes on {collection_name}: {', '.join(created)}")
+        except OperationFailure as e:
+            logger.error(f"Could not create indexes on {collection_name}: {str(e)}")
+
+    for collection_name, names in OBSOLETE_INDEXES.items():
+        existing = await database[collection_name].index_information()
+        for name in names:
+            if name in existing:
+                await database[collection_name].drop_index(name)
+                logger.info(f"Dropped obsolete index {name} on {collection_name}")
+
+
+def _find_stages(plan: Optional[Dict[str, Any]]) -> List[str]:
+    """Collect the stage names of a query plan tree"""
+    if not plan:
+        return []
+
+    stages = [plan["stage"]] if "stage" in plan else []
+    # Classic plans nest stages, SBE plans wrap the tree in queryPlan
+    for key in ("inputStage", "queryPlan"):
+        stages.extend(_find_stages(plan.get(key)))
+    for child in plan.get("inputStages", []):
+        stages.extend(_find_stages(child))
+    return stages
+
+
+async def explain_query(database, shape: QueryShape) -> List[str]:
+    """
+    Explain a registered query
+
+    Args:
+        database: Motor database
+        shape: Query shape to explain
+
+    Returns:
+        Stage names of the winning plan
+    """
+    find = {"find": shape.collection, "filter": shape.filter, "limit": 10}
+    if shape.sort:
+        find["sort"] = dict(shape.sort)
+
+    explanation = await database.command({"explain": find, "verbosity": "queryPlanner"})
+    return _find_stages(explanation["queryPlanner"]["winningPlan"])
+
+
+async def verify_query_plans(database) -> List[str]:
+    """
+    Check that no registered query falls back to a collection scan
+
+    Args:
+        database: Motor database
+
+    Returns:
+        Names of the queries whose winning plan contains a COLLSCAN
+    """
+    violations = []
+    for shape in QUERY_SHAPES:
+        stages = await explain_query(database, shape)
+        if "COLLSCAN" in stages:
+            logger.error(f"Query '{shape.name}' on {shape.collection} uses a collection scan: {stages}")
+            violations.append(shape.name)
+        elif "SORT" in stages:
+            logger.warning(f"Query '{shape.name}' on {shape.collection} sorts in memory: {stages}")
+    return violations
+
+
+async def assert_query_plans(database) -> None:
+    """
+    Raise QueryPlanError if a registered query falls back to a collection scan
+
+    Args:
+        database: Motor database
+    """
+    violations = await verify_query_plans(database)
+    if violations:
+        raise QueryPlanError(f"Queries without a supporting index: {', '.join(violations)}")
+
+
+async def _main() -> int:
+    """Ensure the indexes and check every registered query plan"""
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(settings.MONGODB_URL, serverSelectionTimeoutMS=5000)
+    try:
+        database = client[settings.MONGODB_DB_NAME]
+        await ensure_collections(database)
+        await ensure_indexes(database)
+        violations = await verify_query_plans(database)
+    finally:
+        client.close()
+
+    if violations:
+        print(f"{len(violations)} queries fall back to a collection scan: {', '.join(violations)}")
+        return 1
+    print(f"All {len(QUERY_SHAPES)} registered queries use an index")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main()))
@@ -0,0 +1,254 @@
+"""
+One-off data migrations
+
+Each migration backfills documents written before a change to the stored
+format. Applied migrations are recorded in the migrations collection so a
+migration only runs once per database; all of them are safe to run again.
+
+Run the pending migrations with:
+    python -m app.db.migrations
+"""
+import asyncio
+import copy
+import logging
+import sys
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from app.core.config import settings
+from app.db.repositories.observations import ObservationRepository
+from app.db.search import SEARCH_KEYS_FIELD, search_tokens
+from app.models.domain.report import REPORT_SCHEMA_VERSION
+from app.services.report_parser.report_mapper import ReportMapper
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_COLLECTION = "migrations"
+
+# Documents updated per bulk write
+BATCH_SIZE = 500
+
+# Builds the $set of a document, or None if it needs no update
+UpdateBuilder = Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]
+
+
+async def backfill(
+    collection,
+    query: Dict[str, Any],
+    projection: Optional[Dict[str, Any]],
+    build_update: UpdateBuilder
+) -> int:
+    """
+    Update every matching document in batches
+
+    Args:
+        collection: Motor collection
+        query: Documents to migrate
+        projection: Fields build_update needs, None for the whole document
+        build_update: Builds the $set of a document
+
+    Returns:
+        Number of modified documents
+    """
+    modified = 0
+    operations: List[UpdateOne] = []
+
+    async for document in collection.find(query, projection).batch_size(BATCH_SIZE):
+        update = build_update(document)
+        if update:
+            operations.append(UpdateOne({"_id": document["_id"]}, {"$set": update}))
+        if len(operations) >= BATCH_SIZE:
+            result = await collection.bulk_write(operations, ordered=False)
+            modified += result.modified_count
+            operations = []
+
+    if operations:
+        result = await collection.bulk_write(operations, ordered=False)
+        modified += result.modified_count
+
+    return modified
+
+
+async def backfill_search_keys(database) -> int:
+    """
+    Store the search keys of reports and users created before they existed
+
+    Returns:
+        Number of modified documents
+    """
+    missing = {SEARCH_KEYS_FIELD: {"$exists": False}}
+    reports = await backfill(
+        database.reports,
+        missing,
+        {"test_name": 1},
+        lambda report: {SEARCH_KEYS_FIELD: {"test_name": search_tokens(report.get("test_name"))}}
+    )
+    users = await backfill(
+        database.users,
+        missing,
+        {"name": 1},
+        lambda user: {SEARCH_KEYS_FIELD: {"name": search_tokens(user.get("name"))}}
+    )
+    return reports + users
+
+
+async def backfill_abnormal_count(database) -> int:
+    """
+    Store the abnormal count of reports created before it existed
+
+    Returns:
+        Number of modified documents
+    """
+    return await backfill(
+        database.reports,
+        {"abnormal_count": {"$exists": False}},
+        {"test_results": 1},
+        lambda report: {"abnormal_count": ReportMapper.count_abnormal(report.get("test_results"))}
+    )
+
+
+async def normalize_reports(database) -> int:
+    """
+    Rewrite reports stored before the current format through ReportMapper.normalize
+
+    Returns:
+        Number of modified documents
+    """
+    def build_update(report: Dict[str, Any]) -> Dict[str, Any]:
+        ReportMapper.normalize(report)
+        return {key: value for key, value in report.items() if key != "_id"}
+
+    return await backfill(
+        database.reports,
+        {"schema_version": {"$ne": REPORT_SCHEMA_VERSION}},
+        None,
+        build_update
+    )
+
+
+async def backfill_observations(database) -> int:
+    """
+    Build the analyte observations of every stored report
+
+    Returns:
+        Number of inserted observations
+    """
+    observations = ObservationRepository(database)
+    projection = {"patient_info.phone_number": 1, "collection_info": 1, "created_at": 1, "test_results": 1}
+
+    inserted = 0
+    batch: List[Dict[str, Any]] = []
+    async for report in database.reports.find({}, projection).batch_size(BATCH_SIZE):
+        batch.append(report)
+        if len(batch) >= BATCH_SIZE:
+            inserted += await observations.replace_for_reports(batch)
+            batch = []
+    if batch:
+        inserted += await observations.replace_for_reports(batch)
+
+    return inserted
+
+
+async def reevaluate_reference_ranges(database) -> int:
+    """
+    Re-evaluate every stored test result with the reference range parser
+
+    Reports are evaluated BATCH_SIZE at a time in one vectorized pass; the
+    ones whose results change are updated and their observations rebuilt.
+
+    Returns:
+        Number of modified reports
+    """
+    observations = ObservationRepository(database)
+    projection = {"patient_info.phone_number": 1, "collection_info": 1, "created_at": 1, "test_results": 1}
+
+    async def flush(batch: List[Dict[str, Any]]) -> int:
+        originals = {report["_id"]: copy.deepcopy(report["test_results"]) for report in batch}
+        ReportMapper.evaluate_reports(batch)
+        changed = [report for report in batch if report["test_results"] != originals[report["_id"]]]
+        if not changed:
+            return 0
+
+        result = await database.reports.bulk_write([
+            UpdateOne(
+                {"_id": report["_id"]},
+                {"$set": {"test_results": report["test_results"], "abnormal_count": report["abnormal_count"]}}
+            )
+            for report in changed
+        ], ordered=False)
+        await observations.replace_for_reports(changed)
+        return result.modified_count
+
+    modified = 0
+    batch: List[Dict[str, Any]] = []
+    query = {"test_results": {"$type": "object"}}
+    async for report in database.reports.find(query, projection).batch_size(BATCH_SIZE):
+        batch.append(report)
+        if len(batch) >= BATCH_SIZE:
+            modified += await flush(batch)
+            batch = []
+    if batch:
+        modified += await flush(batch)
+
+    return modified
+
+
+# Migrations in the order they are applied
+MIGRATIONS: List[Tuple[str, Callable[[Any], Awaitable[int]]]] = [
+    ("0001_search_keys", backfill_search_keys),
+    ("0002_abnormal_count", backfill_abnormal_count),
+    ("0003_normalize_reports", normalize_reports),
+    ("0004_observations", backfill_observations),
+    ("0005_reference_ranges", reevaluate_reference_ranges),
+]
+
+
+async def run_migrations(database) -> List[str]:
+    """
+    Apply the migrations that have not run on this database yet
+
+    Args:
+        database: Motor database
+
+    Returns:
+        Names of the applied migrations
+    """
+    applied = []
+    for name, migration in MIGRATIONS:
+        if await database[MIGRATIONS_COLLECTION].find_one({"_id": name}):
+            continue
+
+        logger.info(f"Applying migration {name}")
+        started_at = datetime.utcnow()
+        modified = await migration(database)
+        await database[MIGRATIONS_COLLECTION].insert_one({
+            "_id": name,
+            "modified": modified,
+            "started_at": started_at,
+            "completed_at": datetime.utcnow(),
+        })
+        logger.info(f"Applied migration {name}: {modified} documents modified")
+        applied.append(name)
+
+    return applied
+
+
+async def _main() -> int:
+    """Apply the pending migrations"""
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(settings.MONGODB_URL, serverSelectionTimeoutMS=5000)
+    try:
+        applied = await run_migrations(client[settings.MONGODB_DB_NAME])
+    finally:
+        client.close()
+
+    print(f"Applied {len(applied)} migrations: {', '.join(applied)}" if applied else "No pending migrations")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main()))
@@ -0,0 +1,212 @@
+"""
+Keyset pagination helpers
+
+Pages are addressed by an opaque cursor holding the sort value and _id of the
+last document of the previous page, so fetching a page costs the same no
+matter how deep into the result set it is.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from app.core.config import settings
+
+# Count modes for list endpoints
+COUNT_EXACT = "exact"
+COUNT_ESTIMATED = "estimated"
+COUNT_NONE = "none"
+COUNT_MODES = (COUNT_EXACT, COUNT_ESTIMATED, COUNT_NONE)
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+
+def _get_path(document: Dict[str, Any], path: str) -> Any:
+    """Read a dotted field path from a document"""
+    value = document
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def encode_cursor(document: Dict[str, Any], sort_field: str) -> str:
+    """
+    Build the cursor pointing after a document
+
+    Args:
+        document: Last document of the current page, with its _id
+        sort_field: Field the page is sorted on
+
+    Returns:
+        Opaque URL-safe cursor
+    """
+    payload: Dict[str, Any] = {"f": sort_field, "id": str(document["_id"])}
+    if sort_field != "_id":
+        value = _get_path(document, sort_field)
+        if isinstance(value, datetime):
+            payload["v"], payload["t"] = value.isoformat(), "dt"
+        else:
+            payload["v"], payload["t"] = value, "raw"
+
+    raw = json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_field: str) -> Tuple[Any, ObjectId]:
+    """
+    Decode a cursor built by encode_cursor
+
+    Args:
+        cursor: Cursor from a previous page
+        sort_field: Field the page is sorted on, must match the cursor
+
+    Returns:
+        Sort value and _id of the last document of the previous page
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if payload["f"] != sort_field:
+            raise InvalidCursorError("Cursor belongs to a different sort order")
+        value = payload.get("v")
+        if payload.get("t") == "dt" and value is not None:
+            value = datetime.fromisoformat(value)
+        return value, ObjectId(payload["id"])
+    except InvalidCursorError:
+        raise
+    except (ValueError, KeyError, TypeError, InvalidId) as e:
+        raise InvalidCursorError(f"Invalid cursor: {str(e)}")
+
+
+def keyset_filter(sort_field: str, sort_direction: int, cursor: str) -> Dict[str, Any]:
+    """
+    Build the filter selecting the documents after a cursor
+
+    Documents are ordered by (sort_field, _id); _id breaks ties between equal
+    sort values. Null and missing values sort lowest in MongoDB.
+
+    Args:
+        sort_field: Field the page is sorted on
+        sort_direction: 1 for ascending, -1 for descending
+        cursor: Cursor from a previous page
+
+    Returns:
+        Filter to combine with the query
+    """
+    value, last_id = decode_cursor(cursor, sort_field)
+    after = "$gt" if sort_direction > 0 else "$lt"
+
+    if sort_field == "_id":
+        return {"_id": {after: last_id}}
+
+    if value is None:
+        tie = {sort_field: None, "_id": {after: last_id}}
+        if sort_direction > 0:
+            return {"$or": [tie, {sort_field: {"$ne": None}}]}
+        return tie
+
+    clauses = [
+        {sort_field: {after: value}},
+        {sort_field: value, "_id": {after: last_id}},
+    ]
+    if sort_direction < 0:
+        # Nulls come after every value in descending order, and no comparison
+        # operator matches them
+        clauses.append({sort_field: None})
+    return {"$or": clauses}
+
+
+def sort_spec(sort_field: str, sort_direction: int) -> List[Tuple[str, int]]:
+    """
+    Build the sort specification matching keyset_filter
+
+    Args:
+        sort_field: Field the page is sorted on
+        sort_direction: 1 for ascending, -1 for descending
+
+    Returns:
+        Sort specification with _id as tie breaker
+    """
+    if sort_field == "_id":
+        return [("_id", sort_direction)]
+    return [(sort_field, sort_direction), ("_id", sort_direction)]
+
+
+async def fetch_page(
+    collection,
+    query: Dict[str, Any],
+    limit: int,
+    cursor: Optional[str] = None,
+    sort_field: str = "_id",
+    sort_direction: int = -1,
+    skip: int = 0,
+    projection: Optional[Dict[str, Any]] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Fetch one page of documents
+
+    Args:
+        collection: Motor collection
+        query: Query filter
+        limit: Page size
+        cursor: Cursor returned with the previous page
+        sort_field: Field the page is sorted on, _id breaks ties
+        sort_direction: 1 for ascending, -1 for descending
+        skip: Offset, kept for clients that page by position
+        projection: Optional projection, must keep sort_field
+
+    Returns:
+        The documents and the cursor of the next page, or None on the last page
+    """
+    if cursor:
+        after = keyset_filter(sort_field, sort_direction, cursor)
+        query = {"$and": [query, after]} if query else after
+
+    find = collection.find(query, projection).sort(sort_spec(sort_field, sort_direction))
+    if skip:
+        find = find.skip(skip)
+
+    # Fetch one extra document to know whether there is a next page
+    documents = await find.limit(limit + 1).to_list(length=limit + 1)
+
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = encode_cursor(documents[-1], sort_field)
+
+    return documents, next_cursor
+
+
+async def count_matching(collection, query: Dict[str, Any], mode: str) -> Tuple[Optional[int], bool]:
+    """
+    Count the documents matching a query
+
+    The estimated mode reads collection metadata for unfiltered queries and
+    stops counting filtered ones at PAGINATION_ESTIMATED_COUNT_LIMIT.
+
+    Args:
+        collection: Motor collection
+        query: Query filter
+        mode: exact, estimated or none
+
+    Returns:
+        The count (None in mode none) and whether it is an estimate
+    """
+    if mode == COUNT_NONE:
+        return None, False
+
+    if mode == COUNT_ESTIMATED:
+        if not query:
+            return await collection.estimated_document_count(), True
+        limit = settings.PAGINATION_ESTIMATED_COUNT_LIMIT
+        count = await collection.count_documents(query, limit=limit)
+        return count, count >= limit
+
+    return await collection.count_documents(query), False
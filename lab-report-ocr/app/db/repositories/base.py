@@ -1,7 +1,9 @@
-from typing import Any, Dict, Generic, List, Optional, Type, TypeVar, Union
+from typing import Any, Dict, Generic, List, Optional, Tuple, Type, TypeVar, Union
 from bson import ObjectId
 from pydantic import BaseModel
 
+from app.db.pagination import fetch_page
+
 # Define generic type for models
 ModelType = TypeVar("ModelType", bound=BaseModel)
 
@@ -38,6 +40,34 @@ class BaseRepository:
         
         return [document async for document in cursor]
     
+    async def find_page(
+        self,
+        query: Dict[str, Any],
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        sort_field: str = "_id",
+        sort_direction: int = -1,
+        projection: Optional[Dict[str, Any]] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Find one page of documents by query using keyset pagination
+        
+        Unlike find_by_query, the cost of a page does not grow with its
+        position. Pass the returned cursor back to get the next page.
+        
+        Returns:
+            The documents and the cursor of the next page, or None on the last page
+        """
+        return await fetch_page(
+            self.collection,
+            query,
+            limit=limit,
+            cursor=cursor,
+            sort_field=sort_field,
+            sort_direction=sort_direction,
+            projection=projection
+        )
+    
     async def count(self, query: Dict[str, Any]) -> int:
         """
         Count documents matching query
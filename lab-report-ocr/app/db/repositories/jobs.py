@@ -0,0 +1,236 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Any
+
+from bson import Binary, ObjectId
+from pymongo import ASCENDING, ReturnDocument
+
+from app.db.repositories.base import BaseRepository
+
+logger = logging.getLogger(__name__)
+
+# Job statuses
+JOB_QUEUED = "queued"
+JOB_PROCESSING = "processing"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+
+class JobRepository(BaseRepository):
+    """
+    Repository for report ingestion jobs
+
+    Jobs are claimed with an atomic find-and-modify and hold a lease while they
+    are processed, so a worker that dies leaves a job that can be recovered
+    once its lease expires.
+    """
+
+    def __init__(self, db):
+        """
+        Initialize the repository with the database connection
+        """
+        super().__init__("report_jobs", db)
+
+    async def enqueue(
+        self,
+        content: bytes,
+        content_type: str,
+        filename: str,
+        phone_number: str,
+        patient_name: Optional[str] = None,
+        max_attempts: int = 3
+    ) -> str:
+        """
+        Queue an uploaded file for processing
+
+        Returns:
+            ID of the created job
+        """
+        now = datetime.utcnow()
+        return await self.create({
+            "status": JOB_QUEUED,
+            "stage": "queued",
+            "attempts": 0,
+            "max_attempts": max_attempts,
+            "available_at": now,
+            "locked_until": None,
+            "worker_id": None,
+            "file": {
+                "filename": filename,
+                "content_type": content_type,
+                "size": len(content),
+                "data": Binary(content),
+            },
+            "phone_number": phone_number,
+            "patient_name": patient_name,
+            "report_id": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        })
+
+    async def claim_next(self, worker_id: str, lease_seconds: int) -> Optional[Dict[str, Any]]:
+        """
+        Atomically claim the oldest job that is ready to run
+
+        Args:
+            worker_id: Identifier of the claiming worker
+            lease_seconds: How long the job stays locked to this worker
+
+        Returns:
+            The claimed job, or None if the queue is empty
+        """
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {"status": JOB_QUEUED, "available_at": {"$lte": now}},
+            {
+                "$set": {
+                    "status": JOB_PROCESSING,
+                    "stage": "extracting",
+                    "worker_id": worker_id,
+                    "locked_until": now + timedelta(seconds=lease_seconds),
+                    "started_at": now,
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("available_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def extend_lease(self, job_id: ObjectId, worker_id: str, lease_seconds: int) -> bool:
+        """
+        Extend the lease of a job that is still being processed
+
+        Returns:
+            False if the job is no longer owned by this worker
+        """
+        now = datetime.utcnow()
+        result = await self.collection.update_one(
+            {"_id": job_id, "status": JOB_PROCESSING, "worker_id": worker_id},
+            {"$set": {"locked_until": now + timedelta(seconds=lease_seconds), "updated_at": now}}
+        )
+        return result.matched_count > 0
+
+    async def set_stage(self, job_id: ObjectId, stage: str) -> None:
+        """
+        Record the pipeline stage a job has reached
+        """
+        await self.collection.update_one(
+            {"_id": job_id},
+            {"$set": {"stage": stage, "updated_at": datetime.utcnow()}}
+        )
+
+    async def mark_completed(self, job_id: ObjectId, report_id: str) -> None:
+        """
+        Mark a job as done and drop its file payload
+        """
+        now = datetime.utcnow()
+        await self.collection.update_one(
+            {"_id": job_id},
+            {
+                "$set": {
+                    "status": JOB_COMPLETED,
+                    "stage": "completed",
+                    "report_id": report_id,
+                    "error": None,
+                    "locked_until": None,
+                    "completed_at": now,
+                    "updated_at": now,
+                },
+                "$unset": {"file.data": ""},
+            }
+        )
+
+    async def mark_attempt_failed(
+        self,
+        job: Dict[str, Any],
+        error: str,
+        backoff_seconds: float,
+        retryable: bool = True
+    ) -> str:
+        """
+        Record a failed attempt, scheduling a retry or failing the job
+
+        The retry delay doubles with every attempt.
+
+        Args:
+            job: The job document as claimed
+            error: Error message of the attempt
+            backoff_seconds: Delay before the first retry
+            retryable: False to fail the job regardless of remaining attempts
+
+        Returns:
+            The new status of the job
+        """
+        now = datetime.utcnow()
+        update = {"error": error, "locked_until": None, "worker_id": None, "updated_at": now}
+
+        if retryable and job["attempts"] < job["max_attempts"]:
+            delay = backoff_seconds * (2 ** (job["attempts"] - 1))
+            update.update({
+                "status": JOB_QUEUED,
+                "stage": "retrying",
+                "available_at": now + timedelta(seconds=delay),
+            })
+            await self.collection.update_one({"_id": job["_id"]}, {"$set": update})
+            return JOB_QUEUED
+
+        update.update({"status": JOB_FAILED, "stage": "failed", "completed_at": now})
+        await self.collection.update_one(
+            {"_id": job["_id"]},
+            {"$set": update, "$unset": {"file.data": ""}}
+        )
+        return JOB_FAILED
+
+    async def recover_stale(self) -> int:
+        """
+        Requeue jobs whose worker died while processing them
+
+        Jobs that already used all their attempts are failed instead.
+
+        Returns:
+            Number of recovered jobs
+        """
+        now = datetime.utcnow()
+        stale = {"status": JOB_PROCESSING, "locked_until": {"$lt": now}}
+
+        failed = await self.collection.update_many(
+            {**stale, "$expr": {"$gte": ["$attempts", "$max_attempts"]}},
+            {
+                "$set": {
+                    "status": JOB_FAILED,
+                    "stage": "failed",
+                    "error": "Worker stopped while processing the job",
+                    "locked_until": None,
+                    "completed_at": now,
+                    "updated_at": now,
+                },
+                "$unset": {"file.data": ""},
+            }
+        )
+        requeued = await self.collection.update_many(
+            stale,
+            {
+                "$set": {
+                    "status": JOB_QUEUED,
+                    "stage": "recovered",
+                    "available_at": now,
+                    "locked_until": None,
+                    "worker_id": None,
+                    "updated_at": now,
+                }
+            }
+        )
+
+        if failed.modified_count or requeued.modified_count:
+            logger.warning(
+                f"Recovered stale report jobs: {requeued.modified_count} requeued, {failed.modified_count} failed"
+            )
+        return requeued.modified_count + failed.modified_count
+
+    async def find_status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a job without its file payload
+        """
+        return await self.collection.find_one({"_id": ObjectId(job_id)}, {"file.data": 0})
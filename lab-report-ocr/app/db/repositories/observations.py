@@ -0,0 +1,102 @@
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Any
+
+from pymongo import ASCENDING
+
+from app.db.repositories.base import BaseRepository
+from app.services.report_parser.report_mapper import ReportMapper
+
+logger = logging.getLogger(__name__)
+
+
+class ObservationRepository(BaseRepository):
+    """
+    Repository for per-patient analyte observations
+
+    Observations are derived from the test results of stored reports (see
+    ReportMapper.extract_observations), one row per analyte per report, so
+    trend queries read a handful of small rows instead of unpacking reports.
+    """
+
+    def __init__(self, db):
+        """
+        Initialize the repository with the database connection
+        """
+        super().__init__("observations", db)
+
+    async def replace_for_reports(self, reports: List[Dict[str, Any]]) -> int:
+        """
+        Write the observations of stored reports, replacing any earlier ones
+
+        Args:
+            reports: Normalized report documents, with their _id
+
+        Returns:
+            Number of inserted observations
+        """
+        report_ids = [report["_id"] for report in reports]
+        rows = [row for report in reports for row in ReportMapper.extract_observations(report)]
+
+        await self.collection.delete_many({"report_id": {"$in": report_ids}})
+        if not rows:
+            return 0
+
+        await self.collection.insert_many(rows, ordered=False)
+        return len(rows)
+
+    async def delete_for_report(self, report_id: Any) -> int:
+        """
+        Delete the observations of a report
+
+        Returns:
+            Number of deleted observations
+        """
+        result = await self.collection.delete_many({"report_id": report_id})
+        return result.deleted_count
+
+    async def list_analytes(self, phone_number: str) -> List[str]:
+        """
+        List the analytes observed for a patient
+
+        Returns:
+            Normalized analyte names, sorted
+        """
+        analytes = await self.collection.distinct("meta.analyte", {"meta.phone_number": phone_number})
+        return sorted(analytes)
+
+    async def find_series(
+        self,
+        phone_number: str,
+        analyte: str,
+        from_date: Optional[datetime] = None,
+        to_date: Optional[datetime] = None,
+        limit: int = 1000
+    ) -> List[Dict[str, Any]]:
+        """
+        Get the observations of one analyte for a patient, oldest first
+
+        Args:
+            phone_number: The patient's phone number
+            analyte: Normalized analyte name
+            from_date: Optional earliest observation time
+            to_date: Optional latest observation time
+            limit: Maximum number of observations
+
+        Returns:
+            Observation rows without their meta and _id fields
+        """
+        query: Dict[str, Any] = {"meta.phone_number": phone_number, "meta.analyte": analyte}
+
+        time_filter = {}
+        if from_date:
+            time_filter["$gte"] = from_date
+        if to_date:
+            time_filter["$lte"] = to_date
+        if time_filter:
+            query["observed_at"] = time_filter
+
+        cursor = self.collection.find(query, {"_id": 0, "meta": 0}) \
+            .sort("observed_at", ASCENDING) \
+            .limit(limit)
+        return await cursor.to_list(length=limit)
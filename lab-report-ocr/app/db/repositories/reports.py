@@ -1,8 +1,9 @@
 import logging
 from datetime import datetime
-from typing import Dict, List, Optional, Any, Union
+from typing import Dict, List, Optional, Any, Tuple, Union
 
 from app.db.repositories.base import BaseRepository
+from app.db.search import search_filter
 from app.models.domain.report import LabReport
 
 logger = logging.getLogger(__name__)
@@ -30,30 +31,65 @@ class ReportRepository(BaseRepository):
         """
         Find reports by phone number with optional filters
         """
+        # Get reports
+        return await self.find_by_query(
+            query=self._phone_query(phone_number, test_type, from_date, to_date),
+            skip=skip,
+            limit=limit,
+            sort_field="collection_info.reported_on",
+            sort_direction=-1
+        )
+    
+    async def find_page_by_phone(
+        self,
+        phone_number: str,
+        limit: int = 10,
+        cursor: Optional[str] = None,
+        test_type: Optional[str] = None,
+        from_date: Optional[datetime] = None,
+        to_date: Optional[datetime] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Find one page of reports by phone number, newest report date first
+        
+        Returns:
+            The reports and the cursor of the next page
+        """
+        return await self.find_page(
+            query=self._phone_query(phone_number, test_type, from_date, to_date),
+            limit=limit,
+            cursor=cursor,
+            sort_field="collection_info.reported_on",
+            sort_direction=-1
+        )
+    
+    @staticmethod
+    def _phone_query(
+        phone_number: str,
+        test_type: Optional[str],
+        from_date: Optional[datetime],
+        to_date: Optional[datetime]
+    ) -> Dict[str, Any]:
+        """
+        Build the query for a patient's reports
+        """
         query = {"patient_info.phone_number": phone_number}
         
         # Add test type filter if provided
         if test_type:
-            query["test_name"] = {"$regex": test_type, "$options": "i"}
+            query.update(search_filter("test_name", test_type))
         
         # Add date range filter if provided
         date_filter = {}
         if from_date:
-            date_filter["$gte"] = from_date.isoformat()
+            date_filter["$gte"] = from_date
         if to_date:
-            date_filter["$lte"] = to_date.isoformat()
+            date_filter["$lte"] = to_date
         
         if date_filter:
             query["collection_info.reported_on"] = date_filter
         
-        # Get reports
-        return await self.find_by_query(
-            query=query,
-            skip=skip,
-            limit=limit,
-            sort_field="collection_info.reported_on",
-            sort_direction=-1
-        )
+        return query
     
     async def find_recent_by_phone(
         self, 
@@ -80,7 +116,7 @@ class ReportRepository(BaseRepository):
         Find reports by test type
         """
         return await self.find_by_query(
-            query={"test_name": {"$regex": test_type, "$options": "i"}},
+            query=search_filter("test_name", test_type),
             skip=skip,
             limit=limit
         )
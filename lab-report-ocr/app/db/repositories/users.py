@@ -2,6 +2,7 @@ import logging
 from typing import Dict, List, Optional, Any, Union
 
 from app.db.repositories.base import BaseRepository
+from app.db.search import SEARCH_KEYS_FIELD, search_filter, search_tokens
 from app.models.domain.user import User
 
 logger = logging.getLogger(__name__)
@@ -46,7 +47,8 @@ class UserRepository(BaseRepository):
                 logger.warning(f"User with email {user_data['email']} already exists")
                 return str(existing_user["_id"])
         
-        # Create new user
+        # Create new user with the normalized keys its name is searched by
+        user_data[SEARCH_KEYS_FIELD] = {"name": search_tokens(user_data.get("name"))}
         return await self.create(user_data)
     
     async def update_user(self, user_id: str, update_data: Dict[str, Any]) -> bool:
@@ -67,15 +69,18 @@ class UserRepository(BaseRepository):
                 logger.warning(f"Cannot update user: phone number {update_data['phone_number']} already in use")
                 return False
         
+        if update_data.get("name"):
+            update_data[f"{SEARCH_KEYS_FIELD}.name"] = search_tokens(update_data["name"])
+        
         # Update the user
         return await self.update(user_id, update_data)
     
     async def find_users_by_name(self, name: str, skip: int = 0, limit: int = 10) -> List[Dict[str, Any]]:
         """
-        Find users by name (partial match)
+        Find users by name (every word of name must start a word of the user's name)
         """
         return await self.find_by_query(
-            query={"name": {"$regex": name, "$options": "i"}},
+            query=search_filter("name", name),
             skip=skip,
             limit=limit
         )
\ No newline at end of file
@@ -0,0 +1,65 @@
+"""
+Search keys for indexed name lookups
+
+Searchable text is stored next to the original as a list of normalized words
+(lowercased, accents stripped, punctuation removed). A search matches when
+every word of the search term is a prefix of a stored word, which MongoDB
+serves with anchored, case-sensitive regexes over a multikey index instead of
+scanning the collection.
+"""
+import re
+import unicodedata
+from typing import Dict, Any, List, Optional
+
+# Field holding the search keys of a document
+SEARCH_KEYS_FIELD = "search_keys"
+
+_NON_ALPHANUMERIC = re.compile(r"[^0-9a-z]+")
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """
+    Normalize text for searching
+
+    Args:
+        text: Text to normalize
+
+    Returns:
+        Lowercased text without accents, punctuation collapsed to single spaces
+    """
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", str(text))
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return _NON_ALPHANUMERIC.sub(" ", stripped.casefold()).strip()
+
+
+def search_tokens(text: Optional[str]) -> List[str]:
+    """
+    Split text into its distinct normalized words
+
+    Args:
+        text: Text to split
+
+    Returns:
+        Normalized words in order of first appearance
+    """
+    return list(dict.fromkeys(normalize_text(text).split()))
+
+
+def search_filter(field: str, term: Optional[str]) -> Dict[str, Any]:
+    """
+    Build the filter matching documents whose search keys start with every word of a term
+
+    Args:
+        field: Name of the searched field under search_keys (e.g. test_name)
+        term: Search term as typed by the user
+
+    Returns:
+        Filter to merge into the query, empty if the term has no words
+    """
+    tokens = search_tokens(term)
+    if not tokens:
+        return {}
+    patterns = [re.compile("^" + re.escape(token)) for token in tokens]
+    return {f"{SEARCH_KEYS_FIELD}.{field}": {"$all": patterns}}
@@ -2,9 +2,11 @@ import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.api.routes import reports, users
+from app.api.routes import patients, reports, users
 from app.core.config import settings
 from app.db.database import db
+from app.services.ingestion.job_worker import report_job_workers
+from app.services.ocr.backend import ocr_backend_class
 
 # Configure logging
 logging.basicConfig(
@@ -31,14 +33,18 @@ app.add_middleware(
 # Include API routers
 app.include_router(reports.router, prefix=f"{settings.API_V1_STR}/reports", tags=["reports"])
 app.include_router(users.router, prefix=f"{settings.API_V1_STR}/users", tags=["users"])
+app.include_router(patients.router, prefix=f"{settings.API_V1_STR}/patients", tags=["patients"])
 
 # Set up event handlers for database connection
 @app.on_event("startup")
 async def startup_db_client():
     await db.connect_to_database()
+    await report_job_workers.start()
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await report_job_workers.stop()
+    await ocr_backend_class().close()
     await db.close_database_connection()
 
 # Root endpoint
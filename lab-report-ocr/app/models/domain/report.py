@@ -2,6 +2,12 @@ from typing import Dict, List, Optional, Any, Union
 from datetime import datetime
 from pydantic import BaseModel, Field
 
+# Version of the stored report format, bumped when ReportMapper.normalize changes
+REPORT_SCHEMA_VERSION = 2
+
+# Flags that mark a test result as outside its reference range
+ABNORMAL_FLAGS = ["H", "L", "HIGH", "LOW", "ABNORMAL"]
+
 
 class LabContact(BaseModel):
     """Lab contact information"""
@@ -73,6 +79,8 @@ class ClinicalNotes(BaseModel):
 class ReportMetadata(BaseModel):
     """Additional report metadata"""
     page_info: Optional[str] = None
+    page_count: Optional[int] = None
+    fallback_pages: Optional[List[int]] = None  # Pages whose extraction could not be parsed
     disclaimer: Optional[str] = None
     work_timings: Optional[str] = None
     report_type: str  # CBC, Lipid Profile, etc.
@@ -91,6 +99,8 @@ class LabReport(BaseModel):
     test_results: Dict[str, Any]  # Flexible structure to accommodate different test formats
     clinical_notes: Optional[ClinicalNotes] = None
     metadata: ReportMetadata
+    abnormal_count: int = 0
+    schema_version: int = REPORT_SCHEMA_VERSION
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
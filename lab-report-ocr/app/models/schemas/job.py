@@ -0,0 +1,26 @@
+from datetime import datetime
+from typing import Optional
+from pydantic import BaseModel
+
+
+class ReportJobCreatedResponse(BaseModel):
+    """Response schema for a queued report upload"""
+    job_id: str
+    status: str = "queued"
+    message: str = "Report queued for processing"
+
+
+class ReportJobStatusResponse(BaseModel):
+    """Response schema for the progress of a report upload job"""
+    job_id: str
+    status: str
+    stage: Optional[str] = None
+    attempts: int = 0
+    max_attempts: int
+    filename: Optional[str] = None
+    report_id: Optional[str] = None
+    error: Optional[str] = None
+    available_at: Optional[datetime] = None
+    created_at: datetime
+    updated_at: datetime
+    completed_at: Optional[datetime] = None
@@ -0,0 +1,30 @@
+from datetime import datetime
+from typing import List, Optional
+from pydantic import BaseModel
+
+
+class ObservationResponse(BaseModel):
+    """Response schema for one point of an analyte series"""
+    observed_at: datetime
+    name: str
+    section: Optional[str] = None
+    value: Optional[float] = None
+    value_text: Optional[str] = None
+    unit: Optional[str] = None
+    reference_range: Optional[str] = None
+    flag: Optional[str] = None
+    is_normal: Optional[bool] = None
+    report_id: str
+
+
+class AnalyteSeriesResponse(BaseModel):
+    """Response schema for the observations of one analyte of a patient"""
+    phone_number: str
+    analyte: str
+    observations: List[ObservationResponse]
+
+
+class AnalyteListResponse(BaseModel):
+    """Response schema for the analytes observed for a patient"""
+    phone_number: str
+    analytes: List[str]
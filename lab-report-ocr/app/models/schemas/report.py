@@ -2,6 +2,8 @@ from typing import Dict, List, Optional, Any, Union
 from datetime import datetime
 from pydantic import BaseModel, Field, model_validator
 
+from app.models.domain.report import REPORT_SCHEMA_VERSION
+
 
 # Request Schemas
 class ReportUploadRequest(BaseModel):
@@ -86,6 +88,8 @@ class ClinicalNotesResponse(BaseModel):
 class ReportMetadataResponse(BaseModel):
     """Response schema for report metadata with optional fields"""
     page_info: Optional[str] = None
+    page_count: Optional[int] = None
+    fallback_pages: Optional[List[int]] = None
     disclaimer: Optional[str] = None
     work_timings: Optional[str] = None
     report_type: str = "Laboratory Test"
@@ -109,6 +113,7 @@ class LabReportResponse(BaseModel):
     test_results: Dict[str, Any] = {}
     clinical_notes: Optional[ClinicalNotesResponse] = None
     metadata: ReportMetadataResponse
+    abnormal_count: Optional[int] = None
     created_at: datetime
     updated_at: datetime
     
@@ -120,8 +125,13 @@ class LabReportResponse(BaseModel):
     @model_validator(mode='before')
     @classmethod
     def ensure_required_fields(cls, data):
-        """Ensure all required fields exist with default values"""
-        if isinstance(data, dict):
+        """
+        Ensure all required fields exist with default values
+        
+        Documents written by ReportMapper.normalize already have them; the
+        fix-ups only run for documents the migrations have not reached yet.
+        """
+        if isinstance(data, dict) and data.get("schema_version") != REPORT_SCHEMA_VERSION:
             # Fix collection_info
             if 'collection_info' not in data or data['collection_info'] is None:
                 data['collection_info'] = {}
@@ -150,7 +160,28 @@ class LabReportResponse(BaseModel):
 class LabReportListResponse(BaseModel):
     """Response schema for a list of lab reports"""
     reports: List[LabReportResponse]
-    total: int
+    total: Optional[int] = None
+    total_is_estimate: bool = False
+    next_cursor: Optional[str] = None
+
+
+class LabReportSummaryResponse(BaseModel):
+    """Response schema for a report in a summary listing"""
+    id: str
+    test_name: str = "Laboratory Test"
+    test_category: str = "General"
+    lab_name: str = "Unknown Laboratory"
+    reported_on: Optional[datetime] = None
+    abnormal_count: Optional[int] = None
+    created_at: Optional[datetime] = None
+
+
+class LabReportSummaryListResponse(BaseModel):
+    """Response schema for a summary listing of lab reports"""
+    reports: List[LabReportSummaryResponse]
+    total: Optional[int] = None
+    total_is_estimate: bool = False
+    next_cursor: Optional[str] = None
 
 
 class LabReportUploadResponse(BaseModel):
@@ -51,4 +51,6 @@ class UserResponse(UserBase):
 class UserListResponse(BaseModel):
     """Schema for list of users response"""
     users: List[UserResponse]
-    total: int
\ No newline at end of file
+    total: Optional[int] = None
+    total_is_estimate: bool = False
+    next_cursor: Optional[str] = None
@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import os
+import socket
+from typing import Dict, Any, List, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from app.core.config import settings
+from app.db.database import db
+from app.db.repositories.jobs import JobRepository, JOB_FAILED
+from app.services.ingestion.report_ingestion import (
+    ReportIngestionService,
+    UnsupportedFileTypeError,
+    report_ingestion,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ReportJobWorkerPool:
+    """
+    Pool of background workers that process queued report uploads
+
+    Each worker claims one job at a time from the report_jobs collection and
+    keeps its lease alive while the job runs. Stale jobs left behind by a
+    crashed process are requeued on start and periodically afterwards.
+    """
+    
+    def __init__(
+        self,
+        concurrency: int = settings.REPORT_JOB_WORKERS,
+        lease_seconds: int = settings.REPORT_JOB_LEASE_SECONDS,
+        poll_interval_seconds: float = settings.REPORT_JOB_POLL_INTERVAL_SECONDS,
+        retry_backoff_seconds: float = settings.REPORT_JOB_RETRY_BACKOFF_SECONDS,
+    ):
+        """
+        Initialize the pool
+        
+        Args:
+            concurrency: Number of jobs processed at the same time
+            lease_seconds: How long a claimed job stays locked without a heartbeat
+            poll_interval_seconds: Sleep between polls of an empty queue
+            retry_backoff_seconds: Delay before the first retry of a failed job
+        """
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.poll_interval_seconds = poll_interval_seconds
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.jobs: Optional[JobRepository] = None
+        self._tasks: List[asyncio.Task] = []
+    
+    async def start(self) -> None:
+        """Recover stale jobs and start the workers"""
+        if self.concurrency <= 0 or self._tasks:
+            return
+        
+        database = db.get_db()
+        if database is None:
+            logger.warning("Database connection not available, report job workers not started")
+            return
+        
+        self.jobs = JobRepository(database)
+        await self.jobs.recover_stale()
+        
+        worker_prefix = f"{socket.gethostname()}-{os.getpid()}"
+        self._tasks = [
+            asyncio.create_task(self._run(f"{worker_prefix}-{number}"))
+            for number in range(self.concurrency)
+        ]
+        logger.info(f"Started {self.concurrency} report job workers")
+    
+    async def stop(self) -> None:
+        """
+        Stop the workers
+        
+        Jobs that are in progress keep their lease and are requeued by the next
+        recovery pass once it expires.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+    
+    async def _run(self, worker_id: str) -> None:
+        """Claim and process jobs until cancelled"""
+        loop = asyncio.get_running_loop()
+        last_recovery = loop.time()
+        
+        while True:
+            try:
+                if loop.time() - last_recovery > self.lease_seconds:
+                    await self.jobs.recover_stale()
+                    last_recovery = loop.time()
+                
+                job = await self.jobs.claim_next(worker_id, self.lease_seconds)
+                if job is None:
+                    await asyncio.sleep(self.poll_interval_seconds)
+                    continue
+                
+                await self._process(job, worker_id)
+            
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Report job worker {worker_id} error: {str(e)}")
+                await asyncio.sleep(self.poll_interval_seconds)
+    
+    async def _process(self, job: Dict[str, Any], worker_id: str) -> None:
+        """Run one job through the ingestion pipeline"""
+        job_id = job["_id"]
+        heartbeat = asyncio.create_task(self._heartbeat(job_id, worker_id))
+        
+        try:
+            file_info = job["file"]
+            report_data = await report_ingestion.extract_content(
+                bytes(file_info["data"]),
+                file_info["content_type"],
+                file_info["filename"],
+                job["phone_number"],
+                job.get("patient_name")
+            )
+            
+            await self.jobs.set_stage(job_id, "saving")
+            
+            # The report reuses the job ID, so a retry after a crash between the
+            # insert and the status update does not store the report twice
+            report_data["_id"] = job_id
+            try:
+                report_id = await ReportIngestionService.store(self.jobs.collection.database, report_data)
+            except DuplicateKeyError:
+                # Stored by an earlier attempt, make sure its observations are too
+                await ReportIngestionService.store_observations(self.jobs.collection.database, [report_data])
+                report_id = str(job_id)
+            
+            await self.jobs.mark_completed(job_id, report_id)
+            logger.info(f"Report job {job_id} completed with report {report_id}")
+        
+        except Exception as e:
+            status = await self.jobs.mark_attempt_failed(
+                job,
+                str(e),
+                self.retry_backoff_seconds,
+                retryable=not isinstance(e, UnsupportedFileTypeError)
+            )
+            log = logger.error if status == JOB_FAILED else logger.warning
+            log(f"Report job {job_id} attempt {job['attempts']} failed ({status}): {str(e)}")
+        
+        finally:
+            heartbeat.cancel()
+    
+    async def _heartbeat(self, job_id, worker_id: str) -> None:
+        """Keep the lease of a running job alive"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            await self.jobs.extend_lease(job_id, worker_id, self.lease_seconds)
+
+
+# Shared worker pool started with the application
+report_job_workers = ReportJobWorkerPool()
@@ -0,0 +1,278 @@
+import asyncio
+import io
+import logging
+import mimetypes
+import os
+import zipfile
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple
+
+from fastapi import UploadFile
+from pymongo.errors import BulkWriteError
+
+from app.db.repositories.observations import ObservationRepository
+from app.services.ocr.image_processor import ImageProcessor
+from app.services.ocr.pdf_processor import PDFProcessor
+from app.services.report_parser.report_mapper import ReportMapper
+
+logger = logging.getLogger(__name__)
+
+# A file in a batch upload: file name, content type and raw bytes
+BatchItem = Tuple[str, Optional[str], bytes]
+
+
+class UnsupportedFileTypeError(ValueError):
+    """Raised when an upload is neither an image nor a PDF"""
+
+
+class ArchiveError(ValueError):
+    """Raised when an uploaded archive cannot be unpacked"""
+
+
+class ReportIngestionService:
+    """Runs uploaded lab reports through OCR, mapping and storage"""
+    
+    def __init__(self):
+        """Initialize the image and PDF processors"""
+        self.image_processor = ImageProcessor()
+        self.pdf_processor = PDFProcessor()
+    
+    @staticmethod
+    def is_supported(content_type: Optional[str]) -> bool:
+        """
+        Check whether a content type can be processed
+        
+        Args:
+            content_type: Content type of the upload
+        
+        Returns:
+            True for images and PDFs
+        """
+        return bool(content_type) and ("image" in content_type or content_type == "application/pdf")
+    
+    async def extract_upload(
+        self,
+        file: UploadFile,
+        phone_number: str,
+        patient_name: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Extract a report document from an uploaded file
+        
+        Args:
+            file: The uploaded image or PDF
+            phone_number: The user's phone number
+            patient_name: Optional patient name overriding the extracted one
+        
+        Returns:
+            Report document ready to be stored
+        """
+        if not self.is_supported(file.content_type):
+            raise UnsupportedFileTypeError(file.content_type)
+        
+        if "image" in file.content_type:
+            report_data = await self.image_processor.process_image_file(file, phone_number)
+        else:
+            report_data = await self.pdf_processor.process_pdf_file(file, phone_number)
+        
+        return self._finalize(report_data, patient_name)
+    
+    async def extract_content(
+        self,
+        content: bytes,
+        content_type: str,
+        filename: str,
+        phone_number: str,
+        patient_name: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Extract a report document from the raw bytes of a file
+        
+        Args:
+            content: Raw bytes of the image or PDF
+            content_type: Content type of the file
+            filename: Original file name
+            phone_number: The user's phone number
+            patient_name: Optional patient name overriding the extracted one
+        
+        Returns:
+            Report document ready to be stored
+        """
+        if not self.is_supported(content_type):
+            raise UnsupportedFileTypeError(content_type)
+        
+        if "image" in content_type:
+            report_data = await self.image_processor.process_image_content(content, filename, phone_number)
+        else:
+            report_data = await self.pdf_processor.process_pdf_content(content, filename, phone_number)
+        
+        return self._finalize(report_data, patient_name)
+    
+    @staticmethod
+    async def store(db, report_data: Dict[str, Any]) -> str:
+        """
+        Insert a report document and its observations
+        
+        Args:
+            db: Database instance
+            report_data: Report document from extract_upload or extract_content
+        
+        Returns:
+            ID of the inserted report
+        """
+        result = await db.reports.insert_one(report_data)
+        await ReportIngestionService.store_observations(db, [report_data])
+        return str(result.inserted_id)
+    
+    @staticmethod
+    async def store_observations(db, reports: List[Dict[str, Any]]) -> None:
+        """
+        Write the analyte observations of stored reports
+        
+        Observations are derived data: a failure is logged and does not undo
+        the report insert. Rerunning the observations migration rebuilds them.
+        
+        Args:
+            db: Database instance
+            reports: Stored report documents, with their _id
+        """
+        if not reports:
+            return
+        try:
+            await ObservationRepository(db).replace_for_reports(reports)
+        except Exception as e:
+            logger.error(f"Error storing observations for {len(reports)} reports: {str(e)}")
+    
+    async def ingest_batch(
+        self,
+        db,
+        items: List[BatchItem],
+        phone_number: str,
+        patient_name: Optional[str] = None,
+        concurrency: int = 4
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Extract many reports concurrently and store them with one insert_many
+        
+        Yields one "extracted" or "failed" outcome per file as soon as its
+        extraction finishes, then one "stored" outcome per stored report and a
+        final summary.
+        
+        Args:
+            db: Database instance
+            items: Files to ingest
+            phone_number: The user's phone number
+            patient_name: Optional patient name overriding the extracted ones
+            concurrency: Maximum number of files extracted at the same time
+        
+        Yields:
+            Outcome dictionaries
+        """
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        
+        async def extract(index: int, item: BatchItem) -> Tuple[int, Optional[Dict[str, Any]], Optional[str]]:
+            filename, content_type, content = item
+            async with semaphore:
+                try:
+                    report_data = await self.extract_content(
+                        content, content_type, filename, phone_number, patient_name
+                    )
+                    return index, report_data, None
+                except UnsupportedFileTypeError:
+                    return index, None, f"Unsupported file type: {content_type}"
+                except Exception as e:
+                    logger.error(f"Error processing batch file {filename}: {str(e)}")
+                    return index, None, str(e)
+        
+        extracted: List[Tuple[int, Dict[str, Any]]] = []
+        failed = 0
+        
+        for next_done in asyncio.as_completed([extract(index, item) for index, item in enumerate(items)]):
+            index, report_data, error = await next_done
+            outcome = {"index": index, "filename": items[index][0]}
+            if error is None:
+                extracted.append((index, report_data))
+                yield {**outcome, "status": "extracted", "test_name": report_data.get("test_name")}
+            else:
+                failed += 1
+                yield {**outcome, "status": "failed", "error": error}
+        
+        stored = 0
+        if extracted:
+            write_errors = {}
+            try:
+                result = await db.reports.insert_many([report for _, report in extracted], ordered=False)
+                inserted_ids = result.inserted_ids
+            except BulkWriteError as e:
+                # insert_many assigns _id to every document before sending them
+                inserted_ids = [report.get("_id") for _, report in extracted]
+                write_errors = {error["index"]: error.get("errmsg", "Write error") for error in e.details.get("writeErrors", [])}
+            
+            await self.store_observations(
+                db, [report for position, (_, report) in enumerate(extracted) if position not in write_errors]
+            )
+            
+            for position, (index, _) in enumerate(extracted):
+                outcome = {"index": index, "filename": items[index][0]}
+                if position in write_errors:
+                    failed += 1
+                    yield {**outcome, "status": "failed", "error": write_errors[position]}
+                else:
+                    stored += 1
+                    yield {**outcome, "status": "stored", "report_id": str(inserted_ids[position])}
+        
+        yield {"status": "summary", "total": len(items), "stored": stored, "failed": failed}
+    
+    @staticmethod
+    def unpack_archive(content: bytes, max_files: int, max_uncompressed_bytes: int) -> List[BatchItem]:
+        """
+        Unpack the reports in a zip archive
+        
+        Directories, hidden files and macOS resource forks are skipped.
+        
+        Args:
+            content: Raw bytes of the zip archive
+            max_files: Maximum number of reports in the archive
+            max_uncompressed_bytes: Maximum total uncompressed size
+        
+        Returns:
+            Files in the archive
+        """
+        try:
+            archive = zipfile.ZipFile(io.BytesIO(content))
+        except zipfile.BadZipFile as e:
+            raise ArchiveError(f"Invalid zip archive: {str(e)}")
+        
+        with archive:
+            entries = [
+                entry for entry in archive.infolist()
+                if not entry.is_dir()
+                and not entry.filename.startswith("__MACOSX/")
+                and not os.path.basename(entry.filename).startswith(".")
+            ]
+            
+            if len(entries) > max_files:
+                raise ArchiveError(f"Archive contains {len(entries)} files, the limit is {max_files}")
+            if sum(entry.file_size for entry in entries) > max_uncompressed_bytes:
+                raise ArchiveError(f"Archive expands to more than {max_uncompressed_bytes} bytes")
+            
+            return [
+                (
+                    os.path.basename(entry.filename),
+                    mimetypes.guess_type(entry.filename)[0],
+                    archive.read(entry)
+                )
+                for entry in entries
+            ]
+    
+    @staticmethod
+    def _finalize(report_data: Dict[str, Any], patient_name: Optional[str]) -> Dict[str, Any]:
+        """Apply the patient name override, the document is already normalized by ReportMapper"""
+        # Add patient name if provided
+        if patient_name and "patient_info" in report_data:
+            report_data["patient_info"]["name"] = patient_name
+        
+        return report_data
+
+
+# Shared ingestion service used by the upload routes and the job workers
+report_ingestion = ReportIngestionService()
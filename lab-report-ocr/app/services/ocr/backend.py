@@ -0,0 +1,116 @@
+import importlib
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Optional, Type
+
+from app.core.config import settings
+
+# Backend class path for each OCR_BACKEND value
+OCR_BACKENDS = {
+    "claude": ("app.services.ocr.claude_service", "ClaudeOCRService"),
+    "local": ("app.services.ocr.local_backend", "LocalOCRBackend"),
+}
+
+
+class OCRBackend(ABC):
+    """
+    Abstract base class for OCR backends
+
+    A backend turns one page image into extracted report data. The image and
+    PDF processors only talk to this interface, so the Claude service can be
+    swapped for the local stand-in when benchmarking the pipeline offline.
+    """
+
+    # Name of the model behind the backend, part of OCR cache keys
+    model: str
+
+    @property
+    @abstractmethod
+    def prompt_version(self) -> str:
+        """Version of whatever shapes the extraction, part of OCR cache keys"""
+        pass
+
+    @abstractmethod
+    async def process_image_bytes(
+        self,
+        image_bytes: bytes,
+        media_type: str,
+        source: str = "upload",
+        on_field: Optional[Callable[[str, Any], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Extract lab report data from an in-memory image
+
+        Args:
+            image_bytes: Encoded image bytes
+            media_type: Media type of the image (e.g. image/png)
+            source: Name of the image used in log messages
+            on_field: Optional callback receiving each top-level field of the
+                extraction as soon as it is available
+
+        Returns:
+            Extracted report data
+        """
+        pass
+
+    async def process_image(self, image_path: str) -> Dict[str, Any]:
+        """Process an image file on disk and extract lab report data"""
+        with open(image_path, "rb") as image_file:
+            image_bytes = image_file.read()
+
+        return await self.process_image_bytes(
+            image_bytes,
+            self.detect_media_type(image_bytes, image_path),
+            source=image_path
+        )
+
+    @staticmethod
+    def detect_media_type(image_bytes: bytes, filename: Optional[str] = None) -> str:
+        """
+        Detect the media type of an image from its magic bytes
+
+        Args:
+            image_bytes: Raw image bytes
+            filename: Optional file name used when the bytes are not recognised
+
+        Returns:
+            Media type accepted by the Claude API
+        """
+        if image_bytes.startswith(b"\x89PNG"):
+            return "image/png"
+        if image_bytes.startswith(b"\xff\xd8"):
+            return "image/jpeg"
+        if image_bytes.startswith((b"GIF87a", b"GIF89a")):
+            return "image/gif"
+        if image_bytes[:4] == b"RIFF" and image_bytes[8:12] == b"WEBP":
+            return "image/webp"
+
+        # Determine file type from extension
+        if filename and filename.lower().endswith('.png'):
+            return "image/png"
+        return "image/jpeg"  # Default to JPEG
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, Any]:
+        """Get counters kept by the backend"""
+        return {}
+
+    @classmethod
+    async def close(cls) -> None:
+        """Release resources shared by the backend's instances"""
+        pass
+
+
+def ocr_backend_class() -> Type[OCRBackend]:
+    """
+    Get the OCR backend class selected by OCR_BACKEND
+
+    Returns:
+        The backend class, ClaudeOCRService for unknown values
+    """
+    module_name, class_name = OCR_BACKENDS.get(settings.OCR_BACKEND.lower(), OCR_BACKENDS["claude"])
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def create_ocr_backend() -> OCRBackend:
+    """Create an instance of the configured OCR backend"""
+    return ocr_backend_class()()
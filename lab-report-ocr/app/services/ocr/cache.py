@@ -0,0 +1,198 @@
+import copy
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple
+
+from app.core.config import settings
+from app.db.database import db
+
+logger = logging.getLogger(__name__)
+
+
+class OCRResultCache:
+    """
+    Two-tier cache for OCR extractions keyed by the uploaded file content
+
+    The first tier is an in-process LRU, the second a MongoDB collection whose
+    entries are evicted by a TTL index (see app.db.indexes). Both tiers store
+    the raw extraction, before it is mapped to a patient, so identical uploads
+    from different patients share one entry.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = settings.OCR_CACHE_MAX_ENTRIES,
+        ttl_seconds: int = settings.OCR_CACHE_TTL_SECONDS,
+        collection_name: str = settings.OCR_CACHE_COLLECTION,
+    ):
+        """
+        Initialize the cache
+
+        Args:
+            max_entries: Maximum number of entries kept in memory
+            ttl_seconds: Time to live of an entry in both tiers
+            collection_name: MongoDB collection used for the persistent tier
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.collection_name = collection_name
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._stats = {
+            "memory_hits": 0,
+            "persistent_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "errors": 0,
+        }
+
+    @staticmethod
+    def build_key(content: bytes, model: str, prompt_version: str, variant: str = "") -> str:
+        """
+        Build the cache key for an upload
+
+        Args:
+            content: Raw bytes of the uploaded file
+            model: Claude model used for the extraction
+            prompt_version: Version of the system prompt
+            variant: Processing mode that changes the result (e.g. all PDF pages)
+
+        Returns:
+            Cache key
+        """
+        digest = hashlib.sha256(content).hexdigest()
+        return OCRResultCache.build_key_from_digest(digest, model, prompt_version, variant)
+
+    @staticmethod
+    def build_key_from_digest(digest: str, model: str, prompt_version: str, variant: str = "") -> str:
+        """
+        Build the cache key from a precomputed SHA-256 hex digest
+
+        Used when the upload is hashed incrementally instead of read into memory.
+
+        Args:
+            digest: SHA-256 hex digest of the file bytes
+            model: Claude model used for the extraction
+            prompt_version: Version of the system prompt
+            variant: Processing mode that changes the result
+
+        Returns:
+            Cache key
+        """
+        return f"{digest}:{model}:{prompt_version}:{variant}"
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up an extraction
+
+        Args:
+            key: Cache key from build_key
+
+        Returns:
+            A copy of the cached extraction, or None on a miss
+        """
+        if not settings.OCR_CACHE_ENABLED:
+            return None
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, data = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return copy.deepcopy(data)
+            del self._entries[key]
+
+        collection = self._get_collection()
+        if collection is not None:
+            try:
+                document = await collection.find_one({"_id": key})
+                if document and self._is_fresh(document.get("created_at")):
+                    self._remember(key, document["data"])
+                    self._stats["persistent_hits"] += 1
+                    return copy.deepcopy(document["data"])
+            except Exception as e:
+                self._stats["errors"] += 1
+                logger.warning(f"Error reading OCR cache: {str(e)}")
+
+        self._stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, data: Dict[str, Any]) -> None:
+        """
+        Store an extraction
+
+        Extractions without test results are not cached, since they usually
+        mean the model response could not be parsed, and neither are
+        extractions with a page that fell back to the default structure.
+
+        Args:
+            key: Cache key from build_key
+            data: Extracted report data
+        """
+        if not settings.OCR_CACHE_ENABLED or not data.get("test_results"):
+            return
+        if (data.get("metadata") or {}).get("fallback_pages"):
+            return
+
+        self._remember(key, data)
+        self._stats["stores"] += 1
+
+        collection = self._get_collection()
+        if collection is not None:
+            try:
+                await collection.replace_one(
+                    {"_id": key},
+                    {"_id": key, "data": data, "created_at": datetime.utcnow()},
+                    upsert=True
+                )
+            except Exception as e:
+                self._stats["errors"] += 1
+                logger.warning(f"Error writing OCR cache: {str(e)}")
+
+    def clear(self) -> None:
+        """Drop all in-memory entries"""
+        self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get hit and miss counters
+
+        Returns:
+            Counters and the overall hit rate
+        """
+        hits = self._stats["memory_hits"] + self._stats["persistent_hits"]
+        lookups = hits + self._stats["misses"]
+        return {
+            **self._stats,
+            "hits": hits,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._entries),
+        }
+
+    def _remember(self, key: str, data: Dict[str, Any]) -> None:
+        """Put an entry in the in-memory tier, evicting the least recently used"""
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, copy.deepcopy(data))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _is_fresh(self, created_at: Optional[datetime]) -> bool:
+        """Check an entry against the TTL, since MongoDB removes expired documents lazily"""
+        if created_at is None:
+            return False
+        return (datetime.utcnow() - created_at).total_seconds() < self.ttl_seconds
+
+    def _get_collection(self):
+        """Get the persistent tier collection, or None if it is not available"""
+        if not settings.OCR_CACHE_PERSISTENT:
+            return None
+        if db.client is None:
+            return None
+        return db.client[settings.MONGODB_DB_NAME][self.collection_name]
+
+
+# Shared cache instance used by the image and PDF processors
+ocr_cache = OCRResultCache()
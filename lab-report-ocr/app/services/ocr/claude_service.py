@@ -1,13 +1,17 @@
 import base64
 import json
 import logging
-import os
 import asyncio
-import re
-from typing import Dict, Any, Optional
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Any, Optional
 
 import anthropic
+import httpx
 from app.core.config import settings
+from app.services.ocr.backend import OCRBackend
+from app.services.ocr.extraction_schema import EXTRACTION_TOOL_NAME, extraction_tool, validate_extraction
+from app.services.ocr.json_stream import StreamingJSONParser
 
 logger = logging.getLogger(__name__)
 
@@ -18,18 +22,89 @@ VALID_CLAUDE_MODELS = [
     "claude-3-haiku-20240307"
 ]
 
-class ClaudeOCRService:
+# "stream" asks for JSON text, "tool" for the arguments of the extraction tool
+EXTRACTION_MODES = ("stream", "tool")
+
+# Beta header enabling tool use on the Messages API
+TOOLS_BETA = "tools-2024-05-16"
+
+class ClaudeOCRService(OCRBackend):
     """Service to process lab report images using Claude's vision capabilities"""
     
+    # Bump whenever the system prompt changes so cached extractions are not reused
+    SYSTEM_PROMPT_VERSION = "1"
+    
+    # Async client and concurrency limit shared by every service instance
+    _client: Optional[anthropic.AsyncAnthropic] = None
+    _semaphore: Optional[asyncio.Semaphore] = None
+    
+    # Parse outcome counters and recent latencies, shared by every service instance
+    _stats: Dict[str, int] = {
+        "responses": 0,
+        "clean": 0,
+        "repaired": 0,
+        "fallbacks": 0,
+        "tool_pages": 0,
+        "tool_requests": 0,
+        "tool_retries": 0,
+        "tool_fallbacks": 0,
+    }
+    _latencies: Dict[str, Deque[float]] = {
+        "first_token_seconds": deque(maxlen=1000),
+        "first_field_seconds": deque(maxlen=1000),
+        "completion_seconds": deque(maxlen=1000),
+    }
+    
     def __init__(self):
         """Initialize the Claude client using direct Anthropic API"""
-        self.client = anthropic.Anthropic(api_key=settings.ANTHROPIC_API_KEY)
+        self._get_shared_client()
         
         # Ensure we're using a valid model
         self.model = self._get_valid_model()
         logger.info(f"Using Claude model: {self.model}")
         
+        self.extraction_mode = self._get_extraction_mode()
         self.system_prompt = self._get_system_prompt()
+        self.tool_system_prompt = self._get_tool_system_prompt()
+    
+    @property
+    def prompt_version(self) -> str:
+        """Version of the prompt and extraction mode, part of OCR cache keys"""
+        if self.extraction_mode == "tool":
+            return f"{self.SYSTEM_PROMPT_VERSION}:tool"
+        return self.SYSTEM_PROMPT_VERSION
+    
+    @classmethod
+    def _get_shared_client(cls) -> anthropic.AsyncAnthropic:
+        """Get the async Anthropic client, creating it with a pooled HTTP client on first use"""
+        if cls._client is None:
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.OCR_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.OCR_MAX_KEEPALIVE_CONNECTIONS,
+                ),
+                timeout=httpx.Timeout(settings.OCR_REQUEST_TIMEOUT_SECONDS, connect=10.0),
+            )
+            cls._client = anthropic.AsyncAnthropic(
+                api_key=settings.ANTHROPIC_API_KEY,
+                http_client=http_client,
+                max_retries=settings.OCR_MAX_RETRIES,
+            )
+            cls._semaphore = asyncio.Semaphore(max(1, settings.OCR_MAX_CONCURRENCY))
+        return cls._client
+    
+    @property
+    def client(self) -> anthropic.AsyncAnthropic:
+        """Shared async Anthropic client"""
+        return self._get_shared_client()
+    
+    @classmethod
+    async def close(cls) -> None:
+        """Close the shared client and its connection pool"""
+        if cls._client is not None:
+            await cls._client.close()
+            cls._client = None
+            cls._semaphore = None
     
     def _get_valid_model(self) -> str:
         """Get a valid Claude model name, falling back to a known working model if necessary"""
@@ -43,6 +118,28 @@ class ClaudeOCRService:
         logger.warning(f"Model '{configured_model}' may not be valid. Falling back to claude-3-sonnet-20240229")
         return "claude-3-sonnet-20240229"
     
+    def _get_extraction_mode(self) -> str:
+        """Get the configured extraction mode, falling back to streamed JSON"""
+        mode = settings.OCR_EXTRACTION_MODE.lower()
+        if mode in EXTRACTION_MODES:
+            return mode
+        
+        logger.warning(f"Unknown OCR extraction mode '{settings.OCR_EXTRACTION_MODE}'. Falling back to stream")
+        return "stream"
+    
+    def _get_tool_system_prompt(self) -> str:
+        """Get the system prompt used when extracting through the tool"""
+        return """
+        You are an OCR assistant specializing in extracting structured data from medical lab report images.
+        
+        Extract all relevant information from the lab report image: lab information, patient information,
+        collection dates, the test category and name, every test result with its value, unit, reference
+        range and flag, clinical notes and page metadata.
+        
+        Record the extraction by calling the tool. Copy dates exactly as printed, use null for anything
+        that is not on the report, and never invent values.
+        """
+    
     def _get_system_prompt(self) -> str:
         """Get the system prompt for Claude to process lab reports"""
         return """
@@ -116,50 +213,6 @@ class ClaudeOCRService:
         Response must be ONLY the JSON. Do not include any explanations, markdown code blocks, or descriptions. The JSON must be syntactically valid.
         """
     
-    def _fix_json(self, json_str: str) -> str:
-        """
-        Fix common JSON syntax errors
-        
-        Args:
-            json_str: Potentially broken JSON string
-            
-        Returns:
-            Fixed JSON string
-        """
-        # Log the first part of the original string for debugging
-        logger.debug(f"Original JSON string (first 200 chars): {json_str[:200]}...")
-        
-        # Remove any markdown code block markers
-        json_str = json_str.replace("```json", "").replace("```", "").strip()
-        
-        # Attempt to extract JSON if surrounded by other text
-        json_match = re.search(r'(\{.*\})', json_str, re.DOTALL)
-        if json_match:
-            json_str = json_match.group(1)
-        
-        # Fix common JSON syntax errors:
-        # 1. Fix trailing commas in objects
-        json_str = re.sub(r',(\s*})', r'\1', json_str)
-        
-        # 2. Fix trailing commas in arrays
-        json_str = re.sub(r',(\s*\])', r'\1', json_str)
-        
-        # 3. Fix missing quotes around property names
-        json_str = re.sub(r'([{,]\s*)([a-zA-Z_][a-zA-Z0-9_]*)(\s*:)', r'\1"\2"\3', json_str)
-        
-        # 4. Fix single quotes used instead of double quotes
-        # This is tricky and might cause issues, so only do it if absolutely necessary
-        if '"' not in json_str and "'" in json_str:
-            json_str = json_str.replace("'", '"')
-        
-        # 5. Fix missing commas between properties
-        # json_str = re.sub(r'(["]}])\s*(["[{a-zA-Z_])', r'\1,\2', json_str)
-        
-        # Log the fixed string for debugging
-        logger.debug(f"Fixed JSON string (first 200 chars): {json_str[:200]}...")
-        
-        return json_str
-    
     def _create_default_structure(self) -> Dict[str, Any]:
         """Create a default structure with all required fields"""
         return {
@@ -203,105 +256,264 @@ class ClaudeOCRService:
             }
         }
     
-    async def process_image(self, image_path: str) -> Dict[str, Any]:
-        """Process an image and extract lab report data"""
+    async def process_image_bytes(
+        self,
+        image_bytes: bytes,
+        media_type: str,
+        source: str = "upload",
+        on_field: Optional[Callable[[str, Any], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Process an in-memory image and extract lab report data
+        
+        In "tool" extraction mode the model fills in the arguments of a tool
+        whose schema is derived from the report model, and the request is
+        repeated for this image only when the arguments are unusable. In
+        "stream" mode, or when those attempts fail, the JSON answer is
+        streamed and parsed as it arrives, so top-level fields such as
+        patient_info are decoded before the model finishes.
+        
+        Args:
+            image_bytes: Encoded image bytes
+            media_type: Media type of the image (e.g. image/png)
+            source: Name of the image used in log messages
+            on_field: Optional callback receiving each top-level field of the
+                answer as soon as it is complete
+        
+        Returns:
+            Extracted report data
+        """
         try:
-            # Determine file type from extension
-            if image_path.lower().endswith(('.jpg', '.jpeg')):
-                media_type = "image/jpeg"
-            elif image_path.lower().endswith('.png'):
-                media_type = "image/png"
-            else:
-                media_type = "image/jpeg"  # Default to JPEG
-            
-            # Read image file and encode as base64
-            with open(image_path, "rb") as image_file:
-                image_bytes = image_file.read()
-                base64_encoded = base64.b64encode(image_bytes).decode('utf-8')
+            base64_encoded = base64.b64encode(image_bytes).decode('utf-8')
             
-            logger.info(f"Processing image: {image_path} as {media_type}")
+            logger.info(f"Processing image: {source} as {media_type}")
             
-            # Create message content for API call
-            message_content = [
-                {
-                    "type": "text",
-                    "text": "Extract all data from this lab report and return it as valid JSON according to the specified format. Ensure the JSON is syntactically correct with proper quotes, commas, and brackets."
-                },
-                {
-                    "type": "image",
-                    "source": {
-                        "type": "base64",
-                        "media_type": media_type,
-                        "data": base64_encoded
-                    }
+            image_content = {
+                "type": "image",
+                "source": {
+                    "type": "base64",
+                    "media_type": media_type,
+                    "data": base64_encoded
                 }
-            ]
-
-            # Make the API call using a thread pool to avoid blocking the event loop
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None, 
-                lambda: self.client.messages.create(
+            }
+            
+            if self.extraction_mode == "tool":
+                extracted_data = await self._extract_with_tool(image_content, source)
+                if extracted_data is not None:
+                    if on_field is not None:
+                        for key, value in extracted_data.items():
+                            on_field(key, value)
+                    return extracted_data
+            
+            return await self._extract_streamed(image_content, source, on_field)
+        
+        except Exception as e:
+            logger.error(f"Error processing image with Claude: {str(e)}")
+            logger.error(f"Image source: {source}")
+            raise
+    
+    async def _extract_streamed(
+        self,
+        image_content: Dict[str, Any],
+        source: str,
+        on_field: Optional[Callable[[str, Any], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Ask for the report as JSON text and parse the answer while it streams
+        
+        Args:
+            image_content: Image content block of the request
+            source: Name of the image used in log messages
+            on_field: Optional callback receiving each complete top-level field
+        
+        Returns:
+            Extracted report data
+        """
+        message_content = [
+            {
+                "type": "text",
+                "text": "Extract all data from this lab report and return it as valid JSON according to the specified format. Ensure the JSON is syntactically correct with proper quotes, commas, and brackets."
+            },
+            image_content
+        ]
+        
+        timings: Dict[str, float] = {}
+        
+        def field_ready(key: str, value: Any) -> None:
+            if "first_field_seconds" not in timings:
+                timings["first_field_seconds"] = time.perf_counter() - started
+                logger.debug(f"First field '{key}' of {source} ready after {timings['first_field_seconds']:.2f}s")
+            if on_field is not None:
+                on_field(key, value)
+        
+        parser = StreamingJSONParser(on_field=field_ready)
+        
+        # Stream the answer, bounded by the shared concurrency limit
+        client = self.client
+        async with self._semaphore:
+            started = time.perf_counter()
+            async with client.messages.stream(
+                model=self.model,
+                max_tokens=4096,
+                temperature=0,
+                system=self.system_prompt,
+                messages=[{"role": "user", "content": message_content}],
+                timeout=settings.OCR_REQUEST_TIMEOUT_SECONDS
+            ) as stream:
+                async for text in stream.text_stream:
+                    if "first_token_seconds" not in timings:
+                        timings["first_token_seconds"] = time.perf_counter() - started
+                    parser.feed(text)
+            timings["completion_seconds"] = time.perf_counter() - started
+        
+        extracted_data = self._parse_response(parser, source)
+        self._record_timings(timings)
+        return extracted_data
+    
+    async def _extract_with_tool(self, image_content: Dict[str, Any], source: str) -> Optional[Dict[str, Any]]:
+        """
+        Have the model call the extraction tool and return its arguments
+        
+        The SDK version in use predates tool support, so the tool definition
+        is sent in the request body and the raw response is read directly.
+        
+        Args:
+            image_content: Image content block of the request
+            source: Name of the image used in log messages
+        
+        Returns:
+            Extracted report data, or None if no attempt gave usable arguments
+        """
+        stats = ClaudeOCRService._stats
+        stats["tool_pages"] += 1
+        
+        message_content = [
+            {
+                "type": "text",
+                "text": f"Extract all data from this lab report and record it with the {EXTRACTION_TOOL_NAME} tool."
+            },
+            image_content
+        ]
+        
+        client = self.client
+        attempts = max(1, settings.OCR_TOOL_MAX_ATTEMPTS)
+        for attempt in range(1, attempts + 1):
+            stats["tool_requests"] += 1
+            async with self._semaphore:
+                started = time.perf_counter()
+                raw_response = await client.messages.with_raw_response.create(
                     model=self.model,
                     max_tokens=4096,
                     temperature=0,
-                    system=self.system_prompt,
-                    messages=[{"role": "user", "content": message_content}]
+                    system=self.tool_system_prompt,
+                    messages=[{"role": "user", "content": message_content}],
+                    timeout=settings.OCR_REQUEST_TIMEOUT_SECONDS,
+                    extra_headers={"anthropic-beta": TOOLS_BETA},
+                    extra_body={
+                        "tools": [extraction_tool()],
+                        "tool_choice": {"type": "tool", "name": EXTRACTION_TOOL_NAME},
+                    }
                 )
-            )
+                elapsed = time.perf_counter() - started
             
-            # Extract the response text
-            response_text = response.content[0].text
+            payload = json.loads(raw_response.text)
+            arguments = next(
+                (
+                    block.get("input")
+                    for block in payload.get("content", [])
+                    if block.get("type") == "tool_use" and block.get("name") == EXTRACTION_TOOL_NAME
+                ),
+                None
+            )
             
-            # Log a sample of the response for debugging
-            logger.debug(f"Claude response (first 500 chars): {response_text[:500]}...")
+            if arguments is None:
+                problems = ["no tool call in the response"]
+            elif payload.get("stop_reason") == "max_tokens":
+                problems = ["response cut off at max_tokens"]
+            else:
+                problems = validate_extraction(arguments)
             
-            # Try to fix and parse the JSON
-            try:
-                # First, try to parse the raw response
-                cleaned_text = self._fix_json(response_text)
-                extracted_data = json.loads(cleaned_text)
-                logger.info(f"Successfully extracted data from image: {image_path}")
-            except json.JSONDecodeError as e:
-                logger.warning(f"First parsing attempt failed: {str(e)}. Trying more aggressive JSON fixing...")
-                
-                try:
-                    # More aggressive JSON extraction
-                    pattern = r'({[^{]*?"report_info".*?})'
-                    matches = re.findall(pattern, response_text, re.DOTALL)
-                    
-                    if matches:
-                        for potential_json in matches:
-                            try:
-                                fixed_json = self._fix_json(potential_json)
-                                extracted_data = json.loads(fixed_json)
-                                logger.info(f"Successfully extracted JSON after aggressive cleaning")
-                                break
-                            except json.JSONDecodeError:
-                                continue
-                        else:
-                            raise ValueError("Could not parse any potential JSON matches")
-                    else:
-                        # Fall back to a default structure and try to extract specific fields
-                        logger.warning("No valid JSON structure found, using default structure")
-                        extracted_data = self._create_default_structure()
-                        
-                        # Try to extract lab name, patient name, etc. using regex
-                        lab_match = re.search(r'lab_name["\s:]+([^"]+)', response_text)
-                        if lab_match:
-                            extracted_data["report_info"]["lab_name"] = lab_match.group(1).strip().strip('"').strip("'")
-                        
-                        patient_match = re.search(r'name["\s:]+([^"]+)', response_text)
-                        if patient_match:
-                            extracted_data["patient_info"]["name"] = patient_match.group(1).strip().strip('"').strip("'")
-                except Exception as nested_error:
-                    logger.error(f"Error during aggressive JSON extraction: {str(nested_error)}")
-                    logger.error(f"Using default structure instead")
-                    extracted_data = self._create_default_structure()
+            if not problems:
+                self._record_timings({"first_field_seconds": elapsed, "completion_seconds": elapsed})
+                logger.info(f"Successfully extracted data from image: {source} with the extraction tool")
+                return arguments
             
+            logger.warning(f"Unusable tool arguments for {source} (attempt {attempt} of {attempts}): {', '.join(problems)}")
+            if attempt < attempts:
+                stats["tool_retries"] += 1
+        
+        stats["tool_fallbacks"] += 1
+        logger.warning(f"Falling back to streamed JSON extraction for {source}")
+        return None
+    
+    def _parse_response(self, parser: StreamingJSONParser, source: str) -> Dict[str, Any]:
+        """
+        Decode a streamed answer, falling back to the default structure
+        
+        Args:
+            parser: Parser that consumed the whole answer
+            source: Name of the image used in log messages
+        
+        Returns:
+            Extracted report data
+        """
+        stats = ClaudeOCRService._stats
+        stats["responses"] += 1
+        
+        try:
+            extracted_data = parser.result()
+            if not isinstance(extracted_data, dict):
+                raise ValueError(f"Expected a JSON object, got {type(extracted_data).__name__}")
+        except ValueError as e:
+            # Keep whatever top-level fields were complete before the output broke down
+            logger.warning(f"Could not parse Claude response for {source}: {str(e)}. Using default structure")
+            stats["fallbacks"] += 1
+            extracted_data = self._create_default_structure()
+            extracted_data.update(parser.fields)
+            # Marks the extraction as incomplete so it is not cached
+            if not isinstance(extracted_data.get("metadata"), dict):
+                extracted_data["metadata"] = {}
+            extracted_data["metadata"]["fallback_pages"] = [1]
             return extracted_data
         
-        except Exception as e:
-            logger.error(f"Error processing image with Claude: {str(e)}")
-            logger.error(f"File path: {image_path}")
-            raise
\ No newline at end of file
+        if parser.repairs:
+            logger.info(f"Extracted data from image: {source} after {parser.repairs} JSON repairs")
+            stats["repaired"] += 1
+        else:
+            logger.info(f"Successfully extracted data from image: {source}")
+            stats["clean"] += 1
+        return extracted_data
+    
+    @classmethod
+    def _record_timings(cls, timings: Dict[str, float]) -> None:
+        """Keep the latencies of one response for get_stats"""
+        for name, seconds in timings.items():
+            cls._latencies[name].append(seconds)
+    
+    @classmethod
+    def get_stats(cls) -> Dict[str, Any]:
+        """
+        Get parse outcome counters and latency percentiles of recent responses
+        
+        Returns:
+            Counters, repair and fallback rates of streamed JSON answers,
+            retry and fallback rates of tool extractions, and p50/p95 of the
+            time to the first token, to the first complete field and to
+            completion
+        """
+        responses = cls._stats["responses"]
+        tool_pages = cls._stats["tool_pages"]
+        stats: Dict[str, Any] = {
+            **cls._stats,
+            "repair_rate": cls._stats["repaired"] / responses if responses else 0.0,
+            "fallback_rate": cls._stats["fallbacks"] / responses if responses else 0.0,
+            "tool_retry_rate": cls._stats["tool_retries"] / tool_pages if tool_pages else 0.0,
+            "tool_fallback_rate": cls._stats["tool_fallbacks"] / tool_pages if tool_pages else 0.0,
+        }
+        for name, samples in cls._latencies.items():
+            ordered = sorted(samples)
+            stats[name] = {
+                "p50": ordered[len(ordered) // 2] if ordered else None,
+                "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] if ordered else None,
+            }
+        return stats
@@ -0,0 +1,125 @@
+"""
+Tool definition used to receive structured extractions from Claude
+
+The input schema of the tool is derived from the LabReport domain model, so
+the model is asked for exactly the fields the report is stored with. Fields
+the server fills in itself are left out, including is_normal, which
+ReportMapper decides. Dates are requested as printed on the report, and
+nothing is required beyond the sections every report has.
+"""
+import copy
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from app.models.domain.report import LabReport, TestResultValue
+
+EXTRACTION_TOOL_NAME = "record_lab_report"
+
+# Fields of the stored report that are not read from the image
+SERVER_FIELDS = {
+    "LabReport": {"_id", "abnormal_count", "schema_version", "created_at", "updated_at"},
+    "PatientInfo": {"phone_number"},
+    "ReportMetadata": {"file_type", "original_file_path", "page_count", "fallback_pages"},
+    "TestResultValue": {"is_normal"},
+}
+
+# Top-level sections the extraction must contain
+REQUIRED_SECTIONS = ["report_info", "patient_info", "test_category", "test_name", "test_results"]
+
+
+def _inline(schema: Any, definitions: Dict[str, Any], name: Optional[str] = None) -> Any:
+    """Resolve $ref entries and drop server fields, returning a plain schema"""
+    if isinstance(schema, list):
+        return [_inline(item, definitions) for item in schema]
+    if not isinstance(schema, dict):
+        return schema
+
+    if "$ref" in schema:
+        ref_name = schema["$ref"].rsplit("/", 1)[-1]
+        return _inline(definitions[ref_name], definitions, ref_name)
+
+    result = {}
+    for key, value in schema.items():
+        if key in ("title", "$defs", "default"):
+            continue
+        if key == "properties":
+            skipped = SERVER_FIELDS.get(name or schema.get("title"), set())
+            result[key] = {
+                field: _inline(field_schema, definitions)
+                for field, field_schema in value.items()
+                if field not in skipped
+            }
+        elif key == "format" and value == "date-time":
+            # Dates are parsed by ReportMapper from the text printed on the report
+            continue
+        else:
+            result[key] = _inline(value, definitions)
+
+    # Everything but the lab and patient names may be missing from a page
+    if "properties" in result:
+        result["required"] = [
+            field for field in result.get("required", [])
+            if field in result["properties"] and field in ("lab_name", "name")
+        ]
+    return result
+
+
+@lru_cache(maxsize=1)
+def report_input_schema() -> Dict[str, Any]:
+    """
+    Build the JSON schema of an extracted report
+
+    Returns:
+        Schema with every reference inlined. It is cached, so callers copy it
+        before changing it
+    """
+    schema = LabReport.model_json_schema(by_alias=True)
+    definitions = schema.get("$defs", {})
+    result = _inline(schema, definitions, "LabReport")
+
+    # test_results is free-form on the domain model; describe one parameter
+    parameter = _inline(TestResultValue.model_json_schema(), {}, "TestResultValue")
+    result["properties"]["test_results"] = {
+        "type": "object",
+        "description": (
+            "Test parameters keyed by the name printed on the report. Sections "
+            "of a panel may nest parameters one level deeper."
+        ),
+        "additionalProperties": {"anyOf": [parameter, {"type": "object", "additionalProperties": parameter}]},
+    }
+    result["required"] = list(REQUIRED_SECTIONS)
+    return result
+
+
+def extraction_tool() -> Dict[str, Any]:
+    """
+    Get the tool definition sent with extraction requests
+
+    Returns:
+        Tool with its name, description and input schema
+    """
+    return {
+        "name": EXTRACTION_TOOL_NAME,
+        "description": "Record every piece of information extracted from a lab report image.",
+        "input_schema": copy.deepcopy(report_input_schema()),
+    }
+
+
+def validate_extraction(arguments: Any) -> List[str]:
+    """
+    Check tool arguments against the parts of the schema that matter
+
+    Args:
+        arguments: Input of the tool call made by the model
+
+    Returns:
+        Problems found, empty when the arguments can be used
+    """
+    if not isinstance(arguments, dict):
+        return [f"arguments are a {type(arguments).__name__}, not an object"]
+
+    problems = [f"missing {section}" for section in REQUIRED_SECTIONS if section not in arguments]
+    for section in ("report_info", "patient_info", "test_results"):
+        if section in arguments and not isinstance(arguments[section], dict):
+            problems.append(f"{section} is not an object")
+    return problems
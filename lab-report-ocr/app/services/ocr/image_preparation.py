@@ -0,0 +1,240 @@
+import io
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Dict, Any, Optional
+
+import fitz  # PyMuPDF
+from PIL import Image, ImageOps
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Pillow format name and media type for each supported output format
+OUTPUT_FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg"),
+    "webp": ("WEBP", "image/webp"),
+    "png": ("PNG", "image/png"),
+}
+
+# DPI the PDF pages used to be rendered at, as PNG, used as the baseline for savings
+BASELINE_DPI = 300
+
+
+@dataclass
+class PreparedImage:
+    """An image encoded and ready to be sent to the vision model"""
+    data: bytes
+    media_type: str
+    width: int
+    height: int
+    # Size of what the old pipeline sent, None when it was not measured
+    baseline_bytes: Optional[int] = None
+
+    @property
+    def bytes_saved(self) -> Optional[int]:
+        """Bytes saved compared to the baseline, None when it was not measured"""
+        if self.baseline_bytes is None:
+            return None
+        return max(0, self.baseline_bytes - len(self.data))
+
+
+class ImagePreparer:
+    """
+    Shrinks page images before they are sent to Claude
+
+    PDF pages are rendered at a DPI chosen from the page size so the long edge
+    lands on the target size, uploaded images are downscaled to the same size.
+    Both are optionally converted to grayscale and encoded as JPEG or WebP.
+
+    Savings are measured against what was sent before: the upload itself for
+    images, and a 300 DPI PNG render for PDF pages. Rendering that baseline
+    costs as much as the old pipeline did, so for PDF pages it is only done
+    when measure_pdf_baseline is set.
+    """
+
+    def __init__(
+        self,
+        max_long_edge: int = settings.OCR_IMAGE_MAX_LONG_EDGE,
+        min_dpi: int = settings.OCR_PDF_MIN_DPI,
+        max_dpi: int = settings.OCR_PDF_MAX_DPI,
+        grayscale: bool = settings.OCR_IMAGE_GRAYSCALE,
+        image_format: str = settings.OCR_IMAGE_FORMAT,
+        quality: int = settings.OCR_IMAGE_QUALITY,
+        measure_pdf_baseline: bool = settings.OCR_MEASURE_PDF_BASELINE,
+    ):
+        """
+        Initialize the preparer
+
+        Args:
+            max_long_edge: Target size in pixels of the longest image edge
+            min_dpi: Lowest DPI a PDF page is rendered at
+            max_dpi: Highest DPI a PDF page is rendered at
+            grayscale: Whether to drop colour information
+            image_format: Output format (jpeg, webp or png)
+            quality: Encoder quality for lossy formats
+            measure_pdf_baseline: Whether to also render PDF pages the old way
+                to measure the bytes saved
+        """
+        if image_format.lower() not in OUTPUT_FORMATS:
+            raise ValueError(f"Unsupported image format: {image_format}")
+
+        self.max_long_edge = max_long_edge
+        self.min_dpi = min_dpi
+        self.max_dpi = max_dpi
+        self.grayscale = grayscale
+        self.image_format = image_format.lower()
+        self.quality = quality
+        self.measure_pdf_baseline = measure_pdf_baseline
+        # Images are prepared in worker threads
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "images": 0,
+            "prepared_bytes": 0,
+            "measured_images": 0,
+            "measured_baseline_bytes": 0,
+            "measured_prepared_bytes": 0,
+        }
+
+    @property
+    def cache_variant(self) -> str:
+        """Identifier of the preparation settings, part of the OCR cache key"""
+        color = "gray" if self.grayscale else "rgb"
+        return f"{self.image_format}-{self.quality}-{color}-{self.max_long_edge}"
+
+    @property
+    def media_type(self) -> str:
+        """Media type of the prepared images"""
+        return OUTPUT_FORMATS[self.image_format][1]
+
+    def choose_dpi(self, page: fitz.Page) -> int:
+        """
+        Pick the DPI that renders a page's long edge at the target size
+
+        Args:
+            page: PDF page
+
+        Returns:
+            DPI clamped to the configured range
+        """
+        long_edge_points = max(page.rect.width, page.rect.height) or 1
+        dpi = int(self.max_long_edge * 72 / long_edge_points)
+        return max(self.min_dpi, min(self.max_dpi, dpi))
+
+    def prepare_pdf_page(self, page: fitz.Page) -> PreparedImage:
+        """
+        Render and encode a PDF page
+
+        Args:
+            page: PDF page
+
+        Returns:
+            Prepared page image
+        """
+        dpi = self.choose_dpi(page)
+        colorspace = fitz.csGRAY if self.grayscale else fitz.csRGB
+        pix = page.get_pixmap(matrix=fitz.Matrix(dpi / 72, dpi / 72), colorspace=colorspace, alpha=False)
+        mode = "L" if self.grayscale else "RGB"
+        image = Image.frombytes(mode, (pix.width, pix.height), pix.samples)
+
+        baseline_bytes = None
+        if self.measure_pdf_baseline:
+            # The old pipeline sent a PNG of the page rendered at 300 DPI
+            scale = BASELINE_DPI / 72
+            baseline = page.get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False)
+            baseline_bytes = len(baseline.tobytes("png"))
+
+        prepared = self._encode(image, baseline_bytes)
+        self._record(prepared.baseline_bytes, len(prepared.data))
+        saved = f", {prepared.bytes_saved} bytes saved" if prepared.bytes_saved is not None else ""
+        logger.info(
+            f"Prepared page {page.number + 1} at {dpi} DPI: {prepared.width}x{prepared.height} "
+            f"{self.image_format}, {len(prepared.data)} bytes{saved}"
+        )
+        return prepared
+
+    def prepare_image_bytes(self, image_bytes: bytes) -> Optional[PreparedImage]:
+        """
+        Downscale and re-encode an uploaded image
+
+        Args:
+            image_bytes: Raw bytes of the uploaded image
+
+        Returns:
+            Prepared image, or None if the upload is already smaller than the
+            re-encoded version or cannot be decoded
+        """
+        try:
+            with Image.open(io.BytesIO(image_bytes)) as opened:
+                image = ImageOps.exif_transpose(opened)
+                image.load()
+        except Exception as e:
+            logger.warning(f"Could not decode image for preparation: {str(e)}")
+            self._record(len(image_bytes), len(image_bytes))
+            return None
+
+        if max(image.size) > self.max_long_edge:
+            image.thumbnail((self.max_long_edge, self.max_long_edge), Image.LANCZOS)
+
+        if self.grayscale:
+            image = image.convert("L")
+        elif image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        prepared = self._encode(image, len(image_bytes))
+        if len(prepared.data) >= len(image_bytes):
+            self._record(len(image_bytes), len(image_bytes))
+            return None
+        self._record(prepared.baseline_bytes, len(prepared.data))
+
+        logger.info(
+            f"Prepared image: {prepared.width}x{prepared.height} {self.image_format}, "
+            f"{len(prepared.data)} bytes, {prepared.bytes_saved} bytes saved"
+        )
+        return prepared
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get totals over every prepared image
+
+        Returns:
+            Image count and prepared bytes, and the baseline bytes, prepared
+            bytes and bytes saved of the images whose baseline was measured
+        """
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["bytes_saved"] = max(0, stats["measured_baseline_bytes"] - stats["measured_prepared_bytes"])
+        return stats
+
+    def _encode(self, image: Image.Image, baseline_bytes: Optional[int]) -> PreparedImage:
+        """Encode an image in the configured format"""
+        pil_format, media_type = OUTPUT_FORMATS[self.image_format]
+        options = {"optimize": True}
+        if self.image_format in ("jpeg", "webp"):
+            options["quality"] = self.quality
+
+        buffer = io.BytesIO()
+        image.save(buffer, format=pil_format, **options)
+
+        return PreparedImage(
+            data=buffer.getvalue(),
+            media_type=media_type,
+            width=image.width,
+            height=image.height,
+            baseline_bytes=baseline_bytes,
+        )
+
+    def _record(self, baseline_bytes: Optional[int], prepared_bytes: int) -> None:
+        """Add an image to the running totals"""
+        with self._stats_lock:
+            self.stats["images"] += 1
+            self.stats["prepared_bytes"] += prepared_bytes
+            if baseline_bytes is not None:
+                self.stats["measured_images"] += 1
+                self.stats["measured_baseline_bytes"] += baseline_bytes
+                self.stats["measured_prepared_bytes"] += prepared_bytes
+
+
+# Shared preparer used by the image and PDF processors
+image_preparer = ImagePreparer()
@@ -1,12 +1,14 @@
+import asyncio
 import logging
 import os
-import uuid
 from typing import Dict, Any, Optional
 
 from fastapi import UploadFile
 
 from app.core.config import settings
-from app.services.ocr.claude_service import ClaudeOCRService
+from app.services.ocr.cache import OCRResultCache, ocr_cache
+from app.services.ocr.backend import OCRBackend, create_ocr_backend
+from app.services.ocr.image_preparation import image_preparer
 from app.services.report_parser.report_mapper import ReportMapper
 
 logger = logging.getLogger(__name__)
@@ -16,7 +18,7 @@ class ImageProcessor:
     
     def __init__(self):
         """Initialize the image processor"""
-        self.claude_service = ClaudeOCRService()
+        self.ocr_backend = create_ocr_backend()
     
     async def process_image_file(self, file: UploadFile, phone_number: str) -> Dict[str, Any]:
         """
@@ -26,40 +28,64 @@ class ImageProcessor:
             file: The uploaded image file
             phone_number: The user's phone number
         
+        Returns:
+            Extracted and standardized report data
+        """
+        content = await file.read()
+        return await self.process_image_content(content, file.filename, phone_number)
+    
+    async def process_image_content(self, content: bytes, filename: str, phone_number: str) -> Dict[str, Any]:
+        """
+        Process the raw bytes of an image and extract lab report data
+        
+        Args:
+            content: Raw bytes of the image
+            filename: Original file name
+            phone_number: The user's phone number
+        
         Returns:
             Extracted and standardized report data
         """
         try:
-            # Create a temporary file path
-            temp_file_path = os.path.join(settings.TEMP_FILE_PATH, f"{uuid.uuid4()}{os.path.splitext(file.filename)[1]}")
-            
-            # Save the uploaded file
-            with open(temp_file_path, "wb") as temp_file:
-                content = await file.read()
-                temp_file.write(content)
+            # Return a cached extraction if this exact file was processed before
+            cache_key = OCRResultCache.build_key(
+                content,
+                self.ocr_backend.model,
+                self.ocr_backend.prompt_version,
+                f"image:{image_preparer.cache_variant}"
+            )
+            extracted_data = await ocr_cache.get(cache_key)
             
-            logger.info(f"Saved uploaded image to {temp_file_path}")
-            
-            try:
-                # Extract data using Claude
-                extracted_data = await self.claude_service.process_image(temp_file_path)
+            if extracted_data is not None:
+                logger.info(f"Using cached extraction for image {filename}")
+            else:
+                # Downscale and re-encode off the event loop, keeping the
+                # original bytes when they are already smaller
+                prepared = await asyncio.to_thread(image_preparer.prepare_image_bytes, content)
+                if prepared is not None:
+                    image_bytes, media_type = prepared.data, prepared.media_type
+                else:
+                    image_bytes = content
+                    media_type = OCRBackend.detect_media_type(content, filename)
                 
-                # Map to standard format
-                standardized_data = ReportMapper.map_to_standard_format(
-                    extracted_data, 
-                    "Image", 
-                    os.path.basename(file.filename), 
-                    phone_number
+                # Extract data using Claude straight from the image bytes
+                extracted_data = await self.ocr_backend.process_image_bytes(
+                    image_bytes,
+                    media_type,
+                    source=filename or "upload"
                 )
-                
-                return standardized_data
+                await ocr_cache.set(cache_key, extracted_data)
+            
+            # Map to standard format
+            standardized_data = ReportMapper.map_to_standard_format(
+                extracted_data, 
+                "Image", 
+                os.path.basename(filename or ""), 
+                phone_number
+            )
             
-            finally:
-                # Clean up the temporary file
-                if os.path.exists(temp_file_path):
-                    os.remove(temp_file_path)
-                    logger.info(f"Removed temporary file {temp_file_path}")
+            return standardized_data
         
         except Exception as e:
             logger.error(f"Error processing image file: {str(e)}")
-            raise
\ No newline at end of file
+            raise
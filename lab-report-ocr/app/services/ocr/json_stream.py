@@ -0,0 +1,364 @@
+"""
+Incremental, error-tolerant JSON parsing of model output
+
+The model streams its answer token by token. StreamingJSONParser consumes the
+chunks as they arrive and rewrites them into valid JSON in a single pass over
+the text, so every character is looked at once no matter how broken the
+output is. Top-level fields of the answer object are decoded as soon as their
+value closes, which makes report_info and patient_info usable while the test
+results are still being generated.
+
+Repairs made on the way:
+    - text before the first "{" or "[" and after the closing bracket
+      (explanations, markdown code fences) is dropped
+    - trailing and doubled commas are dropped, missing commas are inserted
+    - bare keys are quoted, single-quoted strings become double-quoted
+    - raw newlines and tabs inside strings are escaped
+    - True, False, None, NaN and undefined become true, false and null,
+      other unquoted values become strings
+    - on truncated output, the open string is closed, a dangling key gets a
+      null value and open objects and arrays are closed
+"""
+import json
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+_NUMBER = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?")
+
+# JSON spelling of bare words the model sometimes writes Python style
+_LITERALS = {
+    "true": "true",
+    "True": "true",
+    "TRUE": "true",
+    "false": "false",
+    "False": "false",
+    "FALSE": "false",
+    "null": "null",
+    "None": "null",
+    "NULL": "null",
+    "NaN": "null",
+    "undefined": "null",
+}
+
+_ESCAPES = {'"', "\\", "/", "b", "f", "n", "r", "t", "u"}
+_CONTROL_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+_BARE_CHARS = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_-+.")
+# Characters that end an unquoted value, which may contain spaces
+_BARE_VALUE_STOPS = frozenset(',:{}[]"\n')
+_CLOSERS = {"{": "}", "[": "]"}
+
+# What the parser expects next inside the current container
+_KEY = "key"
+_COLON = "colon"
+_VALUE = "value"
+_AFTER_VALUE = "after_value"
+
+
+class StreamingJSONParser:
+    """
+    Single-pass JSON repairer fed with chunks of model output
+
+    Usage:
+        parser = StreamingJSONParser(on_field=callback)
+        for chunk in chunks:
+            parser.feed(chunk)
+        data = parser.result()
+    """
+
+    def __init__(self, on_field: Optional[Callable[[str, Any], None]] = None):
+        """
+        Initialize the parser
+
+        Args:
+            on_field: Called with the key and decoded value of each top-level
+                field of the answer object as soon as the value is complete
+        """
+        self.on_field = on_field
+        self.fields: Dict[str, Any] = {}
+        self.repairs = 0
+
+        self._out: List[str] = []
+        self._stack: List[str] = []
+        self._expect = _VALUE
+        self._started = False
+        self._done = False
+        self._pending_comma = False
+
+        self._in_string = False
+        self._quote = '"'
+        self._escape = False
+        self._string_is_key = False
+        self._key_chars: List[str] = []
+
+        self._bare: List[str] = []
+        self._bare_is_value = False
+
+        self._field_key: Optional[str] = None
+        self._field_start = 0
+        self._finished: Optional[str] = None
+
+    def feed(self, chunk: str) -> None:
+        """
+        Consume the next chunk of model output
+
+        Args:
+            chunk: Text as streamed by the model
+        """
+        for char in chunk:
+            if self._done:
+                return
+            if not self._started:
+                if char in _CLOSERS:
+                    self._open(char)
+                continue
+            if self._in_string:
+                self._string_char(char)
+            else:
+                self._structural_char(char)
+
+    def finish(self) -> str:
+        """
+        Close whatever the output left open
+
+        Returns:
+            The repaired JSON text, empty if no JSON was found
+        """
+        if self._finished is not None:
+            return self._finished
+        if not self._started:
+            self._finished = ""
+            return self._finished
+
+        if self._in_string:
+            self.repairs += 1
+            self._escape = False
+            self._close_string()
+        self._flush_bare()
+
+        while self._stack:
+            self._close(_CLOSERS[self._stack[-1]], truncated=True)
+
+        self._finished = "".join(self._out)
+        return self._finished
+
+    def result(self) -> Any:
+        """
+        Decode the repaired output
+
+        Returns:
+            The decoded value
+
+        Raises:
+            ValueError: If the output holds no JSON or cannot be repaired
+        """
+        text = self.finish()
+        if not text:
+            raise ValueError("No JSON object found in the model output")
+        return json.loads(text)
+
+    # Characters inside strings
+
+    def _string_char(self, char: str) -> None:
+        if self._escape:
+            self._escape = False
+            if char == "'" and self._quote == "'":
+                self._emit_string_char("'")
+            elif char in _ESCAPES:
+                self._emit_string_char("\\" + char, char)
+            else:
+                # Invalid escape: keep the backslash as a literal character
+                self.repairs += 1
+                self._emit_string_char("\\\\", "\\")
+                self._string_char(char)
+            return
+
+        if char == "\\":
+            self._escape = True
+        elif char == self._quote:
+            self._close_string()
+        elif char == '"':
+            # Double quote inside a single-quoted string
+            self._emit_string_char('\\"', char)
+        elif char in _CONTROL_ESCAPES:
+            self.repairs += 1
+            self._emit_string_char(_CONTROL_ESCAPES[char], char)
+        elif char < " ":
+            self.repairs += 1
+        else:
+            self._emit_string_char(char)
+
+    def _emit_string_char(self, text: str, raw: Optional[str] = None) -> None:
+        self._out.append(text)
+        if self._string_is_key:
+            self._key_chars.append(raw if raw is not None else text)
+
+    def _open_string(self, quote: str) -> None:
+        if quote == "'":
+            self.repairs += 1
+        self._string_is_key = self._begin_token()
+        self._key_chars = []
+        self._in_string = True
+        self._quote = quote
+        self._out.append('"')
+
+    def _close_string(self) -> None:
+        self._in_string = False
+        self._out.append('"')
+        if self._string_is_key:
+            self._end_key("".join(self._key_chars))
+        else:
+            self._end_value()
+
+    # Characters outside strings
+
+    def _structural_char(self, char: str) -> None:
+        if self._bare:
+            if char in _BARE_CHARS or (self._bare_is_value and char not in _BARE_VALUE_STOPS):
+                self._bare.append(char)
+                return
+            self._flush_bare()
+
+        if char in " \t\r\n":
+            return
+        if char == '"' or char == "'":
+            self._open_string(char)
+        elif char in _CLOSERS:
+            self._open(char)
+        elif char == "}" or char == "]":
+            self._close(char)
+        elif char == ":":
+            if self._expect == _COLON:
+                self._out.append(":")
+                self._expect = _VALUE
+            else:
+                self.repairs += 1
+        elif char == ",":
+            if self._expect == _AFTER_VALUE:
+                self._pending_comma = True
+                self._expect = _KEY if self._stack[-1] == "{" else _VALUE
+            else:
+                self.repairs += 1
+        elif char in _BARE_CHARS:
+            self._bare_is_value = self._expect == _VALUE
+            self._bare.append(char)
+        else:
+            # Stray characters such as code fence backticks
+            self.repairs += 1
+
+    def _flush_bare(self) -> None:
+        if not self._bare:
+            return
+        token = "".join(self._bare).rstrip()
+        self._bare = []
+
+        if self._begin_token():
+            self.repairs += 1
+            self._out.append(json.dumps(token))
+            self._end_key(token)
+            return
+
+        if token in _LITERALS:
+            literal = _LITERALS[token]
+            if literal != token:
+                self.repairs += 1
+            self._out.append(literal)
+        elif _NUMBER.fullmatch(token):
+            self._out.append(token)
+        else:
+            self.repairs += 1
+            self._out.append(json.dumps(token))
+        self._end_value()
+
+    # Containers and tokens
+
+    def _begin_token(self) -> bool:
+        """
+        Prepare the output for a key or value starting here
+
+        Returns:
+            Whether the token is an object key
+        """
+        if self._expect == _AFTER_VALUE:
+            # Missing comma between two members
+            self.repairs += 1
+            self._pending_comma = True
+            self._expect = _KEY if self._stack[-1] == "{" else _VALUE
+        elif self._expect == _COLON:
+            # Missing colon after a key
+            self.repairs += 1
+            self._out.append(":")
+            self._expect = _VALUE
+
+        if self._pending_comma:
+            self._out.append(",")
+            self._pending_comma = False
+
+        if self._expect == _KEY:
+            return True
+
+        if self._at_field_level():
+            self._field_start = len(self._out)
+        return False
+
+    def _open(self, char: str) -> None:
+        if self._started:
+            if self._begin_token():
+                # A container where a key was expected: give it an empty key
+                self.repairs += 1
+                self._out.append('"":')
+                self._end_key("")
+                self._expect = _VALUE
+                if self._at_field_level():
+                    self._field_start = len(self._out)
+        self._started = True
+        self._stack.append(char)
+        self._out.append(char)
+        self._expect = _KEY if char == "{" else _VALUE
+
+    def _close(self, char: str, truncated: bool = False) -> None:
+        if not self._stack:
+            return
+        if self._pending_comma:
+            self.repairs += 1
+            self._pending_comma = False
+        self._flush_bare()
+
+        if self._expect == _COLON or (self._expect == _VALUE and self._stack[-1] == "{"):
+            # Key without a value: _begin_token adds a missing colon
+            self.repairs += 1
+            self._begin_token()
+            self._out.append("null")
+            self._end_value()
+
+        expected = _CLOSERS[self._stack.pop()]
+        if char != expected or truncated:
+            self.repairs += 1
+        self._out.append(expected)
+
+        if self._stack:
+            self._end_value()
+        else:
+            self._done = True
+
+    def _end_key(self, key: str) -> None:
+        if len(self._stack) == 1:
+            self._field_key = key
+        self._expect = _COLON
+
+    def _end_value(self) -> None:
+        self._expect = _AFTER_VALUE
+        if self._at_field_level():
+            self._complete_field()
+
+    def _at_field_level(self) -> bool:
+        return len(self._stack) == 1 and self._stack[0] == "{" and self._field_key is not None
+
+    def _complete_field(self) -> None:
+        key = self._field_key
+        try:
+            value = json.loads("".join(self._out[self._field_start:]))
+        except ValueError:
+            return
+        self.fields[key] = value
+        if self.on_field is not None:
+            self.on_field(key, value)
@@ -0,0 +1,208 @@
+import asyncio
+import copy
+import glob
+import hashlib
+import json
+import logging
+import os
+import random
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.config import settings
+from app.services.ocr.backend import OCRBackend
+
+logger = logging.getLogger(__name__)
+
+# Latency distributions understood by OCR_LOCAL_LATENCY_DISTRIBUTION
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+
+# Image digests whose call counts are remembered, least recently seen dropped first
+MAX_TRACKED_IMAGES = 4096
+
+# Extraction returned when no fixture directory is configured
+DEFAULT_FIXTURE: Dict[str, Any] = {
+    "report_info": {
+        "lab_name": "Local Diagnostic Laboratory",
+        "lab_registration_number": "LOCAL-0001",
+        "lab_contact": {"phone": "", "email": "", "website": "", "address": ""},
+        "lab_signatories": [{"name": "Dr. Local Pathologist", "qualification": "MD", "designation": "Consultant"}],
+        "instruments": "",
+    },
+    "patient_info": {
+        "name": "Local Test Patient",
+        "age": 42,
+        "gender": "F",
+        "patient_id": "",
+        "referred_by": "",
+        "registration_number": "",
+    },
+    "collection_info": {
+        "registered_on": "01/01/2024 09:00",
+        "collected_on": "01/01/2024 09:30",
+        "received_on": "01/01/2024 10:00",
+        "reported_on": "01/01/2024 14:00",
+    },
+    "test_category": "HAEMATOLOGY",
+    "test_name": "COMPLETE BLOOD COUNT",
+    "test_results": {
+        "Haemoglobin": {"value": 11.2, "unit": "g/dL", "reference_range": "12.0 - 15.0", "flag": "L"},
+        "Total Leukocyte Count": {"value": 7800, "unit": "cells/cumm", "reference_range": "4000 - 11000", "flag": None},
+        "Platelet Count": {"value": 2.5, "unit": "lakhs/cumm", "reference_range": "1.5 - 4.1", "flag": None},
+        "RBC Count": {"value": 4.1, "unit": "million/cumm", "reference_range": "3.8 - 4.8", "flag": None},
+        "PCV": {"value": 35.0, "unit": "%", "reference_range": "36 - 46", "flag": "L"},
+    },
+    "clinical_notes": {"notes": "", "possible_causes": {}},
+    "metadata": {"page_info": "Page 1 of 1", "disclaimer": "", "work_timings": ""},
+}
+
+
+class SimulatedOCRError(RuntimeError):
+    """Failure injected by the local OCR backend"""
+
+
+class LocalOCRBackend(OCRBackend):
+    """
+    Deterministic stand-in for the Claude OCR service
+
+    Returns canned extractions, either DEFAULT_FIXTURE or the JSON files in
+    OCR_LOCAL_FIXTURES_DIR, after a simulated model latency, and fails a
+    configurable share of the calls. Latency, failure and fixture are drawn
+    from a generator seeded with OCR_LOCAL_SEED, the image digest and how many
+    times that image was seen before. Runs are reproducible regardless of the
+    order in which concurrent calls complete, while repeated uploads of the
+    same image still sample the configured latency and failure rate.
+    """
+
+    model = "local"
+
+    # Concurrency limit shared by every instance, like the Claude client's
+    _semaphore: Optional[asyncio.Semaphore] = None
+    _fixtures: Optional[List[Dict[str, Any]]] = None
+    # Calls made so far for the most recently seen image digests
+    _occurrences: "OrderedDict[str, int]" = OrderedDict()
+
+    _stats: Dict[str, int] = {
+        "calls": 0,
+        "failures": 0,
+    }
+
+    def __init__(self):
+        """Initialize the backend, loading fixtures on first use"""
+        if LocalOCRBackend._semaphore is None:
+            LocalOCRBackend._semaphore = asyncio.Semaphore(max(1, settings.OCR_MAX_CONCURRENCY))
+        if LocalOCRBackend._fixtures is None:
+            LocalOCRBackend._fixtures = self._load_fixtures(settings.OCR_LOCAL_FIXTURES_DIR)
+
+        self.distribution = settings.OCR_LOCAL_LATENCY_DISTRIBUTION.lower()
+        if self.distribution not in LATENCY_DISTRIBUTIONS:
+            logger.warning(f"Unknown latency distribution '{settings.OCR_LOCAL_LATENCY_DISTRIBUTION}'. Falling back to fixed")
+            self.distribution = "fixed"
+
+    @property
+    def prompt_version(self) -> str:
+        """Fixture set in use, so cached extractions follow fixture changes"""
+        return f"local:{settings.OCR_LOCAL_FIXTURES_DIR or 'default'}"
+
+    @staticmethod
+    def _load_fixtures(fixtures_dir: Optional[str]) -> List[Dict[str, Any]]:
+        """
+        Load the extractions returned by the backend
+
+        Args:
+            fixtures_dir: Directory of JSON files, each holding one extraction
+
+        Returns:
+            Fixtures in file name order, or DEFAULT_FIXTURE alone
+        """
+        if not fixtures_dir:
+            return [DEFAULT_FIXTURE]
+
+        fixtures = []
+        for path in sorted(glob.glob(os.path.join(fixtures_dir, "*.json"))):
+            with open(path, "r", encoding="utf-8") as fixture_file:
+                fixtures.append(json.load(fixture_file))
+
+        if not fixtures:
+            logger.warning(f"No fixtures found in {fixtures_dir}, using the default fixture")
+            return [DEFAULT_FIXTURE]
+
+        logger.info(f"Loaded {len(fixtures)} OCR fixtures from {fixtures_dir}")
+        return fixtures
+
+    def _latency_seconds(self, rng: random.Random) -> float:
+        """Draw a simulated model latency"""
+        mean = max(0.0, settings.OCR_LOCAL_LATENCY_MS) / 1000
+        spread = max(0.0, settings.OCR_LOCAL_LATENCY_SPREAD)
+
+        if self.distribution == "uniform":
+            return rng.uniform(mean * (1 - spread), mean * (1 + spread)) if mean else 0.0
+        if self.distribution == "lognormal":
+            # Median of mean with a long right tail, like real model latency
+            return mean * rng.lognormvariate(0, spread) if mean else 0.0
+        return mean
+
+    async def process_image_bytes(
+        self,
+        image_bytes: bytes,
+        media_type: str,
+        source: str = "upload",
+        on_field: Optional[Callable[[str, Any], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Return a canned extraction after a simulated delay
+
+        Args:
+            image_bytes: Encoded image bytes, only used to seed the draws
+            media_type: Media type of the image
+            source: Name of the image used in log messages
+            on_field: Optional callback receiving each top-level field
+
+        Returns:
+            A copy of the selected fixture
+
+        Raises:
+            SimulatedOCRError: For the configured share of calls
+        """
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        occurrences = LocalOCRBackend._occurrences
+        occurrence = occurrences.pop(digest, 0)
+        occurrences[digest] = occurrence + 1
+        if len(occurrences) > MAX_TRACKED_IMAGES:
+            occurrences.popitem(last=False)
+        rng = random.Random(f"{settings.OCR_LOCAL_SEED}:{digest}:{occurrence}")
+        latency = self._latency_seconds(rng)
+        fails = rng.random() < settings.OCR_LOCAL_FAILURE_RATE
+        fixture = self._fixtures[rng.randrange(len(self._fixtures))]
+
+        stats = LocalOCRBackend._stats
+        stats["calls"] += 1
+
+        async with self._semaphore:
+            if latency:
+                await asyncio.sleep(latency)
+
+        if fails:
+            stats["failures"] += 1
+            raise SimulatedOCRError(f"Simulated OCR failure for {source}")
+
+        logger.debug(f"Local OCR extraction for {source} after {latency:.3f}s")
+        extracted_data = copy.deepcopy(fixture)
+        if on_field is not None:
+            for key, value in extracted_data.items():
+                on_field(key, value)
+        return extracted_data
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, Any]:
+        """
+        Get call and injected failure counters
+
+        Returns:
+            Counters and the observed failure rate
+        """
+        calls = cls._stats["calls"]
+        return {
+            **cls._stats,
+            "failure_rate": cls._stats["failures"] / calls if calls else 0.0,
+        }
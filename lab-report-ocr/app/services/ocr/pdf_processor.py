@@ -1,26 +1,30 @@
+import asyncio
+import hashlib
 import logging
 import os
 import uuid
-import tempfile
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple, Union
 import fitz  # PyMuPDF
-from PIL import Image
-import io
 
 from fastapi import UploadFile
 
 from app.core.config import settings
-from app.services.ocr.claude_service import ClaudeOCRService
+from app.services.ocr.cache import OCRResultCache, ocr_cache
+from app.services.ocr.backend import create_ocr_backend
+from app.services.ocr.image_preparation import PreparedImage, image_preparer
 from app.services.report_parser.report_mapper import ReportMapper
 
 logger = logging.getLogger(__name__)
 
+# Chunk size used when spooling large uploads to disk
+SPOOL_CHUNK_SIZE = 1024 * 1024
+
 class PDFProcessor:
     """Processes PDF files for OCR by converting to images"""
     
     def __init__(self):
         """Initialize the PDF processor"""
-        self.claude_service = ClaudeOCRService()
+        self.ocr_backend = create_ocr_backend()
     
     async def process_pdf_file(self, file: UploadFile, phone_number: str) -> Dict[str, Any]:
         """
@@ -33,99 +37,188 @@ class PDFProcessor:
         Returns:
             Extracted and standardized report data
         """
+        spooled_path = None
         try:
-            # Create a temporary file path for the PDF
-            temp_pdf_path = os.path.join(settings.TEMP_FILE_PATH, f"{uuid.uuid4()}.pdf")
+            if file.size is not None and file.size > settings.UPLOAD_SPOOL_THRESHOLD_BYTES:
+                # Large uploads are spooled to disk instead of being held in memory
+                spooled_path, digest = await self._spool_upload(file)
+                return await self._process_source(spooled_path, digest, file.filename, phone_number)
             
-            # Save the uploaded file
-            with open(temp_pdf_path, "wb") as temp_file:
-                content = await file.read()
-                temp_file.write(content)
+            content = await file.read()
+            return await self.process_pdf_content(content, file.filename, phone_number)
+        
+        finally:
+            if spooled_path and os.path.exists(spooled_path):
+                os.remove(spooled_path)
+                logger.info(f"Removed spooled PDF file {spooled_path}")
+    
+    async def process_pdf_content(self, content: bytes, filename: str, phone_number: str) -> Dict[str, Any]:
+        """
+        Process the raw bytes of a PDF and extract lab report data
+        
+        Args:
+            content: Raw bytes of the PDF
+            filename: Original file name
+            phone_number: The user's phone number
+        
+        Returns:
+            Extracted and standardized report data
+        """
+        digest = hashlib.sha256(content).hexdigest()
+        return await self._process_source(content, digest, filename, phone_number)
+    
+    async def _process_source(
+        self,
+        source: Union[bytes, str],
+        digest: str,
+        filename: str,
+        phone_number: str
+    ) -> Dict[str, Any]:
+        """
+        Extract lab report data from a PDF held in memory or spooled to disk
+        
+        Args:
+            source: Raw bytes of the PDF file, or the path it was spooled to
+            digest: SHA-256 hex digest of the PDF bytes
+            filename: Original file name
+            phone_number: The user's phone number
+        
+        Returns:
+            Extracted and standardized report data
+        """
+        try:
+            # Return a cached extraction if this exact file was processed before
+            cache_key = OCRResultCache.build_key_from_digest(
+                digest,
+                self.ocr_backend.model,
+                self.ocr_backend.prompt_version,
+                f"pdf:{'all' if settings.PDF_PROCESS_ALL_PAGES else 'first'}:{image_preparer.cache_variant}"
+            )
+            extracted_data = await ocr_cache.get(cache_key)
             
-            logger.info(f"Saved uploaded PDF to {temp_pdf_path}")
+            if extracted_data is not None:
+                logger.info(f"Using cached extraction for PDF {filename}")
+            else:
+                extracted_data = await self._extract_pdf(source)
+                await ocr_cache.set(cache_key, extracted_data)
             
-            try:
-                # Convert PDF to images
-                image_paths = self._convert_pdf_to_images(temp_pdf_path)
-                logger.info(f"Converted PDF to {len(image_paths)} images")
-                
-                # Process the first page for now
-                # In a more complex implementation, we might process all pages and merge the results
-                if image_paths:
-                    # Extract data using Claude on the first page
-                    extracted_data = await self.claude_service.process_image(image_paths[0])
-                    
-                    # Map to standard format
-                    standardized_data = ReportMapper.map_to_standard_format(
-                        extracted_data,
-                        "PDF",
-                        os.path.basename(file.filename),
-                        phone_number
-                    )
-                    
-                    return standardized_data
-                else:
-                    raise ValueError("Failed to convert PDF to images")
+            # Map to standard format
+            standardized_data = ReportMapper.map_to_standard_format(
+                extracted_data,
+                "PDF",
+                os.path.basename(filename or ""),
+                phone_number
+            )
             
-            finally:
-                # Clean up the temporary files
-                if os.path.exists(temp_pdf_path):
-                    os.remove(temp_pdf_path)
-                    logger.info(f"Removed temporary PDF file {temp_pdf_path}")
-                
-                # Remove temporary image files
-                for img_path in image_paths:
-                    if os.path.exists(img_path):
-                        os.remove(img_path)
-                        logger.info(f"Removed temporary image file {img_path}")
+            return standardized_data
         
         except Exception as e:
             logger.error(f"Error processing PDF file: {str(e)}")
             raise
     
-    def _convert_pdf_to_images(self, pdf_path: str, dpi: int = 300) -> List[str]:
+    async def _spool_upload(self, file: UploadFile) -> Tuple[str, str]:
         """
-        Convert PDF to images
+        Copy an upload to a temporary file in chunks, hashing it on the way
         
         Args:
-            pdf_path: Path to the PDF file
-            dpi: DPI for the output images
+            file: The uploaded PDF file
         
         Returns:
-            List of paths to the created image files
+            Path to the spooled file and the SHA-256 hex digest of its content
         """
-        image_paths = []
+        spooled_path = os.path.join(settings.TEMP_FILE_PATH, f"{uuid.uuid4()}.pdf")
+        digest = hashlib.sha256()
         
         try:
-            # Open the PDF
-            pdf_document = fitz.open(pdf_path)
-            
-            # Process each page
-            for page_number in range(len(pdf_document)):
-                # Get the page
-                page = pdf_document.load_page(page_number)
-                
-                # Convert page to a pixmap (image)
-                pix = page.get_pixmap(matrix=fitz.Matrix(dpi/72, dpi/72))
-                
-                # Create a file path for the image
-                image_path = os.path.join(
-                    settings.TEMP_FILE_PATH, 
-                    f"{uuid.uuid4()}_page_{page_number + 1}.png"
+            with open(spooled_path, "wb") as spooled_file:
+                while chunk := await file.read(SPOOL_CHUNK_SIZE):
+                    digest.update(chunk)
+                    spooled_file.write(chunk)
+        except Exception:
+            if os.path.exists(spooled_path):
+                os.remove(spooled_path)
+            raise
+        
+        logger.info(f"Spooled uploaded PDF ({file.size} bytes) to {spooled_path}")
+        return spooled_path, digest.hexdigest()
+    
+    async def _extract_pdf(self, source: Union[bytes, str]) -> Dict[str, Any]:
+        """
+        Rasterize a PDF and extract lab report data from its pages
+        
+        Args:
+            source: Raw bytes of the PDF file, or the path it was spooled to
+        
+        Returns:
+            Extracted report data
+        """
+        # Rendering is CPU bound, keep it off the event loop
+        page_images = await asyncio.to_thread(self._render_pages, source)
+        logger.info(
+            f"Rendered PDF to {len(page_images)} page images, "
+            f"{sum(len(image.data) for image in page_images)} bytes"
+        )
+        
+        if not page_images:
+            raise ValueError("Failed to convert PDF to images")
+        
+        if settings.PDF_PROCESS_ALL_PAGES:
+            # Extract every page concurrently and merge the results
+            page_results = await self._process_pages(page_images)
+            return ReportMapper.merge_page_results(page_results)
+        
+        # Extract data using Claude on the first page only
+        first_page = page_images[0]
+        return await self.ocr_backend.process_image_bytes(first_page.data, first_page.media_type, source="page 1")
+    
+    async def _process_pages(self, page_images: List[PreparedImage]) -> List[Dict[str, Any]]:
+        """
+        Extract data from all pages concurrently
+        
+        At most PDF_PAGE_CONCURRENCY pages are sent to Claude at the same time,
+        so the latency of a report is close to that of its slowest page.
+        
+        Args:
+            page_images: Prepared page images, in page order
+        
+        Returns:
+            Extracted data for each page, in page order
+        """
+        semaphore = asyncio.Semaphore(max(1, settings.PDF_PAGE_CONCURRENCY))
+        
+        async def process_page(page_number: int, image: PreparedImage) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.ocr_backend.process_image_bytes(
+                    image.data, image.media_type, source=f"page {page_number}"
                 )
-                
-                # Save the pixmap as an image
-                pix.save(image_path)
-                
-                # Add the image path to the list
-                image_paths.append(image_path)
+        
+        return await asyncio.gather(
+            *(process_page(number, image) for number, image in enumerate(page_images, start=1))
+        )
+    
+    def _render_pages(self, source: Union[bytes, str]) -> List[PreparedImage]:
+        """
+        Render every page of a PDF to compressed images in memory
+        
+        Args:
+            source: Raw bytes of the PDF file, or a path to it
+        
+        Returns:
+            Prepared image for each page, in page order
+        """
+        try:
+            # Open the PDF
+            if isinstance(source, str):
+                pdf_document = fitz.open(source)
+            else:
+                pdf_document = fitz.open(stream=source, filetype="pdf")
             
-            return image_paths
+            try:
+                # DPI, colour and encoding are chosen by the shared image preparer
+                return [image_preparer.prepare_pdf_page(page) for page in pdf_document]
+            finally:
+                pdf_document.close()
         
         except Exception as e:
             logger.error(f"Error converting PDF to images: {str(e)}")
-            # Clean up any images created before the error
-            for img_path in image_paths:
-                if os.path.exists(img_path):
-                    os.remove(img_path)
-            raise
\ No newline at end of file
+            raise
@@ -0,0 +1,170 @@
+"""
+Reference range parsing and evaluation
+
+Reference ranges are parsed once per distinct string into numeric bounds and
+cached. Values are compared against their bounds in batches: the results of
+one report, or of many reports during a backfill, are flattened into NumPy
+arrays and evaluated in a single vectorized pass.
+
+Supported range forms (units and labels around them are ignored):
+    "12 - 16", "12–16", "12 to 16", "<5", "<= 5", "up to 5",
+    ">40", ">= 40", "less than 5", "more than 40", "-1 - 2"
+An explicit range is preferred over a bound printed next to it.
+"""
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Flag codes returned by evaluate_batch
+FLAG_LOW = -1
+FLAG_NONE = 0
+FLAG_HIGH = 1
+
+# Lab flag for each code
+FLAG_LABELS = {FLAG_LOW: "L", FLAG_NONE: None, FLAG_HIGH: "H"}
+
+_NUMBER = r"(-?(?:\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d*\.?\d+))"
+
+_UPPER_BOUND = re.compile(
+    r"(?:(<=|≤|=<)|(<)|\b(?:up\s*to|upto|less\s+than|below|max(?:imum)?)\b)\s*:?\s*" + _NUMBER,
+    re.IGNORECASE,
+)
+_LOWER_BOUND = re.compile(
+    r"(?:(>=|≥|=>)|(>)|\b(?:more\s+than|greater\s+than|above|min(?:imum)?)\b)\s*:?\s*" + _NUMBER,
+    re.IGNORECASE,
+)
+_BETWEEN = re.compile(_NUMBER + r"\s*(?:-|–|—|\bto\b)\s*" + _NUMBER, re.IGNORECASE)
+_NUMERIC_VALUE = re.compile(r"^\s*" + _NUMBER + r"\s*(?:[a-zA-Z%/µ^*][^0-9]*)?$")
+
+
+@dataclass(frozen=True)
+class ReferenceRange:
+    """Numeric bounds of a reference range, None for an open side"""
+    low: Optional[float] = None
+    high: Optional[float] = None
+    low_inclusive: bool = True
+    high_inclusive: bool = True
+
+
+def _to_float(text: str) -> float:
+    """Convert a matched number, dropping thousands separators"""
+    return float(text.replace(",", ""))
+
+
+@lru_cache(maxsize=4096)
+def parse_reference_range(text: Optional[str]) -> Optional[ReferenceRange]:
+    """
+    Parse a reference range string
+
+    Args:
+        text: Reference range as printed on the report
+
+    Returns:
+        The bounds, or None if the text holds no numeric range
+    """
+    if not text or not isinstance(text, str):
+        return None
+
+    # An explicit range wins over bounds mentioned around it, as in
+    # "130 - 170 mg/dL (Max 200)"
+    match = _BETWEEN.search(text)
+    if match:
+        low, high = sorted((_to_float(match.group(1)), _to_float(match.group(2))))
+        return ReferenceRange(low=low, high=high)
+
+    match = _UPPER_BOUND.search(text)
+    if match:
+        inclusive_op, exclusive_op, number = match.groups()
+        return ReferenceRange(high=_to_float(number), high_inclusive=exclusive_op is None)
+
+    match = _LOWER_BOUND.search(text)
+    if match:
+        inclusive_op, exclusive_op, number = match.groups()
+        return ReferenceRange(low=_to_float(number), low_inclusive=exclusive_op is None)
+
+    return None
+
+
+def parse_value(value: Any) -> Optional[float]:
+    """
+    Read a test value as a number
+
+    Args:
+        value: Number, or a numeric string optionally followed by a unit
+
+    Returns:
+        The value, or None if it is not numeric
+    """
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        match = _NUMERIC_VALUE.match(value)
+        if match:
+            return _to_float(match.group(1))
+    return None
+
+
+def evaluate_batch(values: Sequence[Any], ranges: Sequence[Optional[str]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compare many values against their reference ranges at once
+
+    Args:
+        values: Test values
+        ranges: Reference range string of each value
+
+    Returns:
+        A boolean array telling which values could be evaluated, and an int8
+        array of FLAG_LOW, FLAG_NONE or FLAG_HIGH codes
+    """
+    count = len(values)
+    x = np.full(count, np.nan)
+    low = np.full(count, np.nan)
+    high = np.full(count, np.nan)
+    low_inclusive = np.ones(count, dtype=bool)
+    high_inclusive = np.ones(count, dtype=bool)
+
+    for index, (value, text) in enumerate(zip(values, ranges)):
+        bounds = parse_reference_range(text)
+        if bounds is None:
+            continue
+        number = parse_value(value)
+        if number is None:
+            continue
+        x[index] = number
+        if bounds.low is not None:
+            low[index] = bounds.low
+            low_inclusive[index] = bounds.low_inclusive
+        if bounds.high is not None:
+            high[index] = bounds.high
+            high_inclusive[index] = bounds.high_inclusive
+
+    # Comparisons with NaN are False, so open sides never trigger a flag
+    with np.errstate(invalid="ignore"):
+        below = np.where(low_inclusive, x < low, x <= low)
+        above = np.where(high_inclusive, x > high, x >= high)
+
+    evaluated = ~np.isnan(x)
+    flags = np.zeros(count, dtype=np.int8)
+    flags[below] = FLAG_LOW
+    flags[above] = FLAG_HIGH
+    return evaluated, flags
+
+
+def evaluate(value: Any, text: Optional[str]) -> Tuple[bool, Optional[str]]:
+    """
+    Compare one value against its reference range
+
+    Args:
+        value: Test value
+        text: Reference range string
+
+    Returns:
+        Whether the value could be evaluated, and "H", "L" or None
+    """
+    evaluated, flags = evaluate_batch([value], [text])
+    return bool(evaluated[0]), FLAG_LABELS[int(flags[0])]
@@ -1,9 +1,39 @@
+import copy
 import logging
 from datetime import datetime
 from typing import Dict, Any, Optional, List
 
+from app.db.search import SEARCH_KEYS_FIELD, normalize_text, search_tokens
+from app.models.domain.report import ABNORMAL_FLAGS, REPORT_SCHEMA_VERSION
+from app.services.report_parser.reference_ranges import (
+    FLAG_LABELS,
+    FLAG_NONE,
+    evaluate_batch,
+    parse_value,
+)
+
 logger = logging.getLogger(__name__)
 
+# Date fields of collection_info
+COLLECTION_DATE_FIELDS = ["registered_on", "collected_on", "received_on", "reported_on"]
+
+# Date formats found on lab reports, tried after ISO 8601
+DATE_FORMATS = [
+    "%d/%m/%Y %H:%M:%S",
+    "%d/%m/%Y %H:%M",
+    "%d/%m/%Y",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%d",
+    "%d-%m-%Y %H:%M:%S",
+    "%d-%m-%Y %H:%M",
+    "%d-%m-%Y",
+    "%d-%b-%Y %H:%M:%S",
+    "%d-%b-%Y %H:%M",
+    "%d-%b-%Y",
+]
+
+
 class ReportMapper:
     """Maps extracted OCR data to a standardized format"""
     
@@ -40,104 +70,431 @@ class ReportMapper:
                 if "report_type" not in extracted_data["metadata"]:
                     extracted_data["metadata"]["report_type"] = extracted_data["test_name"]
             
-            # Format dates in collection_info
-            if "collection_info" in extracted_data and extracted_data["collection_info"]:
-                collection_info = extracted_data["collection_info"]
-                
-                for date_field in ["registered_on", "collected_on", "received_on", "reported_on"]:
-                    if date_field in collection_info and collection_info[date_field]:
-                        try:
-                            # Try to parse date in various formats
-                            date_str = collection_info[date_field]
-                            
-                            # Handle different date formats
-                            for fmt in [
-                                "%d/%m/%Y %H:%M:%S",
-                                "%d/%m/%Y %H:%M",
-                                "%d/%m/%Y",
-                                "%Y-%m-%d %H:%M:%S",
-                                "%Y-%m-%d %H:%M",
-                                "%Y-%m-%d",
-                                "%d-%m-%Y %H:%M:%S",
-                                "%d-%m-%Y %H:%M",
-                                "%d-%m-%Y",
-                                "%d-%b-%Y %H:%M:%S",
-                                "%d-%b-%Y %H:%M",
-                                "%d-%b-%Y",
-                            ]:
-                                try:
-                                    date_obj = datetime.strptime(date_str, fmt)
-                                    collection_info[date_field] = date_obj.isoformat()
-                                    break
-                                except ValueError:
-                                    continue
-                        except Exception as e:
-                            logger.warning(f"Could not parse date '{collection_info[date_field]}': {str(e)}")
-            
             # Process test results to ensure consistent format with is_normal flags
             if "test_results" in extracted_data and extracted_data["test_results"]:
                 ReportMapper._process_test_results(extracted_data["test_results"])
             
             # Add timestamps
-            current_time = datetime.utcnow().isoformat()
+            current_time = datetime.utcnow()
             extracted_data["created_at"] = current_time
             extracted_data["updated_at"] = current_time
             
-            return extracted_data
+            return ReportMapper.normalize(extracted_data)
         
         except Exception as e:
             logger.error(f"Error mapping report data: {str(e)}")
             raise
     
     @staticmethod
-    def _process_test_results(test_results: Dict[str, Any]) -> None:
+    def normalize(data: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Process test results to ensure consistent format
+        Bring a report document to the stored format
+        
+        This is the only place report documents are fixed up: dates become
+        datetimes, required fields get their defaults and the derived fields
+        (abnormal count, search keys) are computed. Reads rely on it and do
+        no per-document work. Running it again on a normalized document
+        changes nothing.
         
         Args:
-            test_results: Test result dictionary
+            data: Report data, updated in place
+        
+        Returns:
+            The same report data
         """
-        for key, value in test_results.items():
-            if isinstance(value, dict):
-                # Check if this is a test result value
-                if all(k in value for k in ["value", "unit"]) and "reference_range" in value:
-                    # Ensure is_normal is set based on reference range
-                    if "is_normal" not in value:
-                        value["is_normal"] = ReportMapper._is_value_normal(
-                            value["value"], value.get("reference_range"), value.get("flag")
-                        )
-                else:
-                    # Recursive call for nested dictionaries
-                    ReportMapper._process_test_results(value)
+        ReportMapper.fix_datetime_fields(data)
+        ReportMapper.apply_defaults(data)
+        data["abnormal_count"] = ReportMapper.count_abnormal(data.get("test_results"))
+        ReportMapper.add_search_keys(data)
+        data["schema_version"] = REPORT_SCHEMA_VERSION
+        return data
     
     @staticmethod
-    def _is_value_normal(value: Any, reference_range: Optional[str], flag: Optional[str]) -> bool:
+    def fix_datetime_fields(data: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Determine if a value is normal based on reference range or flag
+        Convert the date fields of a report to datetimes
+        
+        Dates that cannot be parsed are set to None, missing timestamps to now.
         
         Args:
-            value: The test value
-            reference_range: The reference range string
-            flag: H, L, or other flag
+            data: Report data, updated in place
         
         Returns:
-            Boolean indicating if value is normal
+            The same report data
+        """
+        # Handle collection_info datetime fields
+        if "collection_info" in data and data["collection_info"]:
+            for field in COLLECTION_DATE_FIELDS:
+                if field in data["collection_info"]:
+                    value = data["collection_info"][field]
+                    parsed = ReportMapper._parse_date(value)
+                    if parsed is None and value not in ("", None):
+                        logger.warning(f"Could not parse date '{value}'")
+                    data["collection_info"][field] = parsed
+        
+        # Handle timestamp fields
+        for field in ["created_at", "updated_at"]:
+            data[field] = ReportMapper._parse_date(data.get(field)) or datetime.utcnow()
+        
+        return data
+    
+    @staticmethod
+    def _parse_date(value: Any) -> Optional[datetime]:
         """
-        if flag:
-            return flag.upper() not in ["H", "L", "HIGH", "LOW", "ABNORMAL"]
+        Parse a date in ISO 8601 or one of DATE_FORMATS
         
-        if not reference_range:
-            return True
+        Args:
+            value: Date string or datetime
         
+        Returns:
+            The datetime, or None if the value is empty or cannot be parsed
+        """
+        if isinstance(value, datetime):
+            return value
+        if not isinstance(value, str) or not value.strip():
+            return None
+        
+        value = value.strip()
         try:
-            # Handle numeric comparisons
-            if isinstance(value, (int, float)) and "-" in reference_range:
-                min_val, max_val = reference_range.split("-")
-                min_val = float(min_val.strip())
-                max_val = float(max_val.strip())
-                return min_val <= value <= max_val
-        except:
+            return datetime.fromisoformat(value)
+        except ValueError:
             pass
         
-        # Default to true if we can't determine
-        return True
\ No newline at end of file
+        for fmt in DATE_FORMATS:
+            try:
+                return datetime.strptime(value, fmt)
+            except ValueError:
+                continue
+        return None
+    
+    @staticmethod
+    def apply_defaults(data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Ensure the fields required by the report schemas have values
+        
+        Args:
+            data: Report data, updated in place
+        
+        Returns:
+            The same report data
+        """
+        if "test_name" not in data or not data["test_name"]:
+            data["test_name"] = "Laboratory Test"
+            
+        if "test_category" not in data or not data["test_category"]:
+            data["test_category"] = "General"
+            
+        # Ensure report_info has a lab_name
+        if "report_info" not in data or not data["report_info"]:
+            data["report_info"] = {"lab_name": "Unknown Laboratory"}
+        elif "lab_name" not in data["report_info"] or not data["report_info"]["lab_name"]:
+            data["report_info"]["lab_name"] = "Unknown Laboratory"
+            
+        # Ensure metadata has report_type
+        if "metadata" not in data or not data["metadata"]:
+            data["metadata"] = {"report_type": "Laboratory Test"}
+        elif "report_type" not in data["metadata"] or not data["metadata"]["report_type"]:
+            # Use test_name as the report_type if available, otherwise default to "Laboratory Test"
+            data["metadata"]["report_type"] = data.get("test_name", "Laboratory Test")
+        
+        return data
+    
+    @staticmethod
+    def add_search_keys(data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Store the normalized words the report is searched by
+        
+        Args:
+            data: Report data, updated in place
+        
+        Returns:
+            The same report data
+        """
+        data[SEARCH_KEYS_FIELD] = {"test_name": search_tokens(data.get("test_name"))}
+        return data
+    
+    @staticmethod
+    def count_abnormal(test_results: Optional[Dict[str, Any]]) -> int:
+        """
+        Count the test results outside their reference range
+        
+        Args:
+            test_results: Test result dictionary, possibly nested by section
+        
+        Returns:
+            Number of results flagged abnormal or marked not normal
+        """
+        if not isinstance(test_results, dict):
+            return 0
+        
+        count = 0
+        for result in ReportMapper._collect_results(test_results):
+            flag = result.get("flag")
+            if result.get("is_normal") is False or (isinstance(flag, str) and flag.upper() in ABNORMAL_FLAGS):
+                count += 1
+        return count
+    
+    @staticmethod
+    def merge_page_results(page_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Merge per-page extractions of a multi-page report into a single document
+        
+        The first page wins for scalar fields; later pages only fill in values
+        that are still empty. Test results are merged key by key, clinical notes
+        are concatenated and the page info of every page is kept. Pages whose
+        extraction fell back to the default structure are listed in
+        metadata.fallback_pages.
+        
+        Args:
+            page_results: Extracted data for each page, in page order
+        
+        Returns:
+            Merged report data
+        """
+        if not page_results:
+            raise ValueError("No page results to merge")
+        
+        merged = copy.deepcopy(page_results[0])
+        if len(page_results) == 1:
+            return merged
+        
+        notes = []
+        page_infos = []
+        fallback_pages = []
+        
+        for page_number, page in enumerate(page_results, start=1):
+            if page_number > 1:
+                for section in ["report_info", "patient_info", "collection_info"]:
+                    if isinstance(page.get(section), dict):
+                        if not isinstance(merged.get(section), dict):
+                            merged[section] = {}
+                        ReportMapper._fill_missing(merged[section], page[section])
+                
+                for field in ["test_category", "test_name"]:
+                    if not merged.get(field) and page.get(field):
+                        merged[field] = page[field]
+                
+                if isinstance(page.get("test_results"), dict):
+                    if not isinstance(merged.get("test_results"), dict):
+                        merged["test_results"] = {}
+                    ReportMapper._merge_test_results(merged["test_results"], page["test_results"], page_number)
+            
+            clinical_notes = page.get("clinical_notes") or {}
+            if clinical_notes.get("notes") and clinical_notes["notes"] not in notes:
+                notes.append(clinical_notes["notes"])
+            if page_number > 1 and clinical_notes.get("possible_causes"):
+                if not isinstance(merged.get("clinical_notes"), dict):
+                    merged["clinical_notes"] = {}
+                causes = merged["clinical_notes"].setdefault("possible_causes", {}) or {}
+                for parameter, parameter_causes in clinical_notes["possible_causes"].items():
+                    if isinstance(parameter_causes, dict) and isinstance(causes.get(parameter), dict):
+                        causes[parameter] = {**parameter_causes, **causes[parameter]}
+                    else:
+                        causes.setdefault(parameter, parameter_causes)
+                merged["clinical_notes"]["possible_causes"] = causes
+            
+            metadata = page.get("metadata") or {}
+            page_infos.append(metadata.get("page_info") or f"Page {page_number}")
+            if metadata.get("fallback_pages"):
+                fallback_pages.append(page_number)
+            if page_number > 1:
+                if not isinstance(merged.get("metadata"), dict):
+                    merged["metadata"] = {}
+                ReportMapper._fill_missing(merged["metadata"], metadata)
+        
+        if notes:
+            if not isinstance(merged.get("clinical_notes"), dict):
+                merged["clinical_notes"] = {}
+            merged["clinical_notes"]["notes"] = "\n\n".join(notes)
+        
+        if not isinstance(merged.get("metadata"), dict):
+            merged["metadata"] = {}
+        merged["metadata"]["page_info"] = "; ".join(page_infos)
+        merged["metadata"]["page_count"] = len(page_results)
+        merged["metadata"].pop("fallback_pages", None)
+        if fallback_pages:
+            merged["metadata"]["fallback_pages"] = fallback_pages
+        
+        return merged
+    
+    @staticmethod
+    def _fill_missing(target: Dict[str, Any], source: Dict[str, Any]) -> None:
+        """
+        Copy values from source into target where target has no value yet
+        
+        Args:
+            target: Dictionary to fill in place
+            source: Dictionary to take values from
+        """
+        for key, value in source.items():
+            if value in (None, "", [], {}):
+                continue
+            if isinstance(value, dict) and isinstance(target.get(key), dict):
+                ReportMapper._fill_missing(target[key], value)
+            elif target.get(key) in (None, "", [], {}):
+                target[key] = copy.deepcopy(value)
+    
+    @staticmethod
+    def _merge_test_results(target: Dict[str, Any], source: Dict[str, Any], page_number: int) -> None:
+        """
+        Merge the test results of one page into the accumulated results
+        
+        Args:
+            target: Accumulated test results, updated in place
+            source: Test results of the page being merged
+            page_number: Page the source results came from
+        """
+        for key, value in source.items():
+            if key not in target:
+                target[key] = copy.deepcopy(value)
+            elif target[key] == value:
+                continue
+            elif (
+                isinstance(value, dict) and isinstance(target[key], dict)
+                and "value" not in value and "value" not in target[key]
+            ):
+                # Same section continued on another page
+                ReportMapper._merge_test_results(target[key], value, page_number)
+            else:
+                # Conflicting result for the same parameter, keep both
+                target[f"{key} (page {page_number})"] = copy.deepcopy(value)
+    
+    @staticmethod
+    def extract_observations(report: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Flatten the test results of a stored report into observation rows
+        
+        Each row holds one analyte of one report for the patient, timestamped
+        with the report date, falling back to the collection date and then to
+        the upload time. Analytes are keyed by their normalized name.
+        
+        Args:
+            report: Normalized report document, with its _id
+        
+        Returns:
+            Observation rows for the observations collection
+        """
+        collection_info = report.get("collection_info") or {}
+        observed_at = (
+            collection_info.get("reported_on")
+            or collection_info.get("collected_on")
+            or report.get("created_at")
+        )
+        phone_number = (report.get("patient_info") or {}).get("phone_number")
+        
+        rows = []
+        
+        def walk(results: Dict[str, Any], section: Optional[str]) -> None:
+            for name, result in results.items():
+                if not isinstance(result, dict):
+                    continue
+                if "value" not in result:
+                    walk(result, name)
+                    continue
+                analyte = normalize_text(name)
+                if not analyte:
+                    continue
+                rows.append({
+                    "meta": {"phone_number": phone_number, "analyte": analyte},
+                    "observed_at": observed_at,
+                    "name": name,
+                    "section": section,
+                    "value": parse_value(result.get("value")),
+                    "value_text": None if result.get("value") is None else str(result.get("value")),
+                    "unit": result.get("unit"),
+                    "reference_range": result.get("reference_range"),
+                    "flag": result.get("flag"),
+                    "is_normal": result.get("is_normal"),
+                    "report_id": report.get("_id"),
+                })
+        
+        if isinstance(report.get("test_results"), dict) and observed_at is not None:
+            walk(report["test_results"], None)
+        return rows
+    
+    @staticmethod
+    def evaluate_results(results: List[Dict[str, Any]], overwrite: bool = False) -> None:
+        """
+        Set is_normal on test results, all reference ranges evaluated in one pass
+        
+        A flag printed by the lab decides is_normal. Otherwise the value is
+        compared with its reference range and, when it falls outside, gets an
+        H or L flag. Results that cannot be evaluated keep the is_normal they
+        have, or are treated as normal when they have none.
+        
+        Args:
+            results: Test result dictionaries (with a value), updated in place
+            overwrite: Re-evaluate results that already have is_normal
+        """
+        # A null is_normal, as the tool-use schema allows, is still undecided
+        pending = [result for result in results if overwrite or result.get("is_normal") is None]
+        if not pending:
+            return
+        
+        evaluated, flags = evaluate_batch(
+            [result.get("value") for result in pending],
+            [result.get("reference_range") for result in pending]
+        )
+        
+        for result, is_evaluated, code in zip(pending, evaluated.tolist(), flags.tolist()):
+            flag = result.get("flag")
+            if isinstance(flag, str) and flag.strip():
+                result["is_normal"] = flag.strip().upper() not in ABNORMAL_FLAGS
+            elif is_evaluated:
+                result["is_normal"] = code == FLAG_NONE
+                if code != FLAG_NONE:
+                    result["flag"] = FLAG_LABELS[code]
+            elif result.get("is_normal") is None:
+                # Qualitative results such as "Positive" against "Negative"
+                # keep the judgement that came with them
+                result["is_normal"] = True
+    
+    @staticmethod
+    def evaluate_reports(reports: List[Dict[str, Any]]) -> None:
+        """
+        Re-evaluate the test results of many reports in one vectorized pass
+        
+        Used by backfills; the abnormal count of each report is updated too.
+        
+        Args:
+            reports: Report documents, updated in place
+        """
+        results = []
+        for report in reports:
+            if isinstance(report.get("test_results"), dict):
+                results.extend(ReportMapper._collect_results(report["test_results"]))
+        
+        ReportMapper.evaluate_results(results, overwrite=True)
+        
+        for report in reports:
+            report["abnormal_count"] = ReportMapper.count_abnormal(report.get("test_results"))
+    
+    @staticmethod
+    def _collect_results(test_results: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Collect the test result dictionaries of a possibly nested test_results
+        
+        Args:
+            test_results: Test result dictionary, sections nest results
+        
+        Returns:
+            Dictionaries holding a value
+        """
+        results = []
+        for value in test_results.values():
+            if isinstance(value, dict):
+                if "value" in value:
+                    results.append(value)
+                else:
+                    results.extend(ReportMapper._collect_results(value))
+        return results
+    
+    @staticmethod
+    def _process_test_results(test_results: Dict[str, Any]) -> None:
+        """
+        Process test results to ensure consistent format
+        
+        Args:
+            test_results: Test result dictionary
+        """
+        ReportMapper.evaluate_results(ReportMapper._collect_results(test_results))
@@ -0,0 +1,151 @@
+"""
+Benchmark the image preparation stage against the legacy 300 DPI PNG render
+
+Generates a synthetic multi-page lab report, renders every page both ways and
+reports payload sizes, preparation time and the estimated upload time. With
+--live the pages are also sent to Claude to measure end-to-end latency.
+
+Usage:
+    python -m benchmarks.bench_image_preparation --pages 3 --bandwidth-mbps 20
+    python -m benchmarks.bench_image_preparation --live
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import statistics
+import time
+
+# Settings require these values even though the offline benchmark does not use them
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark")
+
+import fitz  # PyMuPDF
+
+from app.services.ocr.image_preparation import ImagePreparer
+
+LEGACY_DPI = 300
+
+
+def build_synthetic_report(pages: int, rows_per_page: int = 40) -> bytes:
+    """Build an A4 PDF that looks like a tabular lab report"""
+    document = fitz.open()
+    for page_number in range(pages):
+        page = document.new_page(width=595, height=842)
+        page.insert_text((50, 50), "CITY DIAGNOSTIC LABORATORY", fontsize=16)
+        page.insert_text((50, 72), f"Patient: Test Patient    Page {page_number + 1} of {pages}", fontsize=10)
+        page.draw_line((50, 80), (545, 80))
+        for row in range(rows_per_page):
+            y = 100 + row * 17
+            page.insert_text((50, y), f"Parameter {page_number * rows_per_page + row}", fontsize=9)
+            page.insert_text((250, y), f"{10 + row * 0.37:.2f}", fontsize=9)
+            page.insert_text((330, y), "g/dL", fontsize=9)
+            page.insert_text((420, y), "12.0 - 16.0", fontsize=9)
+    content = document.tobytes()
+    document.close()
+    return content
+
+
+def render_legacy(page: fitz.Page) -> bytes:
+    """Render a page the way PDFProcessor did before the preparation stage"""
+    pix = page.get_pixmap(matrix=fitz.Matrix(LEGACY_DPI / 72, LEGACY_DPI / 72))
+    return pix.tobytes("png")
+
+
+def measure(pdf_bytes: bytes, preparer: ImagePreparer):
+    """Render every page both ways and collect sizes and timings"""
+    results = []
+    document = fitz.open(stream=pdf_bytes, filetype="pdf")
+    for page in document:
+        started = time.perf_counter()
+        legacy = render_legacy(page)
+        legacy_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        prepared = preparer.prepare_pdf_page(page)
+        prepared_seconds = time.perf_counter() - started
+
+        results.append({
+            "page": page.number + 1,
+            "legacy": {"bytes": len(legacy), "base64_bytes": len(base64.b64encode(legacy)), "seconds": legacy_seconds},
+            "prepared": {
+                "bytes": len(prepared.data),
+                "base64_bytes": len(base64.b64encode(prepared.data)),
+                "seconds": prepared_seconds,
+                "media_type": prepared.media_type,
+                "size": [prepared.width, prepared.height],
+            },
+            "_payloads": (legacy, prepared.data, prepared.media_type),
+        })
+    document.close()
+    return results
+
+
+async def measure_live(results):
+    """Send both payloads of every page to Claude and time the calls"""
+    from app.services.ocr.claude_service import ClaudeOCRService
+
+    service = ClaudeOCRService()
+    try:
+        for result in results:
+            legacy, prepared, media_type = result["_payloads"]
+            for key, payload, payload_type in [("legacy", legacy, "image/png"), ("prepared", prepared, media_type)]:
+                started = time.perf_counter()
+                await service.process_image_bytes(payload, payload_type, source=f"benchmark page {result['page']}")
+                result[key]["model_seconds"] = time.perf_counter() - started
+    finally:
+        await ClaudeOCRService.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--format", default="jpeg", choices=["jpeg", "webp", "png"])
+    parser.add_argument("--quality", type=int, default=80)
+    parser.add_argument("--max-long-edge", type=int, default=1568)
+    parser.add_argument("--color", action="store_true", help="Keep colour instead of converting to grayscale")
+    parser.add_argument("--bandwidth-mbps", type=float, default=20.0, help="Uplink used to estimate transfer time")
+    parser.add_argument("--live", action="store_true", help="Also call Claude to measure end-to-end latency")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    preparer = ImagePreparer(
+        max_long_edge=args.max_long_edge,
+        grayscale=not args.color,
+        image_format=args.format,
+        quality=args.quality,
+    )
+    results = measure(build_synthetic_report(args.pages), preparer)
+
+    if args.live:
+        asyncio.run(measure_live(results))
+
+    bytes_per_second = args.bandwidth_mbps * 1_000_000 / 8
+    for result in results:
+        result.pop("_payloads")
+        for key in ("legacy", "prepared"):
+            result[key]["transfer_seconds"] = result[key]["base64_bytes"] / bytes_per_second
+
+    summary = {}
+    for key in ("legacy", "prepared"):
+        summary[key] = {
+            "total_bytes": sum(r[key]["bytes"] for r in results),
+            "mean_render_seconds": statistics.mean(r[key]["seconds"] for r in results),
+            "total_transfer_seconds": sum(r[key]["transfer_seconds"] for r in results),
+        }
+        if args.live:
+            summary[key]["mean_model_seconds"] = statistics.mean(r[key]["model_seconds"] for r in results)
+    summary["bytes_saved"] = summary["legacy"]["total_bytes"] - summary["prepared"]["total_bytes"]
+    summary["size_ratio"] = summary["prepared"]["total_bytes"] / summary["legacy"]["total_bytes"]
+
+    report = {"settings": vars(args), "pages": results, "summary": summary}
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,456 @@
+"""
+End-to-end ingestion benchmark
+
+Generates synthetic lab reports of varying size (multi-page PDFs and PNG/JPEG
+images), uploads them through POST /api/v1/reports/upload, then reads them
+back through the by-phone listing (following cursors) and the get-by-id
+endpoint. Requests go through the real FastAPI app in-process; OCR is served
+by the local stand-in backend (see app/services/ocr/local_backend.py), and
+MongoDB is either a real server (--mongo-url) or an in-memory stand-in
+(mongomock-motor, installed separately with `pip install mongomock-motor`).
+
+Reports latency percentiles and throughput per endpoint, peak RSS, and
+per-stage timings: rasterize (PDF page render or image decode and resize),
+encode (image compression), ocr, map (ReportMapper) and insert (report and
+observations). Results are written as JSON so runs can be compared between
+commits.
+
+Usage:
+    python -m benchmarks.bench_ingestion --reports 200 --concurrency 16 --output ingestion.json
+    python -m benchmarks.bench_ingestion --mongo-url mongodb://localhost:27017 --ocr-latency-ms 800
+"""
+import argparse
+import asyncio
+import functools
+import io
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Settings require these values even though the benchmark does not use them,
+# and OCR must go to the local stand-in before the app is imported
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark")
+os.environ.setdefault("OCR_CACHE_ENABLED", "false")
+os.environ["OCR_BACKEND"] = "local"
+
+import httpx
+import numpy as np
+from PIL import Image, ImageDraw
+
+from benchmarks.bench_image_preparation import build_synthetic_report
+
+BENCHMARK_DB_NAME = "lab_reports_benchmark"
+PHONE_NUMBERS = [f"+1555000{index:04d}" for index in range(10)]
+
+
+# Synthetic reports
+
+def build_image(width: int, rows: int, image_format: str, seed: int) -> bytes:
+    """Render a photographed-looking report page as PNG or JPEG"""
+    height = int(width * 1.414)
+    image = Image.new("RGB", (width, height), (250, 248, 240))
+    draw = ImageDraw.Draw(image)
+    rng = random.Random(seed)
+    draw.text((width * 0.08, height * 0.04), "CITY DIAGNOSTIC LABORATORY", fill=(0, 0, 0))
+    step = height * 0.85 / max(rows, 1)
+    for row in range(rows):
+        y = height * 0.1 + row * step
+        draw.text((width * 0.08, y), f"Parameter {row}", fill=(20, 20, 20))
+        draw.text((width * 0.45, y), f"{rng.uniform(1, 200):.2f}", fill=(20, 20, 20))
+        draw.text((width * 0.7, y), "12.0 - 16.0", fill=(20, 20, 20))
+
+    # Sensor noise keeps the encoders from compressing the page to nothing
+    noise = np.random.default_rng(seed).normal(0, 12, (height, width, 1))
+    pixels = np.asarray(image, dtype=np.float32) + noise
+    image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+    buffer = io.BytesIO()
+    if image_format == "png":
+        image.save(buffer, format="PNG")
+    else:
+        image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def build_corpus(count: int, pdf_share: float, max_pages: int, seed: int) -> List[Dict[str, Any]]:
+    """
+    Build the uploads of a run
+
+    Args:
+        count: Number of reports
+        pdf_share: Share of the reports that are PDFs, the rest are images
+        max_pages: Largest page count of a PDF
+        seed: Seed making the corpus identical between runs
+
+    Returns:
+        Uploads with their file name, content type, bytes, phone and size class
+    """
+    rng = random.Random(seed)
+    uploads = []
+    for index in range(count):
+        phone_number = PHONE_NUMBERS[index % len(PHONE_NUMBERS)]
+        if rng.random() < pdf_share:
+            pages = rng.randint(1, max_pages)
+            content = build_synthetic_report(pages, rng.choice((20, 40)))
+            uploads.append({
+                "filename": f"report-{index}.pdf",
+                "content_type": "application/pdf",
+                "content": content,
+                "phone_number": phone_number,
+                "kind": f"pdf-{pages}p",
+            })
+        else:
+            width = rng.choice((800, 1600, 3000))
+            image_format = rng.choice(("png", "jpeg"))
+            content = build_image(width, rng.choice((20, 40)), image_format, seed + index)
+            uploads.append({
+                "filename": f"report-{index}.{'png' if image_format == 'png' else 'jpg'}",
+                "content_type": f"image/{image_format}",
+                "content": content,
+                "phone_number": phone_number,
+                "kind": f"{image_format}-{width}px",
+            })
+    return uploads
+
+
+# Measurements
+
+def percentile(ordered: List[float], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile of sorted samples"""
+    if not ordered:
+        return None
+    rank = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def summarize(samples: List[float], wall_seconds: Optional[float] = None) -> Dict[str, Any]:
+    """Latency percentiles of a list of durations, in seconds"""
+    ordered = sorted(samples)
+    summary = {
+        "count": len(ordered),
+        "total_seconds": sum(ordered),
+        "mean_seconds": sum(ordered) / len(ordered) if ordered else None,
+        "p50_seconds": percentile(ordered, 0.50),
+        "p95_seconds": percentile(ordered, 0.95),
+        "p99_seconds": percentile(ordered, 0.99),
+        "max_seconds": ordered[-1] if ordered else None,
+    }
+    if wall_seconds is not None:
+        summary["wall_seconds"] = wall_seconds
+        summary["throughput_per_second"] = len(ordered) / wall_seconds if wall_seconds else None
+    return summary
+
+
+def peak_rss_bytes() -> int:
+    """Peak resident set size of this process"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class StageTimer:
+    """
+    Times pipeline stages by wrapping the functions that implement them
+
+    Stages run on the event loop and in worker threads, so samples are
+    appended under a lock. Nested stages are subtracted from their parent
+    (encode is part of prepare_pdf_page, which is reported as rasterize).
+    """
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._patches: List[Tuple[Any, str, Any]] = []
+
+    def _record(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.samples[stage].append(seconds)
+
+    def wrap(self, owner: Any, name: str, stage: str) -> None:
+        """Replace owner.name with a timed version recording into stage"""
+        original = owner.__dict__[name]
+        function = original.__func__ if isinstance(original, (staticmethod, classmethod)) else original
+        timer = self
+
+        if asyncio.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def timed(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    timer._record(stage, time.perf_counter() - started)
+        else:
+            @functools.wraps(function)
+            def timed(*args, **kwargs):
+                child_seconds = getattr(timer._local, "child_seconds", 0.0)
+                timer._local.child_seconds = 0.0
+                started = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    elapsed = time.perf_counter() - started
+                    timer._record(stage, elapsed - timer._local.child_seconds)
+                    timer._local.child_seconds = child_seconds + elapsed
+
+        if isinstance(original, staticmethod):
+            timed = staticmethod(timed)
+        elif isinstance(original, classmethod):
+            timed = classmethod(timed)
+        setattr(owner, name, timed)
+        self._patches.append((owner, name, original))
+
+    def restore(self) -> None:
+        """Put the original functions back"""
+        for owner, name, original in reversed(self._patches):
+            setattr(owner, name, original)
+        self._patches = []
+
+    def summary(self) -> Dict[str, Any]:
+        return {stage: summarize(samples) for stage, samples in sorted(self.samples.items())}
+
+
+def instrument(timer: StageTimer) -> None:
+    """Wrap the functions behind each pipeline stage"""
+    from app.services.ingestion.report_ingestion import ReportIngestionService
+    from app.services.ocr.image_preparation import ImagePreparer
+    from app.services.ocr.local_backend import LocalOCRBackend
+    from app.services.report_parser.report_mapper import ReportMapper
+
+    timer.wrap(ImagePreparer, "prepare_pdf_page", "rasterize")
+    timer.wrap(ImagePreparer, "prepare_image_bytes", "rasterize")
+    timer.wrap(ImagePreparer, "_encode", "encode")
+    timer.wrap(LocalOCRBackend, "process_image_bytes", "ocr")
+    timer.wrap(ReportMapper, "map_to_standard_format", "map")
+    timer.wrap(ReportIngestionService, "store", "insert")
+
+
+# Database
+
+async def open_database(mongo_url: Optional[str]):
+    """
+    Open the database the app writes to during the run
+
+    Returns:
+        The database and a coroutine function cleaning it up
+    """
+    if mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        from app.db.indexes import ensure_collections, ensure_indexes
+
+        client = AsyncIOMotorClient(mongo_url, serverSelectionTimeoutMS=5000)
+        await client.drop_database(BENCHMARK_DB_NAME)
+        database = client[BENCHMARK_DB_NAME]
+        await ensure_collections(database)
+        await ensure_indexes(database)
+
+        async def cleanup():
+            await client.drop_database(BENCHMARK_DB_NAME)
+            client.close()
+        return database, cleanup
+
+    try:
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        raise SystemExit("The in-memory database needs mongomock-motor (pip install mongomock-motor), or pass --mongo-url")
+
+    database = AsyncMongoMockClient()[BENCHMARK_DB_NAME]
+
+    async def cleanup():
+        pass
+    return database, cleanup
+
+
+# Workload
+
+async def run_phase(
+    name: str,
+    requests: List[Callable[[], Any]],
+    concurrency: int,
+    results: Dict[str, Any]
+) -> List[Any]:
+    """Run request factories with bounded concurrency and record their latencies"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors: Dict[str, int] = defaultdict(int)
+
+    async def run(request: Callable[[], Any]) -> Any:
+        async with semaphore:
+            started = time.perf_counter()
+            response = await request()
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors[str(response.status_code)] += 1
+            return response
+
+    started = time.perf_counter()
+    responses = await asyncio.gather(*(run(request) for request in requests))
+    wall_seconds = time.perf_counter() - started
+
+    results[name] = {**summarize(latencies, wall_seconds), "errors": dict(errors)}
+    return responses
+
+
+async def run_benchmark(args) -> Dict[str, Any]:
+    from app.core.config import settings
+    from app.db.database import get_database
+    from app.main import app
+    from app.services.ingestion.report_ingestion import report_ingestion
+    from app.services.ocr.backend import ocr_backend_class
+
+    corpus = build_corpus(args.reports, args.pdf_share, args.max_pages, args.seed)
+    database, cleanup = await open_database(args.mongo_url)
+    app.dependency_overrides[get_database] = lambda: database
+
+    timer = StageTimer()
+    instrument(timer)
+    endpoints: Dict[str, Any] = {}
+    prefix = f"{settings.API_V1_STR}/reports"
+
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            def upload(item):
+                return lambda: client.post(
+                    f"{prefix}/upload",
+                    files={"file": (item["filename"], item["content"], item["content_type"])},
+                    data={"phone_number": item["phone_number"]},
+                )
+
+            responses = await run_phase("upload", [upload(item) for item in corpus], args.concurrency, endpoints)
+            report_ids = [response.json()["report_id"] for response in responses if response.status_code == 200]
+
+            # Walk every patient's listing page by page, as a client would
+            list_latencies: List[float] = []
+            list_errors: Dict[str, int] = defaultdict(int)
+
+            async def walk(phone_number: str) -> None:
+                cursor = None
+                while True:
+                    params = {"limit": args.page_size}
+                    if cursor:
+                        params["cursor"] = cursor
+                    started = time.perf_counter()
+                    response = await client.get(f"{prefix}/by-phone/{phone_number}", params=params)
+                    list_latencies.append(time.perf_counter() - started)
+                    if response.status_code != 200:
+                        list_errors[str(response.status_code)] += 1
+                        return
+                    cursor = response.json().get("next_cursor")
+                    if not cursor:
+                        return
+
+            started = time.perf_counter()
+            for _ in range(args.read_rounds):
+                await asyncio.gather(*(walk(phone_number) for phone_number in PHONE_NUMBERS))
+            endpoints["list"] = {**summarize(list_latencies, time.perf_counter() - started), "errors": dict(list_errors)}
+
+            def get(report_id):
+                return lambda: client.get(f"{prefix}/{report_id}")
+
+            await run_phase(
+                "get",
+                [get(report_id) for report_id in report_ids * args.read_rounds],
+                args.concurrency,
+                endpoints
+            )
+    finally:
+        timer.restore()
+        app.dependency_overrides.pop(get_database, None)
+        await cleanup()
+
+    sizes = defaultdict(list)
+    for item in corpus:
+        sizes[item["kind"]].append(len(item["content"]))
+
+    return {
+        "run": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": "mongodb" if args.mongo_url else "in-memory",
+        },
+        "settings": {
+            **{key: value for key, value in vars(args).items() if key not in ("mongo_url", "output", "verbose")},
+            "ocr_image_format": settings.OCR_IMAGE_FORMAT,
+            "ocr_image_max_long_edge": settings.OCR_IMAGE_MAX_LONG_EDGE,
+            "pdf_process_all_pages": settings.PDF_PROCESS_ALL_PAGES,
+            # What the backend actually draws latencies from
+            "ocr_backend_latency_distribution": report_ingestion.pdf_processor.ocr_backend.distribution,
+        },
+        "corpus": {
+            kind: {"count": len(values), "mean_bytes": sum(values) / len(values)}
+            for kind, values in sorted(sizes.items())
+        },
+        "endpoints": endpoints,
+        "stages": timer.summary(),
+        "ocr_backend": ocr_backend_class().get_stats(),
+        "peak_rss_bytes": peak_rss_bytes(),
+    }
+
+
+def git_commit() -> Optional[str]:
+    """Commit the benchmark runs against, with a marker for local changes"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout
+        return f"{commit}-dirty" if dirty.strip() else commit
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports", type=int, default=100, help="Reports to upload")
+    parser.add_argument("--pdf-share", type=float, default=0.5, help="Share of reports that are PDFs")
+    parser.add_argument("--max-pages", type=int, default=4, help="Largest PDF page count")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight")
+    parser.add_argument("--page-size", type=int, default=20, help="Reports per listing page")
+    parser.add_argument("--read-rounds", type=int, default=1, help="Times the list and get phases are repeated")
+    parser.add_argument("--ocr-latency-ms", type=float, default=0.0, help="Median simulated OCR latency")
+    parser.add_argument("--ocr-latency-distribution", default="lognormal", choices=("fixed", "uniform", "lognormal"))
+    parser.add_argument("--ocr-failure-rate", type=float, default=0.0, help="Share of OCR calls that fail")
+    parser.add_argument("--mongo-url", help="MongoDB to use instead of the in-memory stand-in")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--verbose", action="store_true", help="Keep the app's per-request logging")
+    args = parser.parse_args()
+
+    # The app creates its OCR backend on import, so configure it first
+    from app.core.config import settings
+    settings.OCR_LOCAL_LATENCY_MS = args.ocr_latency_ms
+    settings.OCR_LOCAL_LATENCY_DISTRIBUTION = args.ocr_latency_distribution
+    settings.OCR_LOCAL_FAILURE_RATE = args.ocr_failure_rate
+    settings.OCR_LOCAL_SEED = args.seed
+
+    from app.main import app  # noqa: F401 - configures logging before it is quieted
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    report = asyncio.run(run_benchmark(args))
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Benchmark report list serialization against the response_model path
+
+Builds synthetic normalized report documents and encodes one list page three
+ways: the way FastAPI did it before (response model validation,
+jsonable_encoder and json.dumps), through app.api.serialization, and as the
+projected summary listing. Reports the time per page and the response size.
+
+Usage:
+    python -m benchmarks.bench_serialization --reports 50 --iterations 200
+"""
+import argparse
+import copy
+import json
+import os
+import statistics
+import time
+from datetime import datetime, timedelta
+
+# Settings require these values even though the benchmark does not use them
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark")
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+
+from app.api.serialization import dumps, serialize_reports
+from app.models.schemas.report import LabReportListResponse
+from app.services.report_parser.report_mapper import ReportMapper
+
+
+def build_report(index: int, parameters: int) -> dict:
+    """Build a stored report document like the ones ReportMapper writes"""
+    test_results = {
+        f"Parameter {n}": {
+            "value": 10 + n * 0.37,
+            "unit": "g/dL",
+            "reference_range": "12.0 - 16.0",
+            "flag": "H" if n % 7 == 0 else None,
+        }
+        for n in range(parameters)
+    }
+    report = {
+        "report_info": {
+            "lab_name": "City Diagnostic Laboratory",
+            "lab_registration_number": "LAB-12345",
+            "lab_contact": {"phone": "+10000000000", "email": "lab@example.com", "address": "1 Main Street"},
+            "lab_signatories": [
+                {"name": "Dr. A Pathologist", "qualification": "MD", "designation": "Consultant"},
+                {"name": "B Technician", "qualification": "BSc", "designation": "Technologist"},
+            ],
+        },
+        "patient_info": {"name": "Test Patient", "age": "42", "gender": "F", "phone_number": "+10000000000"},
+        "collection_info": {"reported_on": (datetime(2024, 1, 1) + timedelta(days=index)).strftime("%d/%m/%Y %H:%M")},
+        "test_category": "HAEMATOLOGY",
+        "test_name": "Complete Blood Count",
+        "test_results": test_results,
+        "clinical_notes": {"notes": "Mild anaemia. " * 20, "possible_causes": {"Parameter 0": {"high": ["Dehydration"]}}},
+        "metadata": {"page_info": "Page 1 of 1", "disclaimer": "For clinical use only. " * 5},
+    }
+    report = ReportMapper.map_to_standard_format(report, "PDF", f"report-{index}.pdf", "+10000000000")
+    report["_id"] = ObjectId()
+    return report
+
+
+def legacy_page(documents):
+    """Encode a page the way the route did with response_model"""
+    reports = []
+    for doc in documents:
+        doc["id"] = str(doc.pop("_id"))
+        reports.append(ReportMapper.apply_defaults(ReportMapper.fix_datetime_fields(doc)))
+    model = LabReportListResponse.model_validate({"reports": reports, "total": len(reports)})
+    content = jsonable_encoder(model)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def fast_page(documents):
+    """Encode a page through app.api.serialization"""
+    return dumps({"reports": serialize_reports(documents), "total": len(documents)})
+
+
+def summary_page(documents):
+    """Encode the projected summary listing of a page"""
+    return dumps({
+        "reports": [
+            {
+                "id": str(doc["_id"]),
+                "test_name": doc["test_name"],
+                "test_category": doc["test_category"],
+                "lab_name": doc["report_info"]["lab_name"],
+                "reported_on": doc["collection_info"]["reported_on"],
+                "abnormal_count": doc["abnormal_count"],
+                "created_at": doc["created_at"],
+            }
+            for doc in documents
+        ],
+        "total": len(documents),
+    })
+
+
+def measure(encode, documents, iterations: int) -> dict:
+    """Time an encoder over fresh copies of the page"""
+    timings = []
+    body = b""
+    for _ in range(iterations):
+        page = copy.deepcopy(documents)
+        started = time.perf_counter()
+        body = encode(page)
+        timings.append(time.perf_counter() - started)
+    return {
+        "bytes": len(body),
+        "mean_seconds": statistics.mean(timings),
+        "p50_seconds": statistics.median(timings),
+        "min_seconds": min(timings),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports", type=int, default=50, help="Reports per page")
+    parser.add_argument("--parameters", type=int, default=30, help="Test results per report")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    documents = [build_report(index, args.parameters) for index in range(args.reports)]
+
+    results = {
+        "legacy": measure(legacy_page, documents, args.iterations),
+        "fast": measure(fast_page, documents, args.iterations),
+        "summary": measure(summary_page, documents, args.iterations),
+    }
+    for key in ("fast", "summary"):
+        results[key]["speedup"] = results["legacy"]["mean_seconds"] / results[key]["mean_seconds"]
+        results[key]["size_ratio"] = results[key]["bytes"] / results["legacy"]["bytes"]
+
+    report = {"settings": vars(args), "results": results}
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
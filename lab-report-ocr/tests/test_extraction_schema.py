@@ -0,0 +1,37 @@
+from app.services.ocr.extraction_schema import (
+    REQUIRED_SECTIONS,
+    extraction_tool,
+    report_input_schema,
+    validate_extraction,
+)
+
+
+def parameter_schema():
+    return report_input_schema()["properties"]["test_results"]["additionalProperties"]["anyOf"][0]
+
+
+def test_server_fields_are_not_requested():
+    schema = report_input_schema()
+
+    assert "_id" not in schema["properties"]
+    assert "abnormal_count" not in schema["properties"]
+    assert "phone_number" not in schema["properties"]["patient_info"]["properties"]
+    assert "is_normal" not in parameter_schema()["properties"]
+
+
+def test_parameter_schema_asks_for_printed_fields():
+    assert {"value", "unit", "reference_range", "flag"} <= set(parameter_schema()["properties"])
+
+
+def test_tool_gets_a_copy_of_the_schema():
+    tool = extraction_tool()
+    tool["input_schema"]["properties"].clear()
+
+    assert report_input_schema()["properties"]
+    assert report_input_schema()["required"] == REQUIRED_SECTIONS
+
+
+def test_validate_extraction():
+    assert validate_extraction([]) == ["arguments are a list, not an object"]
+    assert "missing test_results" in validate_extraction({"report_info": {}})
+    assert validate_extraction({section: {} for section in REQUIRED_SECTIONS}) == []
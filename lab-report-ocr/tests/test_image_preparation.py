@@ -0,0 +1,52 @@
+import io
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from app.services.ocr.image_preparation import BASELINE_DPI, ImagePreparer
+
+
+def build_page():
+    document = fitz.open()
+    page = document.new_page()
+    page.insert_text((72, 72), "Haemoglobin 11.2 g/dL 12.0 - 15.0")
+    return document, page
+
+
+def test_pdf_baseline_is_the_old_png_render():
+    document, page = build_page()
+    preparer = ImagePreparer(measure_pdf_baseline=True)
+
+    prepared = preparer.prepare_pdf_page(page)
+
+    scale = BASELINE_DPI / 72
+    png = page.get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False).tobytes("png")
+    assert prepared.baseline_bytes == len(png)
+    assert prepared.bytes_saved == max(0, len(png) - len(prepared.data))
+    assert preparer.get_stats()["measured_images"] == 1
+    document.close()
+
+
+def test_pdf_baseline_is_not_guessed_when_not_measured():
+    document, page = build_page()
+    preparer = ImagePreparer(measure_pdf_baseline=False)
+
+    prepared = preparer.prepare_pdf_page(page)
+
+    assert prepared.bytes_saved is None
+    stats = preparer.get_stats()
+    assert stats["images"] == 1
+    assert stats["measured_images"] == 0
+    assert stats["bytes_saved"] == 0
+    document.close()
+
+
+def test_upload_baseline_is_the_upload():
+    buffer = io.BytesIO()
+    Image.new("RGB", (3000, 2000), "white").save(buffer, format="PNG")
+    preparer = ImagePreparer(image_format="jpeg")
+
+    prepared = preparer.prepare_image_bytes(buffer.getvalue())
+
+    assert prepared.baseline_bytes == len(buffer.getvalue())
+    assert max(prepared.width, prepared.height) == preparer.max_long_edge
@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+from app.services.ocr.json_stream import StreamingJSONParser
+
+
+def repair(text):
+    parser = StreamingJSONParser()
+    parser.feed(text)
+    return parser.finish()
+
+
+def parse(text):
+    return json.loads(repair(text))
+
+
+def test_valid_json_is_unchanged():
+    text = '{"a": 1, "b": [true, null, "x"], "c": {"d": -1.5e3}}'
+
+    assert parse(text) == json.loads(text)
+
+
+def test_prose_and_code_fences_are_dropped():
+    text = 'Here is the report:\n```json\n{"test_name": "CBC"}\n```\nLet me know if you need more.'
+
+    assert parse(text) == {"test_name": "CBC"}
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": 1,}', {"a": 1}),
+    ('{"a": [1, 2,]}', {"a": [1, 2]}),
+    ('{"a": 1,, "b": 2}', {"a": 1, "b": 2}),
+    ('{"a": 1 "b": 2}', {"a": 1, "b": 2}),
+    ("{a: 1}", {"a": 1}),
+    ("{'a': 'it'}", {"a": "it"}),
+    ('{"a": True, "b": None, "c": NaN}', {"a": True, "b": None, "c": None}),
+    ('{"unit": g/dL}', {"unit": "g/dL"}),
+    ('{"flag": High normal}', {"flag": "High normal"}),
+    ('{"notes": "line one\nline two\tend"}', {"notes": "line one\nline two\tend"}),
+])
+def test_repairs(text, expected):
+    assert parse(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": {"b": [1, 2', {"a": {"b": [1, 2]}}),
+    ('{"a": "unterminated', {"a": "unterminated"}),
+    ('{"a": 1, "b":', {"a": 1, "b": None}),
+    ('{"a": 1, "b"', {"a": 1, "b": None}),
+])
+def test_truncated_output_is_closed(text, expected):
+    assert parse(text) == expected
+
+
+def test_no_json_gives_empty_text():
+    assert repair("I could not read this image.") == ""
+
+    with pytest.raises(ValueError):
+        StreamingJSONParser().result()
+
+
+def test_fields_are_reported_as_they_complete():
+    seen = []
+    parser = StreamingJSONParser(on_field=lambda key, value: seen.append((key, value)))
+    text = '{"report_info": {"lab_name": "Lab"}, "test_results": {"Hb": {"value": 9'
+
+    for start in range(0, len(text), 7):
+        parser.feed(text[start:start + 7])
+        if ("report_info", {"lab_name": "Lab"}) in seen:
+            break
+
+    assert seen == [("report_info", {"lab_name": "Lab"})]
+    parser.feed(text[start + 7:] + "}}}")
+    assert parser.result()["test_results"] == {"Hb": {"value": 9}}
+    assert [key for key, _ in seen] == ["report_info", "test_results"]
+
+
+def test_chunk_boundaries_do_not_matter():
+    text = "Sure! {'a': [1, 2,], b: 'x y', \"c\": True}"
+    expected = parse(text)
+
+    for size in (1, 2, 3, 5):
+        parser = StreamingJSONParser()
+        for start in range(0, len(text), size):
+            parser.feed(text[start:start + size])
+        assert parser.result() == expected
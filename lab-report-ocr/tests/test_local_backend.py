@@ -0,0 +1,54 @@
+import asyncio
+
+from app.core.config import settings
+from app.services.ocr.local_backend import MAX_TRACKED_IMAGES, LocalOCRBackend, SimulatedOCRError
+
+
+def run_calls(image_bytes, calls):
+    LocalOCRBackend._occurrences.clear()
+    backend = LocalOCRBackend()
+
+    async def outcomes():
+        results = []
+        for _ in range(calls):
+            try:
+                await backend.process_image_bytes(image_bytes, "image/png")
+                results.append(True)
+            except SimulatedOCRError:
+                results.append(False)
+        return results
+
+    return asyncio.run(outcomes())
+
+
+def test_repeated_image_samples_the_failure_rate(monkeypatch):
+    monkeypatch.setattr(settings, "OCR_LOCAL_LATENCY_MS", 0.0)
+    monkeypatch.setattr(settings, "OCR_LOCAL_FAILURE_RATE", 0.5)
+    monkeypatch.setattr(settings, "OCR_LOCAL_SEED", 7)
+
+    outcomes = run_calls(b"same image", 40)
+
+    assert 0 < outcomes.count(False) < 40
+
+
+def test_runs_are_reproducible(monkeypatch):
+    monkeypatch.setattr(settings, "OCR_LOCAL_LATENCY_MS", 0.0)
+    monkeypatch.setattr(settings, "OCR_LOCAL_FAILURE_RATE", 0.5)
+    monkeypatch.setattr(settings, "OCR_LOCAL_SEED", 7)
+
+    assert run_calls(b"same image", 20) == run_calls(b"same image", 20)
+
+
+def test_tracked_images_are_bounded(monkeypatch):
+    monkeypatch.setattr(settings, "OCR_LOCAL_LATENCY_MS", 0.0)
+    monkeypatch.setattr(settings, "OCR_LOCAL_FAILURE_RATE", 0.0)
+    LocalOCRBackend._occurrences.clear()
+    backend = LocalOCRBackend()
+
+    async def calls():
+        for index in range(MAX_TRACKED_IMAGES + 10):
+            await backend.process_image_bytes(str(index).encode(), "image/png")
+
+    asyncio.run(calls())
+
+    assert len(LocalOCRBackend._occurrences) == MAX_TRACKED_IMAGES
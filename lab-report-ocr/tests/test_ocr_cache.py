@@ -0,0 +1,23 @@
+import asyncio
+
+from app.services.ocr.cache import OCRResultCache
+
+RESULTS = {"Hemoglobin": {"value": "14"}}
+
+
+def stored(data):
+    cache = OCRResultCache()
+    asyncio.run(cache.set("key", data))
+    return asyncio.run(cache.get("key"))
+
+
+def test_complete_extraction_is_cached():
+    assert stored({"metadata": {"page_count": 2}, "test_results": RESULTS})["test_results"] == RESULTS
+
+
+def test_extraction_without_results_is_not_cached():
+    assert stored({"metadata": {}, "test_results": {}}) is None
+
+
+def test_extraction_with_fallback_page_is_not_cached():
+    assert stored({"metadata": {"page_count": 2, "fallback_pages": [2]}, "test_results": RESULTS}) is None
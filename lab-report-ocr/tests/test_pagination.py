@@ -0,0 +1,99 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from mongomock_motor import AsyncMongoMockClient
+
+from app.db.pagination import (
+    InvalidCursorError,
+    decode_cursor,
+    encode_cursor,
+    fetch_page,
+    keyset_filter,
+)
+
+SORT_FIELD = "collection_info.reported_on"
+
+
+def make_documents():
+    start = datetime(2024, 1, 1)
+    documents = []
+    for index in range(11):
+        document = {"_id": ObjectId(), "index": index, "collection_info": {}}
+        if index % 3 == 0:
+            document["collection_info"]["reported_on"] = None
+        elif index % 3 == 1:
+            # Several reports share a date, so _id has to break ties
+            document["collection_info"]["reported_on"] = start + timedelta(days=index // 4)
+        documents.append(document)
+    return documents
+
+
+def walk(documents, sort_direction, limit):
+    async def run():
+        collection = AsyncMongoMockClient()["test"]["reports"]
+        await collection.insert_many(documents)
+
+        seen, cursor = [], None
+        while True:
+            page, cursor = await fetch_page(
+                collection, {}, limit, cursor=cursor, sort_field=SORT_FIELD, sort_direction=sort_direction
+            )
+            seen.extend(document["index"] for document in page)
+            if cursor is None:
+                return seen
+
+    return asyncio.run(run())
+
+
+def expected_order(documents, sort_direction):
+    # MongoDB sorts null and missing values lowest
+    def key(document):
+        value = document["collection_info"].get("reported_on")
+        return (value is not None, value or datetime.min, document["_id"])
+
+    ordered = sorted(documents, key=key, reverse=sort_direction < 0)
+    return [document["index"] for document in ordered]
+
+
+@pytest.mark.parametrize("sort_direction", [1, -1])
+@pytest.mark.parametrize("limit", [1, 2, 4])
+def test_pages_cover_null_and_non_null_values(sort_direction, limit):
+    documents = make_documents()
+
+    assert walk(documents, sort_direction, limit) == expected_order(documents, sort_direction)
+
+
+def test_cursor_round_trip_keeps_datetimes():
+    document = {"_id": ObjectId(), "collection_info": {"reported_on": datetime(2024, 5, 1, 9, 30)}}
+
+    value, last_id = decode_cursor(encode_cursor(document, SORT_FIELD), SORT_FIELD)
+
+    assert value == datetime(2024, 5, 1, 9, 30)
+    assert last_id == document["_id"]
+
+
+def test_cursor_round_trip_keeps_missing_values():
+    document = {"_id": ObjectId()}
+
+    assert decode_cursor(encode_cursor(document, SORT_FIELD), SORT_FIELD) == (None, document["_id"])
+
+
+def test_cursor_of_another_sort_order_is_rejected():
+    cursor = encode_cursor({"_id": ObjectId()}, "_id")
+
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor, SORT_FIELD)
+
+
+def test_garbage_cursor_is_rejected():
+    with pytest.raises(InvalidCursorError):
+        keyset_filter(SORT_FIELD, -1, "not a cursor")
+
+
+def test_descending_filter_includes_nulls():
+    cursor = encode_cursor({"_id": ObjectId(), "collection_info": {"reported_on": datetime(2024, 1, 1)}}, SORT_FIELD)
+
+    assert {SORT_FIELD: None} in keyset_filter(SORT_FIELD, -1, cursor)["$or"]
+    assert {SORT_FIELD: None} not in keyset_filter(SORT_FIELD, 1, cursor)["$or"]
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from app.services.report_parser.reference_ranges import (
+    FLAG_HIGH,
+    FLAG_LOW,
+    FLAG_NONE,
+    ReferenceRange,
+    evaluate,
+    evaluate_batch,
+    parse_reference_range,
+    parse_value,
+)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("12 - 16", ReferenceRange(low=12, high=16)),
+    ("12–16 g/dL", ReferenceRange(low=12, high=16)),
+    ("12 to 16", ReferenceRange(low=12, high=16)),
+    ("16 - 12", ReferenceRange(low=12, high=16)),
+    ("4,000 - 11,000", ReferenceRange(low=4000, high=11000)),
+    ("<5", ReferenceRange(high=5, high_inclusive=False)),
+    ("<= 5", ReferenceRange(high=5)),
+    ("Up to 5 mg/L", ReferenceRange(high=5)),
+    (">40", ReferenceRange(low=40, low_inclusive=False)),
+    (">= 40", ReferenceRange(low=40)),
+    ("More than 40", ReferenceRange(low=40)),
+    ("130 - 170 mg/dL (Max 200)", ReferenceRange(low=130, high=170)),
+    ("-1 - 2", ReferenceRange(low=-1, high=2)),
+    ("-3 to -1", ReferenceRange(low=-3, high=-1)),
+    ("< -2.5", ReferenceRange(high=-2.5, high_inclusive=False)),
+])
+def test_parse_reference_range(text, expected):
+    assert parse_reference_range(text) == expected
+
+
+@pytest.mark.parametrize("text", [None, "", "Negative", "See note", 12])
+def test_non_numeric_ranges_are_not_parsed(text):
+    assert parse_reference_range(text) is None
+
+
+@pytest.mark.parametrize("value, expected", [
+    (11.2, 11.2),
+    (7, 7.0),
+    ("11.2", 11.2),
+    ("7,800 cells/cumm", 7800.0),
+    ("11.2 g/dL", 11.2),
+    ("-1.8", -1.8),
+    ("Positive", None),
+    ("1.2 - 3.4", None),
+    (True, None),
+    (None, None),
+])
+def test_parse_value(value, expected):
+    assert parse_value(value) == expected
+
+
+def test_evaluate_batch_flags_each_value():
+    evaluated, flags = evaluate_batch(
+        [9.0, 14.0, 17.0, "4", 5, 40, "Positive", 10],
+        ["12-16", "12-16", "12-16", "<5", "<5", ">= 40", "12-16", None],
+    )
+
+    assert evaluated.tolist() == [True, True, True, True, True, True, False, False]
+    assert flags.tolist() == [FLAG_LOW, FLAG_NONE, FLAG_HIGH, FLAG_NONE, FLAG_HIGH, FLAG_NONE, FLAG_NONE, FLAG_NONE]
+    assert flags.dtype == np.int8
+
+
+def test_evaluate_batch_of_nothing():
+    evaluated, flags = evaluate_batch([], [])
+
+    assert evaluated.size == flags.size == 0
+
+
+def test_evaluate_single_value():
+    assert evaluate(9.0, "12 - 16") == (True, "L")
+    assert evaluate(14.0, "12 - 16") == (True, None)
+    assert evaluate("n/a", "12 - 16") == (False, None)
@@ -0,0 +1,89 @@
+from app.services.report_parser.report_mapper import ReportMapper
+
+
+def map_results(test_results):
+    return ReportMapper.map_to_standard_format(
+        {"test_results": test_results}, "PDF", "report.pdf", "9999999999"
+    )
+
+
+def test_out_of_range_value_is_flagged():
+    report = map_results({"Hb": {"value": 9.0, "reference_range": "12-16", "flag": None}})
+
+    assert report["test_results"]["Hb"]["is_normal"] is False
+    assert report["test_results"]["Hb"]["flag"] == "L"
+    assert report["abnormal_count"] == 1
+
+
+def test_null_is_normal_is_evaluated():
+    report = map_results({"Hb": {"value": 9.0, "reference_range": "12-16", "is_normal": None, "flag": None}})
+
+    assert report["test_results"]["Hb"]["is_normal"] is False
+    assert report["test_results"]["Hb"]["flag"] == "L"
+    assert report["abnormal_count"] == 1
+
+
+def test_existing_is_normal_is_kept():
+    report = map_results({"Hb": {"value": 9.0, "reference_range": "12-16", "is_normal": True, "flag": None}})
+
+    assert report["test_results"]["Hb"]["is_normal"] is True
+    assert report["abnormal_count"] == 0
+
+
+def test_lab_flag_decides_is_normal():
+    report = map_results({"TSH": {"value": 3.0, "reference_range": "0.4-4.0", "flag": "H"}})
+
+    assert report["test_results"]["TSH"]["is_normal"] is False
+
+
+def test_nested_sections_are_evaluated():
+    report = map_results({
+        "Differential": {
+            "Neutrophils": {"value": 80, "reference_range": "40 - 75", "flag": None},
+            "Lymphocytes": {"value": 30, "reference_range": "20 - 40", "flag": None},
+        }
+    })
+
+    section = report["test_results"]["Differential"]
+    assert section["Neutrophils"]["flag"] == "H"
+    assert section["Lymphocytes"]["is_normal"] is True
+    assert report["abnormal_count"] == 1
+
+
+def test_evaluate_reports_overwrites():
+    reports = [
+        {"test_results": {"Hb": {"value": 9.0, "reference_range": "12-16", "is_normal": True, "flag": None}}},
+        {"test_results": {"Hb": {"value": 14.0, "reference_range": "12-16", "is_normal": False, "flag": None}}},
+    ]
+
+    ReportMapper.evaluate_reports(reports)
+
+    assert [report["abnormal_count"] for report in reports] == [1, 0]
+
+
+def test_evaluate_reports_keeps_qualitative_judgements():
+    reports = [{"test_results": {
+        "HBsAg": {"value": "Positive", "reference_range": "Negative", "is_normal": False, "flag": None},
+        "Urine colour": {"value": "Pale yellow", "reference_range": None, "flag": None},
+    }}]
+
+    ReportMapper.evaluate_reports(reports)
+
+    results = reports[0]["test_results"]
+    assert results["HBsAg"]["is_normal"] is False
+    assert results["Urine colour"]["is_normal"] is True
+    assert reports[0]["abnormal_count"] == 1
+
+
+def test_merge_records_fallback_pages():
+    pages = [
+        {"metadata": {"page_info": "Page 1 of 3"}, "test_results": {"Hemoglobin": {"value": "14"}}},
+        {"metadata": {"page_info": "", "fallback_pages": [1]}, "test_results": {}},
+        {"metadata": {"page_info": "Page 3 of 3"}, "test_results": {"Glucose": {"value": "90"}}},
+    ]
+
+    merged = ReportMapper.merge_page_results(pages)
+
+    assert merged["metadata"]["fallback_pages"] == [2]
+    assert set(merged["test_results"]) == {"Hemoglobin", "Glucose"}
+    assert "fallback_pages" not in ReportMapper.merge_page_results([pages[0], pages[2]])["metadata"]
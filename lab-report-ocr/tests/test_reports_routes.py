@@ -0,0 +1,62 @@
+import asyncio
+
+import httpx
+from bson import ObjectId
+from mongomock_motor import AsyncMongoMockClient
+
+from app.core.config import settings
+from app.db.database import get_database
+from app.main import app
+
+REPORTS = f"{settings.API_V1_STR}/reports"
+
+
+def run_requests(requests, documents=()):
+    async def run():
+        database = AsyncMongoMockClient()["test"]
+        if documents:
+            await database.reports.insert_many(list(documents))
+        app.dependency_overrides[get_database] = lambda: database
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await requests(client)
+        finally:
+            app.dependency_overrides.pop(get_database, None)
+
+    return asyncio.run(run())
+
+
+def test_summary_lists_reports_without_created_at():
+    document = {"_id": ObjectId(), "patient_info": {"phone_number": "+15550000001"}, "test_name": "CBC"}
+
+    async def requests(client):
+        return await client.get(f"{REPORTS}/by-phone/+15550000001/summary")
+
+    response = run_requests(requests, [document])
+
+    assert response.status_code == 200
+    assert response.json()["reports"][0]["created_at"] is None
+
+
+def test_deleting_a_missing_report_is_not_found():
+    async def requests(client):
+        return await client.delete(f"{REPORTS}/{ObjectId()}")
+
+    assert run_requests(requests).status_code == 404
+
+
+def test_deleting_a_report_removes_its_observations():
+    report_id = ObjectId()
+    document = {"_id": report_id, "patient_info": {"phone_number": "+15550000001"}}
+
+    async def requests(client):
+        database = app.dependency_overrides[get_database]()
+        await database.observations.insert_one({"report_id": report_id})
+        response = await client.delete(f"{REPORTS}/{report_id}")
+        return response, await database.observations.count_documents({})
+
+    response, remaining = run_requests(requests, [document])
+
+    assert response.status_code == 200
+    assert remaining == 0
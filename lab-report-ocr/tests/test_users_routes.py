@@ -0,0 +1,47 @@
+import asyncio
+
+import httpx
+from mongomock_motor import AsyncMongoMockClient
+
+from app.core.config import settings
+from app.db.database import get_database
+from app.db.indexes import INDEXES
+from app.main import app
+
+USERS = f"{settings.API_V1_STR}/users/"
+
+
+def run_requests(requests):
+    async def run():
+        database = AsyncMongoMockClient()["test"]
+        await database.users.create_indexes(INDEXES["users"])
+        app.dependency_overrides[get_database] = lambda: database
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await requests(client)
+        finally:
+            app.dependency_overrides.pop(get_database, None)
+
+    return asyncio.run(run())
+
+
+def test_duplicate_email_on_create_is_rejected():
+    async def requests(client):
+        first = await client.post(USERS, json={"name": "A", "phone_number": "+15550000001", "email": "a@example.com"})
+        second = await client.post(USERS, json={"name": "B", "phone_number": "+15550000002", "email": "a@example.com"})
+        return first, second
+
+    first, second = run_requests(requests)
+
+    assert first.status_code == 200
+    assert second.status_code == 400
+
+
+def test_duplicate_email_on_update_is_rejected():
+    async def requests(client):
+        await client.post(USERS, json={"name": "A", "phone_number": "+15550000001", "email": "a@example.com"})
+        second = await client.post(USERS, json={"name": "B", "phone_number": "+15550000002", "email": "b@example.com"})
+        return await client.put(f"{USERS}{second.json()['id']}", json={"email": "a@example.com"})
+
+    assert run_requests(requests).status_code == 400